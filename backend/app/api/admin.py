@@ -175,4 +175,17 @@ async def get_system_stats(
         "moderators": moderator_users,
         "regular_users": regular_users,
         "system_access": True
-    }
\ No newline at end of file
+    }
+
+@router.get("/models", response_model=dict)
+async def list_loaded_models(
+    current_user: User = Depends(admin_user)
+):
+    """List ML models loaded in this worker process and their weight memory (admin only)"""
+    import os
+    from app.core.model_registry import registry
+
+    return {
+        "pid": os.getpid(),
+        "models": registry.loaded()
+    }
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Query
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 import uuid
 import json
+import hashlib
 
 from app.core.db import get_db
 from app.models.user import User
 from app.api.auth import fastapi_users
 from app.services.ai_detection import AIDetectionService
+from app.services.detection_batcher import DetectionOverloaded, get_detection_batcher
 from app.services.plagiarism import PlagiarismService
 from app.core.provider_router import ProviderRouter, ProviderType
 from typing import Dict, Any
@@ -22,6 +24,7 @@ class AnalysisOptions(BaseModel):
     ai_threshold: float = Field(default=0.5, ge=0.0, le=1.0)
     check_plagiarism: bool = True
     check_ai: bool = True
+    course: Optional[str] = Field(default=None, description="Course/assignment label, scopes corpus search")
 
 class AnalysisResponse(BaseModel):
     batch_id: str
@@ -51,6 +54,7 @@ async def analyze_content(
 
     # Create Batch
     from app.models import Batch, Document
+    from app.services.ingestion import normalized_text_hash
     batch_id = uuid.uuid4()
     batch = Batch(
         id=batch_id,
@@ -59,7 +63,8 @@ async def analyze_content(
         status="queued",
         analysis_type="mixed",
         ai_provider=opts.provider,
-        ai_threshold=opts.ai_threshold
+        ai_threshold=opts.ai_threshold,
+        course=opts.course
     )
     db.add(batch)
     
@@ -73,48 +78,49 @@ async def analyze_content(
             filename="input_text.txt",
             storage_path=f"{batch_id}/input_text.txt",
             text_content=text,
+            content_hash=hashlib.sha256(text.encode()).hexdigest(),
+            text_hash=normalized_text_hash(text),
             status="queued"
         )
         db.add(doc)
         docs_to_process.append(doc)
 
-    # Process Uploaded Files
-    from app.services.parsing import extract_text_from_file
-    from app.services.storage import StorageService
-    storage_service = StorageService()
-    
-    for file in files:
-        content = await file.read()
-        storage_path = f"{batch_id}/{file.filename}"
-        storage_service.save(storage_path, content)
-        
-        # Extract text
-        from io import BytesIO
-        file_obj = BytesIO(content)
-        file_obj.name = file.filename
-        text_content = await extract_text_from_file(file_obj)
-        
+    # Persist Uploaded Files; text extraction runs in the background.
+    # Uploads are content-addressed, so bytes already in storage are not sent again.
+    from app.services.blob_store import BlobStore
+    try:
+        stored = await BlobStore().put_streams(db, [file.file for file in files])
+    finally:
+        for file in files:
+            await file.close()
+
+    for file, (storage_key, content_hash) in zip(files, stored):
         doc = Document(
             batch_id=batch_id,
             filename=file.filename,
-            storage_path=storage_path,
-            text_content=text_content,
-            status="queued"
+            storage_path=storage_key,
+            content_hash=content_hash,
+            mime_type=file.content_type,
+            status="uploaded"
         )
         db.add(doc)
         docs_to_process.append(doc)
 
     batch.total_docs = len(docs_to_process)
+    batch.status = "uploaded" if files else "queued"
     await db.commit()
 
     # Trigger Processing (Async) - Options stored in batch
-    from app.services.batch_processing import process_batch
+    from app.services.batch_processing import extract_batch, process_batch
     
-    process_batch.delay(str(batch_id), provider=opts.provider, ai_threshold=opts.ai_threshold)
+    if files:
+        extract_batch.delay(str(batch_id), provider=opts.provider, ai_threshold=opts.ai_threshold)
+    else:
+        process_batch.delay(str(batch_id), provider=opts.provider, ai_threshold=opts.ai_threshold)
 
     return AnalysisResponse(
         batch_id=str(batch_id),
-        status="queued",
+        status=batch.status,
         message="Analysis started successfully"
     )
 
@@ -133,29 +139,72 @@ async def detect_ai_only(
 ):
     """
     Direct AI detection endpoint for text.
+    Inference runs off the event loop, coalesced with concurrent requests;
+    returns 503 with Retry-After when the detection queue is saturated.
     """
     try:
-        ai_result = ai_service.detect(text, provider=provider, threshold=threshold)
-        
-        # Create temporary document to store result
-        from app.models.document import Document
-        from app.models.ai_detection import AIDetection
-        from sqlalchemy.orm import Session
-        from app.core.db import get_db
-        
-        # Note: For this endpoint, we're returning the result directly
-        # In a full implementation, we might want to store this in the DB
-        return {
-            "is_ai": ai_result["is_ai"],
-            "score": ai_result["score"],
-            "confidence": ai_result["confidence"],
-            "label": ai_result["label"],
-            "provider": ai_result["provider"],
-            "details": ai_result["details"]
-        }
+        ai_result = await get_detection_batcher(ai_service).detect(text, provider=provider, threshold=threshold)
+    except DetectionOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI detection failed: {str(e)}")
 
+    # Note: For this endpoint, we're returning the result directly
+    # In a full implementation, we might want to store this in the DB
+    return {
+        "is_ai": ai_result["is_ai"],
+        "score": ai_result["score"],
+        "confidence": ai_result["confidence"],
+        "label": ai_result["label"],
+        "provider": ai_result["provider"],
+        "details": ai_result["details"]
+    }
+
+@router.get("/documents/{document_id}/sources")
+async def search_corpus_sources(
+    document_id: uuid.UUID,
+    top_k: int = Query(10, ge=1, le=100),
+    course: Optional[str] = None,
+    include_batch: bool = False,
+    db: Session = Depends(get_db),
+    user: User = Depends(fastapi_users.current_user())
+):
+    """
+    Suspected sources of a processed document across all of the user's earlier submissions,
+    optionally limited to one course, plus lexical near-duplicates from the MinHash bands and verbatim
+    copies from the fingerprint index. Documents of the same batch are left out unless
+    ``include_batch`` is set, since the batch results already compare them.
+    """
+    from app.models import Batch, Document
+    from app.services.corpus_search import CorpusSearchService
+    from app.services.fingerprint import FingerprintIndex
+    from sqlalchemy import select
+
+    doc = (await db.execute(
+        select(Document).join(Batch, Document.batch_id == Batch.id)
+        .where(Document.id == document_id, Batch.user_id == user.id)
+    )).scalars().first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    search = CorpusSearchService(db)
+    sources = await search.search(
+        document_id,
+        tenant_id=user.id,
+        course=course,
+        top_k=top_k,
+        exclude_batch_id=None if include_batch else doc.batch_id
+    )
+    near_duplicates = await search.near_duplicates(document_id, tenant_id=user.id, course=course, limit=top_k)
+    verbatim = await FingerprintIndex(db).find_copies(
+        document_id,
+        tenant_id=user.id,
+        course=course,
+        exclude_batch_id=None if include_batch else doc.batch_id,
+        top_k=top_k
+    )
+    return {"status": "ok", "data": sources, "near_duplicates": near_duplicates, "verbatim": verbatim}
+
 @router.get("/batches/{batch_id}/results")
 async def get_batch_results(
     batch_id: uuid.UUID,
@@ -169,22 +218,30 @@ async def get_batch_results(
     from sqlalchemy import select
     from sqlalchemy.orm import aliased
 
-    batch = db.query(Batch).filter(Batch.id == batch_id, Batch.user_id == user.id).first()
+    batch = (await db.execute(
+        select(Batch).where(Batch.id == batch_id, Batch.user_id == user.id)
+    )).scalars().first()
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
 
-    documents = db.query(Document).filter(Document.batch_id == batch_id).all()
+    documents = (await db.execute(select(Document).where(Document.batch_id == batch_id))).scalars().all()
+
+    # Sign every download link in one storage call; typed text has no stored file
+    from app.services.storage import get_storage
+    download_urls = await get_storage().presigned_urls(
+        doc.storage_path for doc in documents if doc.storage_path and doc.mime_type
+    )
     
     results = []
     for doc in documents:
         # Get plagiarism comparisons
         DocB = aliased(Document)
-        comparisons = db.execute(
+        comparisons = (await db.execute(
             select(Comparison, DocB.filename.label("match_filename"))
             .join(DocB, Comparison.doc_b == DocB.id)
             .where(Comparison.doc_a == doc.id)
             .order_by(Comparison.similarity.desc())
-        ).all()
+        )).all()
         
         plagiarism_details = []
         for comp, match_filename in comparisons:
@@ -197,6 +254,7 @@ async def get_batch_results(
         results.append({
             "document_id": str(doc.id),
             "filename": doc.filename,
+            "download_url": download_urls.get(doc.storage_path),
             "status": doc.status,
             "ai_analysis": {
                 "score": doc.ai_score,
@@ -1,5 +1,7 @@
 from celery import Celery
+from celery.signals import worker_init
 from app.core.config import settings
+from app.core.model_registry import preload_models
 
 
 app = Celery('plagiarism_detection')
@@ -13,9 +15,25 @@ app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
+    beat_schedule={
+        'collect-unreferenced-blobs': {
+            'task': 'app.services.batch_processing.collect_unreferenced_blobs',
+            'schedule': settings.BLOB_GC_INTERVAL_MINUTES * 60,
+        },
+        'compact-chunk-index': {
+            'task': 'app.services.batch_processing.compact_chunk_index',
+            'schedule': settings.CORPUS_INDEX_COMPACT_MINUTES * 60,
+        },
+    },
 )
 
 
+@worker_init.connect
+def preload_worker_models(**kwargs):
+    """Load shared models in the worker master so prefork children inherit them copy-on-write."""
+    preload_models()
+
 
 # Import tasks
-app.autodiscover_tasks(['app.services'])
\ No newline at end of file
+app.autodiscover_tasks(['app.services'], related_name='batch_processing')
\ No newline at end of file
@@ -16,16 +16,88 @@ class Settings(BaseSettings):
     S3_ACCESS_KEY: Optional[str] = os.getenv("S3_ACCESS_KEY")
     S3_SECRET_KEY: Optional[str] = os.getenv("S3_SECRET_KEY")
     S3_BUCKET_NAME: str = os.getenv("S3_BUCKET_NAME", "plagiarism-uploads")
+    STORAGE_MAX_CONCURRENCY: int = int(os.getenv("STORAGE_MAX_CONCURRENCY", "16"))  # Parallel transfers per process
+    STORAGE_CHUNK_KB: int = int(os.getenv("STORAGE_CHUNK_KB", "1024"))  # Read size when streaming uploads
+    S3_MULTIPART_PART_MB: int = int(os.getenv("S3_MULTIPART_PART_MB", "8"))  # Buffered per upload, S3 minimum is 5
+    BLOB_GC_INTERVAL_MINUTES: int = int(os.getenv("BLOB_GC_INTERVAL_MINUTES", "60"))
+    BLOB_GC_GRACE_HOURS: float = float(os.getenv("BLOB_GC_GRACE_HOURS", "24"))  # Unreferenced blobs are kept this long
     
     # AI Detection settings
     USE_EXTERNAL_AI_DETECTION: bool = os.getenv("USE_EXTERNAL_AI_DETECTION", "false").lower() == "true"
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     TOGETHER_API_KEY: Optional[str] = os.getenv("TOGETHER_API_KEY")
+    AI_DETECTION_BATCH_SIZE: int = int(os.getenv("AI_DETECTION_BATCH_SIZE", "32"))  # Chunks per classifier forward pass
+    AI_DETECTION_WORKERS: int = int(os.getenv("AI_DETECTION_WORKERS", "1"))  # Inference threads for /ai-detection
+    AI_DETECTION_QUEUE_SIZE: int = int(os.getenv("AI_DETECTION_QUEUE_SIZE", "256"))  # Queued requests before 503
+    AI_DETECTION_EXTERNAL_WORKERS: int = int(os.getenv("AI_DETECTION_EXTERNAL_WORKERS", "8"))  # Concurrent API calls
+    AI_DETECTION_MAX_BATCH: int = int(os.getenv("AI_DETECTION_MAX_BATCH", "16"))  # Texts coalesced per micro-batch
+    AI_DETECTION_BATCH_WAIT_MS: int = int(os.getenv("AI_DETECTION_BATCH_WAIT_MS", "10"))  # Wait for a batch to fill
+    AI_DETECTION_DEADLINE: float = float(os.getenv("AI_DETECTION_DEADLINE", "30"))  # Seconds per request before 503
     
+    # Model settings
+    PRELOAD_MODELS: str = os.getenv("PRELOAD_MODELS", "")  # e.g. "embedding,ai_detection", loaded before fork
+
+    # Archive settings
+    ARCHIVE_MAX_MEMBER_MB: int = int(os.getenv("ARCHIVE_MAX_MEMBER_MB", "50"))
+    ARCHIVE_MAX_TOTAL_MB: int = int(os.getenv("ARCHIVE_MAX_TOTAL_MB", "500"))
+    ARCHIVE_MAX_RATIO: float = float(os.getenv("ARCHIVE_MAX_RATIO", "100"))  # Uncompressed / compressed
+    ARCHIVE_MAX_MEMBERS: int = int(os.getenv("ARCHIVE_MAX_MEMBERS", "1000"))
+
+    # OCR settings
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", "0"))  # Per Celery child, 0 shares the cores among the children
+    OCR_DPI: int = int(os.getenv("OCR_DPI", "200"))
+    OCR_PAGE_TIMEOUT: float = float(os.getenv("OCR_PAGE_TIMEOUT", "120"))  # Seconds per page, 0 disables
+    OCR_PAGES_PER_TASK: int = int(os.getenv("OCR_PAGES_PER_TASK", "2"))  # Pages rasterised per pool task
+    OCR_MIN_PAGE_CHARS: int = int(os.getenv("OCR_MIN_PAGE_CHARS", "50"))  # Sparser text layers are OCR'd
+
+    # Chunking settings
+    CHUNK_STRIDE_TOKENS: int = int(os.getenv("CHUNK_STRIDE_TOKENS", "32"))  # Tokens shared by consecutive windows
+
+    # Embedding settings
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))  # Chunks per model forward pass
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "50000"))
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", "cache/embeddings")  # Empty disables the disk tier
+    EMBEDDING_CACHE_DISK_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "200000"))
+
+    # Similarity settings
+    SIMILARITY_MAX_BLOCK_MB: int = int(os.getenv("SIMILARITY_MAX_BLOCK_MB", "64"))  # Cap per similarity block
+    SIMILARITY_TILE_MB: int = int(os.getenv("SIMILARITY_TILE_MB", "64"))  # Chunk vectors loaded per tile task
+
+    # Corpus search settings
+    CORPUS_CHUNK_NEIGHBORS: int = int(os.getenv("CORPUS_CHUNK_NEIGHBORS", "10"))  # k-NN hits per query chunk
+    CORPUS_MIN_SIMILARITY: float = float(os.getenv("CORPUS_MIN_SIMILARITY", "0.75"))  # Chunk match threshold
+    CORPUS_EF_SEARCH: int = int(os.getenv("CORPUS_EF_SEARCH", "64"))  # HNSW candidate list per query chunk
+    CORPUS_INDEX_BACKEND: str = os.getenv("CORPUS_INDEX_BACKEND", "pgvector")  # pgvector or local
+    CORPUS_INDEX_DIR: str = os.getenv("CORPUS_INDEX_DIR", "cache/chunk_index")  # Shared by all local processes
+    CORPUS_INDEX_NLIST: int = int(os.getenv("CORPUS_INDEX_NLIST", "0"))  # IVF lists, 0 sizes them from the corpus
+    CORPUS_INDEX_NPROBE: int = int(os.getenv("CORPUS_INDEX_NPROBE", "16"))  # IVF lists searched per query chunk
+    CORPUS_INDEX_COMPACT_MINUTES: int = int(os.getenv("CORPUS_INDEX_COMPACT_MINUTES", "10"))
+
+    # Prefilter settings
+    MINHASH_PREFILTER: bool = os.getenv("MINHASH_PREFILTER", "true").lower() == "true"  # Compare LSH candidates only
+    MINHASH_PERMUTATIONS: int = int(os.getenv("MINHASH_PERMUTATIONS", "128"))
+    MINHASH_BANDS: int = int(os.getenv("MINHASH_BANDS", "32"))  # Must divide MINHASH_PERMUTATIONS
+    MINHASH_SHINGLE_WORDS: int = int(os.getenv("MINHASH_SHINGLE_WORDS", "2"))
+    PREFILTER_SEMANTIC_MIN: float = float(os.getenv("PREFILTER_SEMANTIC_MIN", "0.5"))  # Mean-embedding cosine fallback
+
+    # Fingerprint settings
+    WINNOW_K: int = int(os.getenv("WINNOW_K", "25"))  # Normalised characters per hashed k-gram
+    WINNOW_WINDOW: int = int(os.getenv("WINNOW_WINDOW", "20"))  # Copies of K + WINDOW - 1 chars always match
+    WINNOW_MAX_DOC_FREQ: int = int(os.getenv("WINNOW_MAX_DOC_FREQ", "50"))  # More common fingerprints are ignored
+    WINNOW_MIN_FINGERPRINTS: int = int(os.getenv("WINNOW_MIN_FINGERPRINTS", "1"))  # Per reported span, 1 keeps the guarantee
+
+    # Pipeline settings
+    PIPELINE_DOCS_PER_TASK: int = int(os.getenv("PIPELINE_DOCS_PER_TASK", "16"))  # Documents per process_documents task
+    PIPELINE_INFERENCE_WORKERS: int = int(os.getenv("PIPELINE_INFERENCE_WORKERS", "2"))  # Model inference threads
+    PIPELINE_MAX_IN_FLIGHT: int = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "2"))  # Documents in inference at once
+    WRITE_BEHIND_MAX_ROWS: int = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500"))  # Buffered rows per bulk flush
+    WRITE_BEHIND_MAX_DELAY: float = float(os.getenv("WRITE_BEHIND_MAX_DELAY", "2"))  # Seconds before a forced flush
+
     # Celery settings
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
+    CELERY_WORKER_CONCURRENCY: int = int(os.getenv("CELERY_WORKER_CONCURRENCY", str(os.cpu_count() or 1)))  # Prefork children
 
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+AI_DETECTION_MODEL = "roberta-base-openai-detector"
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of ML models with load-once semantics.
+
+    Models are loaded lazily on first use. A per-model lock lets concurrent
+    callers for the same model wait on one load, while other models can still
+    load in parallel. Calling ``preload`` in a parent process before it forks
+    (gunicorn ``--preload`` or the Celery prefork master) lets worker processes
+    share the weights copy-on-write.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._info: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, kind: str, loader: Callable[[], Any]) -> Any:
+        """Return the model registered under ``name``, loading it with ``loader`` on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model_lock = self._locks.setdefault(name, threading.Lock())
+        with model_lock:
+            model = self._models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = loader()
+                self._info[name] = {
+                    "name": name,
+                    "kind": kind,
+                    "load_seconds": round(time.perf_counter() - start, 3),
+                    "loaded_at": time.time(),
+                }
+                self._models[name] = model
+                logger.info(f"Model '{name}' ({kind}) loaded in {self._info[name]['load_seconds']}s")
+        return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def loaded(self) -> List[Dict[str, Any]]:
+        """Describe every loaded model, including an estimate of its weight memory."""
+        return [
+            {**self._info[name], "memory_bytes": _memory_bytes(model)}
+            for name, model in list(self._models.items())
+        ]
+
+
+def _memory_bytes(model: Any) -> Optional[int]:
+    """Sum parameter and buffer sizes of the underlying torch module, if any."""
+    module = getattr(model, "model", model)  # transformers pipelines wrap the module
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+    except AttributeError:
+        return None
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+registry = ModelRegistry()
+
+
+def get_sentence_transformer(model_name: str = EMBEDDING_MODEL):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return registry.get(model_name, "sentence-transformer", load)
+
+
+def get_text_classifier(model_name: str = AI_DETECTION_MODEL):
+    def load():
+        from transformers import pipeline
+        return pipeline("text-classification", model=model_name)
+    return registry.get(model_name, "text-classification", load)
+
+
+def preload_models(names: Optional[str] = None):
+    """
+    Load the models listed in ``PRELOAD_MODELS`` (comma separated: 'embedding', 'ai_detection').
+    Failures are logged and left for lazy loading to retry.
+    """
+    loaders = {
+        "embedding": get_sentence_transformer,
+        "ai_detection": get_text_classifier,
+    }
+    for name in filter(None, (n.strip() for n in (names if names is not None else settings.PRELOAD_MODELS).split(","))):
+        loader = loaders.get(name)
+        if loader is None:
+            logger.warning(f"Unknown model '{name}' in PRELOAD_MODELS")
+            continue
+        try:
+            loader()
+        except Exception as e:
+            logger.error(f"Failed to preload model '{name}': {e}")
@@ -1,17 +1,23 @@
+import asyncio
 import loguru
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
 from app.api.routes import router as api_router
 from app.api.auth import router as auth_router
 from app.api.users import router as users_router
 from app.api.admin import router as admin_router
 from app.core.db import async_engine
+from app.core.model_registry import preload_models
 from app.models.base import Base
 
 
 app = FastAPI()
 
+# With gunicorn --preload this runs once in the master, before workers fork
+preload_models()
+
 # CORS Middleware - Restrict origins in production
 allowed_origins = ["http://localhost:5173", "http://localhost:80"]
 if os.getenv("ENVIRONMENT") == "development":
@@ -38,8 +44,22 @@ app.include_router(routes.router, prefix="/api/v1", tags=["legacy"]) # Keep lega
 async def startup_event():
     loguru.logger.info("Starting up...")
     async with async_engine.begin() as conn:
+        # Vector columns and the chunk HNSW index need pgvector
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
     
+    # Uploads go to S3/MinIO, whose bucket may not exist yet; MinIO can also still be starting
+    from app.services.storage import get_storage
+    for attempt in range(5):
+        try:
+            await get_storage().ensure_bucket()
+            break
+        except Exception as e:
+            loguru.logger.warning(f"Storage bucket check failed (attempt {attempt + 1}): {e}")
+            await asyncio.sleep(2)
+    else:
+        loguru.logger.error("Storage bucket is unavailable, uploads will fail")
+
     # Seed the database with initial data
     try:
         from app.core.database_seed import seed_database
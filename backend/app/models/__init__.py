@@ -1,8 +1,13 @@
 from .base import Base
 from .ai_detection import AIDetection
 from .batch import Batch
+from .blob import Blob
 from .comparison import Comparison
 from .document import Document
+from .embedding import Embedding
+from .extracted_text import ExtractedText
+from .fingerprint import Fingerprint
+from .minhash import MinHashBand, MinHashSignature
 from .user import User
 
-__all__ = ["Base", "AIDetection", "Batch", "Comparison", "Document", "User"]
+__all__ = ["Base", "AIDetection", "Batch", "Blob", "Comparison", "Document", "Embedding", "ExtractedText", "Fingerprint", "MinHashBand", "MinHashSignature", "User"]
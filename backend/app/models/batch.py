@@ -1,5 +1,6 @@
 import uuid
-from sqlalchemy import Column, String, Integer, DateTime, func, UUID, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, func, UUID, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
 from .base import Base
 
 class Batch(Base):
@@ -8,10 +9,12 @@ class Batch(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     name = Column(String)
+    course = Column(String, index=True)  # Optional course/assignment label, scopes corpus search
     total_docs = Column(Integer)
     processed_docs = Column(Integer, default=0)
-    status = Column(String)
+    status = Column(String)  # uploaded, extracting, queued, processing, completed, partial (similarity tiles failed)
     analysis_type = Column(String, default="plagiarism")  # plagiarism, ai, or both
     ai_provider = Column(String, default="local")  # AI detection provider
     ai_threshold = Column(Float, default=0.5)  # AI detection threshold
+    metrics = Column(JSONB, default=dict)  # Stage timings {stage: {"seconds", "calls"}}, "prefilter", "similarity" failures
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, func
+from .base import Base
+
+class Blob(Base):
+    """Upload bytes stored once under their sha256, shared by every Document with that content."""
+    __tablename__ = "blobs"
+
+    content_hash = Column(String, primary_key=True)  # sha256 of the bytes
+    storage_key = Column(String, nullable=False)
+    size = Column(BigInteger)
+    ref_count = Column(Integer, nullable=False, default=0)  # Documents pointing at this blob
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    unreferenced_at = Column(DateTime(timezone=True), index=True)  # Set when ref_count drops to 0, cleared on reuse
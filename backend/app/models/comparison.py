@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Float, ForeignKey, DateTime, Integer
+from sqlalchemy import Column, String, Float, ForeignKey, DateTime, Integer, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -7,6 +7,7 @@ from app.core.db import Base
 
 class Comparison(Base):
     __tablename__ = "comparisons"
+    __table_args__ = (UniqueConstraint("doc_a", "doc_b", name="uq_comparison_pair"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     doc_a = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Text, DateTime, func, UUID, Float, Boolean, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, func, UUID, Float, Boolean, ForeignKey, Integer
 from pgvector.sqlalchemy import Vector
 from .base import Base
 
@@ -9,13 +9,16 @@ class Document(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     batch_id = Column(UUID(as_uuid=True), ForeignKey("batches.id"))
     filename = Column(String, nullable=False)
-    content_hash = Column(String)
+    content_hash = Column(String, index=True)  # sha256 of the uploaded bytes (or of the submitted text)
+    text_hash = Column(String, index=True)  # sha256 of the normalised extracted text, for exact-duplicate lookups
+    duplicate_of = Column(UUID(as_uuid=True), ForeignKey("documents.id"))  # Earlier document whose results were reused
     mime_type = Column(String)
     text_content = Column(Text)
     embedding = Column(Vector(384))  # Assuming sentence-transformers/all-MiniLM-L6-v2 embedding dim
-    storage_path = Column(String)
+    chunk_count = Column(Integer)  # Chunk embeddings stored for the similarity stage
+    storage_path = Column(String, index=True)  # Blob storage key for uploads
     uploaded_by = Column(UUID(as_uuid=True))
-    status = Column(String, default="queued")  # queued, processing, completed, failed
+    status = Column(String, default="queued")  # uploaded, extracting, queued, processing, completed, failed
     ai_score = Column(Float, default=0.0)  # AI detection confidence score
     is_ai_generated = Column(Boolean, default=False)  # Is the text AI-generated?
     ai_confidence = Column(Float, default=0.0)  # AI detection confidence level
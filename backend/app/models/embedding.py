@@ -1,13 +1,30 @@
 import uuid
-from sqlalchemy import Column, ForeignKey, String, DateTime, func, UUID
+from sqlalchemy import Column, ForeignKey, String, DateTime, Integer, Index, func, UUID
 from pgvector.sqlalchemy import Vector
 from .base import Base
 
 class Embedding(Base):
+    """One chunk vector of a document, searchable across the whole corpus."""
     __tablename__ = "embeddings"
+    __table_args__ = (
+        Index(
+            "ix_embeddings_vector_hnsw", "vector",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"vector": "vector_cosine_ops"},
+        ),
+        Index("ix_embeddings_scope", "tenant_id", "course"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    file_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    file_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False, index=True)
     vector = Column(Vector(384), nullable=False)
     type = Column(String, nullable=False)  # 'text' or 'image'
+    chunk_index = Column(Integer)  # Position of the chunk in its document
+    span_start = Column(Integer)  # Character offsets of the chunk in Document.text_content
+    span_end = Column(Integer)
+    # Denormalised from the batch so corpus filters apply without a join
+    batch_id = Column(UUID(as_uuid=True))
+    tenant_id = Column(UUID(as_uuid=True))  # Batch owner
+    course = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,18 @@
+import uuid
+from sqlalchemy import Column, String, Text, DateTime, func, UUID, UniqueConstraint
+from .base import Base
+
+class ExtractedText(Base):
+    """Parsed/OCR'd text of an upload, reusable for any upload with identical bytes."""
+    __tablename__ = "extracted_texts"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "file_type", "parser_version", "ocr_settings", name="uq_extracted_text_key"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    content_hash = Column(String, nullable=False, index=True)  # sha256 of the upload bytes
+    file_type = Column(String, nullable=False)  # extension, decides which parser runs
+    parser_version = Column(String, nullable=False)
+    ocr_settings = Column(String, nullable=False)
+    text_content = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, ForeignKey, Integer, BigInteger, UUID
+from .base import Base
+
+class Fingerprint(Base):
+    """One winnowed k-gram hash of a document: the inverted index for verbatim copy detection."""
+    __tablename__ = "fingerprints"
+
+    # Primary key order makes hash lookups an index range scan
+    hash = Column(BigInteger, primary_key=True)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)  # Ordinal of the fingerprint within its document
+    start = Column(Integer, nullable=False)  # Character offsets of the k-gram in Document.text_content
+    end = Column(Integer, nullable=False)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, ForeignKey, Integer, SmallInteger, BigInteger, LargeBinary, DateTime, func, UUID
+from .base import Base
+
+class MinHashSignature(Base):
+    """A document's MinHash signature (uint32 array), for Jaccard estimates against its LSH candidates."""
+    __tablename__ = "minhash_signatures"
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), primary_key=True)
+    num_perm = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class MinHashBand(Base):
+    """One LSH band bucket of a document; documents sharing a row are candidate near-duplicates."""
+    __tablename__ = "minhash_bands"
+
+    # Primary key order makes (band, bucket) lookups an index range scan
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), primary_key=True)
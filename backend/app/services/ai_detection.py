@@ -1,9 +1,12 @@
 import os
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence
 
+from app.core.config import settings
 from app.core.provider_router import ProviderRouter, ProviderType
+from app.core.model_registry import AI_DETECTION_MODEL, get_text_classifier, registry
+from app.services.chunking import chunker_for
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,17 +15,14 @@ class AIDetectionService:
     def __init__(self):
         self.router = ProviderRouter()
         self.classifier = None
-        self._load_local_model()
+        self._chunker = None
 
     def _load_local_model(self):
         """Lazy load the local model to save resources if not used."""
         if self.classifier is None and self.router.local_model_available:
             try:
-                from transformers import pipeline
-                # Use a standard, reliable model for AI detection
-                model_name = "roberta-base-openai-detector" 
-                self.classifier = pipeline("text-classification", model=model_name)
-                logger.info(f"Local AI detection model '{model_name}' loaded successfully.")
+                # Shared per process through the model registry
+                self.classifier = get_text_classifier(AI_DETECTION_MODEL)
             except Exception as e:
                 logger.error(f"Failed to load local AI model: {e}")
                 self.classifier = None
@@ -58,11 +58,37 @@ class AIDetectionService:
             logger.exception(f"AI detection failed: {e}")
             return self._error_response(f"Internal error: {str(e)}")
     
+    def detect_many(self, texts: Sequence[str], provider: str = ProviderType.LOCAL, threshold: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        Detects AI-generated content for many texts at once.
+
+        With the local provider the chunks of every text go through the
+        classifier in shared batches; external providers are called per text.
+        Returns one result dict per text, in input order.
+        """
+        try:
+            validated_provider = self.router.validate_provider(provider)
+            self.router.log_usage(validated_provider, "ai_detection", {
+                "texts": len(texts),
+                "text_length": sum(len(text) for text in texts)
+            })
+
+            if validated_provider == ProviderType.LOCAL:
+                return self._detect_local_many(texts, threshold)
+            return [self._detect_external(text, validated_provider, threshold) for text in texts]
+
+        except ValueError as e:
+            logger.error(f"Provider validation failed: {e}")
+            return [self._error_response(str(e)) for _ in texts]
+        except Exception as e:
+            logger.exception(f"AI detection failed: {e}")
+            return [self._error_response(f"Internal error: {str(e)}") for _ in texts]
+
     def health_check(self) -> Dict[str, Any]:
         """Check if the AI detection service is operational."""
         return {
-            "status": "healthy" if self.classifier is not None else "unavailable",
-            "local_model_loaded": self.classifier is not None,
+            "status": "healthy" if self.router.local_model_available else "unavailable",
+            "local_model_loaded": registry.is_loaded(AI_DETECTION_MODEL),
             "external_providers": {
                 "openai": self.router.openai_api_key is not None,
                 "together": self.router.together_api_key is not None
@@ -71,27 +97,43 @@ class AIDetectionService:
 
     def _detect_local(self, text: str, threshold: float) -> Dict[str, Any]:
         """Run detection using local HuggingFace model."""
+        return self._detect_local_many([text], threshold)[0]
+
+    def _detect_local_many(self, texts: Sequence[str], threshold: float) -> List[Dict[str, Any]]:
+        """Run the local model over every chunk of every text in batched pipeline calls."""
         if not self.classifier:
             self._load_local_model()
             if not self.classifier:
-                return self._error_response("Local model unavailable")
+                return [self._error_response("Local model unavailable") for _ in texts]
+
+        # Token windows sized to the model limit; truncation only guards the edges
+        if self._chunker is None:
+            self._chunker = chunker_for(
+                getattr(self.classifier, "tokenizer", None), None, settings.CHUNK_STRIDE_TOKENS,
+                fallback_chars=512, fallback_overlap=0
+            )
+        chunk_lists = [self._chunker.chunks(text) for text in texts]
+        flat = [chunk for chunks in chunk_lists for chunk in chunks]
 
-        # Chunking for long text (simple overlap)
-        chunk_size = 512 # Token approximation
-        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-        
-        # Limit chunks to prevent OOM/timeout on massive files
-        chunks = chunks[:20] 
-        
-        results = []
         try:
-            for chunk in chunks:
-                # Truncate to 512 chars roughly to be safe for model
-                res = self.classifier(chunk[:512])[0]
-                results.append(res)
+            outputs = self.classifier(
+                flat,
+                batch_size=settings.AI_DETECTION_BATCH_SIZE,
+                truncation=True,
+                max_length=512
+            ) if flat else []
         except Exception as e:
-            return self._error_response(f"Model inference failed: {e}")
+            return [self._error_response(f"Model inference failed: {e}") for _ in texts]
+
+        responses = []
+        start = 0
+        for chunks in chunk_lists:
+            results = outputs[start:start + len(chunks)]
+            start += len(chunks)
+            responses.append(self._aggregate_local(results, threshold))
+        return responses
 
+    def _aggregate_local(self, results: List[Dict[str, Any]], threshold: float) -> Dict[str, Any]:
         if not results:
             return self._error_response("No text to analyze")
 
@@ -121,7 +163,7 @@ class AIDetectionService:
             "provider": ProviderType.LOCAL,
             "details": {
                 "chunks_analyzed": len(results),
-                "model": "roberta-base-openai-detector"
+                "model": AI_DETECTION_MODEL
             }
         }
 
@@ -0,0 +1,421 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from app.core.config import settings
+
+# Per-chunk metadata; ids are stored as uuid hex so NumPy comparisons and np.isin work on them
+META_DTYPE = np.dtype([
+    ("doc", "S32"),
+    ("batch", "S32"),
+    ("tenant", "S32"),
+    ("course", "<i4"),  # Code from the manifest's course table, -1 for none
+    ("chunk", "<i4"),
+    ("start", "<i4"),
+    ("end", "<i4"),
+])
+
+_COPY_ROWS = 65536  # Rows moved per step while compacting
+
+
+def _hex(value) -> bytes:
+    return uuid.UUID(str(value)).hex.encode() if value is not None else b""
+
+
+def _normalize(vectors) -> np.ndarray:
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2, copy=True)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _train_centroids(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: unit-length centroids maximising the cosine to their members."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty lists keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+    return centroids
+
+
+def _merge_top_k(best_scores: np.ndarray, best_rows: np.ndarray, queries: np.ndarray,
+                 scores: np.ndarray, rows: np.ndarray, k: int):
+    """Fold ``scores`` (queries x rows) into the running per-query top-k."""
+    cand_scores = np.concatenate([best_scores[queries], scores], axis=1)
+    cand_rows = np.concatenate([best_rows[queries], np.broadcast_to(rows, scores.shape)], axis=1)
+    top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+    best_scores[queries] = np.take_along_axis(cand_scores, top, axis=1)
+    best_rows[queries] = np.take_along_axis(cand_rows, top, axis=1)
+
+
+class _Segment:
+    """Vectors and metadata of one immutable segment, memory-mapped read-only."""
+
+    def __init__(self, path: Path, inverted: bool = False):
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.meta = np.load(path / "meta.npy", mmap_mode="r")
+        # Compacted generations are IVF lists: rows sorted by list, ``offsets`` delimiting each list
+        self.centroids = np.load(path / "centroids.npy") if inverted else None
+        self.offsets = np.load(path / "offsets.npy") if inverted else None
+
+    def __len__(self):
+        return len(self.meta)
+
+
+class _Snapshot:
+    """One manifest version with its segments opened."""
+
+    def __init__(self, root: Path, manifest: Dict[str, Any], version):
+        self.version = version
+        self.manifest = manifest
+        self.base = _Segment(root / manifest["base"], inverted=True) if manifest["base"] else None
+        self.segments = [_Segment(root / name) for name in manifest["segments"]]
+        self.tombstones = np.array(sorted(manifest["tombstones"]), dtype="S32")
+
+
+class ChunkIndex:
+    """
+    In-process approximate nearest-neighbour index over chunk embeddings.
+
+    The index lives in a directory of immutable NumPy files that every API and
+    Celery process opens with ``mmap_mode="r"``, so all processes share one copy
+    through the page cache. A JSON manifest, replaced atomically, names the
+    current files:
+
+    - a compacted generation: an IVF-Flat index whose rows are sorted by their
+      k-means list, searched by probing the ``nprobe`` closest lists;
+    - delta segments appended by ``add``, searched exactly until compacted;
+    - tombstoned document ids, filtered out of every search.
+
+    ``compact`` folds the deltas and tombstones into a new generation without
+    blocking inserts. Readers pick up a new manifest on their next search.
+    Writers serialise on a file lock.
+    """
+
+    def __init__(self, path: Optional[str] = None, nprobe: Optional[int] = None, nlist: Optional[int] = None):
+        self.root = Path(path or settings.CORPUS_INDEX_DIR)
+        self.nprobe = nprobe or settings.CORPUS_INDEX_NPROBE
+        self.nlist = settings.CORPUS_INDEX_NLIST if nlist is None else nlist  # 0 sizes it from the corpus
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._snapshot: Optional[_Snapshot] = None
+        self._snapshot_lock = threading.Lock()
+
+    # Reading
+
+    def search(self, queries, k: int, tenant_id=None, course: Optional[str] = None,
+               exclude_document_id=None, exclude_batch_id=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The ``k`` most similar chunks for every query vector, by cosine similarity.
+        Returns (scores, meta), both shaped (queries, k) and sorted best first;
+        missing neighbours have score ``-inf``.
+        """
+        snapshot = self._current()
+        queries = _normalize(queries)
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        best_rows = np.full((n_queries, k), -1, dtype=np.int64)
+        sources = ([snapshot.base] if snapshot.base else []) + snapshot.segments
+        course_code = snapshot.manifest["courses"].get(course, -2) if course is not None else None
+
+        def mask_for(meta: np.ndarray) -> np.ndarray:
+            mask = np.ones(len(meta), dtype=bool)
+            if tenant_id is not None:
+                mask &= meta["tenant"] == _hex(tenant_id)
+            if course_code is not None:
+                mask &= meta["course"] == course_code
+            if exclude_document_id is not None:
+                mask &= meta["doc"] != _hex(exclude_document_id)
+            if exclude_batch_id is not None:
+                mask &= meta["batch"] != _hex(exclude_batch_id)
+            if len(snapshot.tombstones):
+                mask &= ~np.isin(meta["doc"], snapshot.tombstones)
+            return mask
+
+        start = 0
+        for source in sources:
+            if source.centroids is not None and len(source):
+                self._search_lists(source, start, queries, mask_for, best_scores, best_rows, k)
+            elif len(source):
+                rows = np.flatnonzero(mask_for(source.meta))
+                if len(rows):
+                    scores = queries @ np.asarray(source.vectors[rows]).T
+                    _merge_top_k(best_scores, best_rows, np.arange(n_queries), scores, rows + start, k)
+            start += len(source)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return best_scores, self._meta(sources, best_rows)
+
+    def _search_lists(self, base: _Segment, start: int, queries: np.ndarray, mask_for,
+                      best_scores: np.ndarray, best_rows: np.ndarray, k: int):
+        nprobe = min(self.nprobe, len(base.centroids))
+        probes = np.argpartition(-(queries @ base.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        # Every probed list is read once and scored against all queries probing it
+        for list_id in np.unique(probes):
+            list_start, list_end = int(base.offsets[list_id]), int(base.offsets[list_id + 1])
+            if list_start == list_end:
+                continue
+            rows = np.flatnonzero(mask_for(base.meta[list_start:list_end])) + list_start
+            if not len(rows):
+                continue
+            probing = np.flatnonzero((probes == list_id).any(axis=1))
+            scores = queries[probing] @ np.asarray(base.vectors[rows]).T
+            _merge_top_k(best_scores, best_rows, probing, scores, rows + start, k)
+
+    @staticmethod
+    def _meta(sources: List[_Segment], rows: np.ndarray) -> np.ndarray:
+        meta = np.zeros(rows.shape, dtype=META_DTYPE)
+        starts = np.cumsum([0] + [len(source) for source in sources])
+        for i, source in enumerate(sources):
+            hit = (rows >= starts[i]) & (rows < starts[i + 1])
+            if hit.any():
+                meta[hit] = source.meta[rows[hit] - starts[i]]
+        return meta
+
+    def __len__(self):
+        """Live (not tombstoned) chunks."""
+        snapshot = self._current()
+        total = 0
+        for source in ([snapshot.base] if snapshot.base else []) + snapshot.segments:
+            total += len(source)
+            if len(snapshot.tombstones):
+                total -= int(np.isin(source.meta["doc"], snapshot.tombstones).sum())
+        return total
+
+    def _current(self) -> _Snapshot:
+        """The snapshot of the current manifest, reopened only when the manifest was replaced."""
+        with self._snapshot_lock:
+            for _ in range(3):
+                version = self._manifest_version()
+                if self._snapshot is not None and self._snapshot.version == version:
+                    return self._snapshot
+                try:
+                    self._snapshot = _Snapshot(self.root, self._read_manifest(), version)
+                    return self._snapshot
+                except FileNotFoundError:
+                    # A compaction removed files of the manifest we read; read the new one
+                    continue
+            raise RuntimeError(f"Chunk index at {self.root} keeps changing while it is opened")
+
+    # Writing
+
+    def add(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        Append documents as one delta segment. Each item holds 'document_id',
+        'batch_id', 'tenant_id', 'course', 'spans' and 'embeddings'.
+        Returns the number of chunks added.
+        """
+        documents = [doc for doc in documents if len(doc["embeddings"])]
+        if not documents:
+            return 0
+        with self._write_lock():
+            manifest = self._read_manifest()
+            courses = manifest["courses"]
+            metas = []
+            for doc in documents:
+                course = doc.get("course")
+                if course is not None and course not in courses:
+                    courses[course] = len(courses)
+                meta = np.zeros(len(doc["spans"]), dtype=META_DTYPE)
+                meta["doc"] = _hex(doc["document_id"])
+                meta["batch"] = _hex(doc.get("batch_id"))
+                meta["tenant"] = _hex(doc.get("tenant_id"))
+                meta["course"] = courses[course] if course is not None else -1
+                meta["chunk"] = np.arange(len(doc["spans"]))
+                spans = np.asarray(doc["spans"], dtype=np.int64).reshape(-1, 2)
+                meta["start"], meta["end"] = spans[:, 0], spans[:, 1]
+                metas.append(meta)
+
+            name = f"seg-{manifest['next_segment']:08d}"
+            self._write_segment(name, {
+                "vectors": _normalize(np.concatenate([np.asarray(doc["embeddings"]) for doc in documents])),
+                "meta": np.concatenate(metas),
+            })
+            manifest["segments"].append(name)
+            manifest["next_segment"] += 1
+            self._write_manifest(manifest)
+        return sum(len(meta) for meta in metas)
+
+    def delete_documents(self, document_ids: Iterable[Any]):
+        """Tombstone documents; their chunks are hidden at once and dropped by the next compaction."""
+        with self._write_lock():
+            manifest = self._read_manifest()
+            manifest["tombstones"] = sorted(set(manifest["tombstones"]) | {_hex(d).decode() for d in document_ids})
+            self._write_manifest(manifest)
+
+    def compact(self) -> bool:
+        """
+        Merge the current generation and delta segments, minus tombstoned
+        documents, into a new IVF generation. Inserts made meanwhile stay as
+        deltas of the new manifest. Returns False if there was nothing to do or
+        another process is already compacting.
+        """
+        with self._exclusive("compact.lock", blocking=False) as acquired:
+            if not acquired:
+                return False
+            with self._write_lock():
+                snapshot = _Snapshot(self.root, self._read_manifest(), None)
+            manifest = snapshot.manifest
+            if not manifest["segments"] and not manifest["tombstones"]:
+                return False
+
+            name = f"gen-{manifest['generation'] + 1:08d}"
+            self._build_generation(name, snapshot)
+
+            with self._write_lock():
+                current = self._read_manifest()
+                retired = ([current["base"]] if current["base"] else []) + manifest["segments"]
+                current["base"] = name
+                current["generation"] += 1
+                current["segments"] = [s for s in current["segments"] if s not in manifest["segments"]]
+                applied = set(manifest["tombstones"])
+                current["tombstones"] = [t for t in current["tombstones"] if t not in applied]
+                self._write_manifest(current)
+            # Processes that still map the old files keep reading them until they reload
+            for old in retired:
+                shutil.rmtree(self.root / old, ignore_errors=True)
+            return True
+
+    def _build_generation(self, name: str, snapshot: _Snapshot):
+        sources = ([snapshot.base] if snapshot.base else []) + snapshot.segments
+        kept = []
+        for source in sources:
+            keep = np.ones(len(source), dtype=bool)
+            if len(snapshot.tombstones):
+                keep = ~np.isin(source.meta["doc"], snapshot.tombstones)
+            kept.append(np.flatnonzero(keep))
+        total = sum(len(rows) for rows in kept)
+        dim = next((source.vectors.shape[1] for source in sources if len(source)), 1)
+
+        nlist = self.nlist or int(4 * np.sqrt(total))
+        nlist = max(1, min(nlist, total))
+        rng = np.random.default_rng(0)
+        # Train on at most 64 samples per list
+        sample_size = min(total, 64 * nlist)
+        picks = np.sort(rng.choice(total, sample_size, replace=False)) if total else np.zeros(0, dtype=np.int64)
+        locator_source = np.concatenate([np.full(len(rows), i) for i, rows in enumerate(kept)] or [[]]).astype(np.int64)
+        locator_row = np.concatenate(kept or [[]]).astype(np.int64)
+
+        def gather(field: str, positions: np.ndarray) -> np.ndarray:
+            out = np.empty(
+                (len(positions), dim) if field == "vectors" else len(positions),
+                dtype=np.float32 if field == "vectors" else META_DTYPE
+            )
+            for i, source in enumerate(sources):
+                hit = locator_source[positions] == i
+                if hit.any():
+                    out[hit] = getattr(source, field)[locator_row[positions[hit]]]
+            return out
+
+        if total:
+            centroids = _train_centroids(gather("vectors", picks), nlist)
+            assign = np.empty(total, dtype=np.int64)
+            for i in range(0, total, _COPY_ROWS):
+                assign[i:i + _COPY_ROWS] = np.argmax(
+                    gather("vectors", np.arange(i, min(i + _COPY_ROWS, total))) @ centroids.T, axis=1
+                )
+            order = np.argsort(assign, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        else:
+            centroids = np.zeros((1, dim), dtype=np.float32)
+            order = np.zeros(0, dtype=np.int64)
+            offsets = np.zeros(2, dtype=np.int64)
+
+        tmp = self.root / f".{name}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        vectors = open_memmap(tmp / "vectors.npy", mode="w+", dtype=np.float32, shape=(total, dim))
+        meta = open_memmap(tmp / "meta.npy", mode="w+", dtype=META_DTYPE, shape=(total,))
+        # Copied in bounded steps, so compaction never holds the whole corpus in memory
+        for i in range(0, total, _COPY_ROWS):
+            positions = order[i:i + _COPY_ROWS]
+            vectors[i:i + len(positions)] = gather("vectors", positions)
+            meta[i:i + len(positions)] = gather("meta", positions)
+        vectors.flush()
+        meta.flush()
+        del vectors, meta
+        np.save(tmp / "centroids.npy", centroids)
+        np.save(tmp / "offsets.npy", offsets)
+        os.rename(tmp, self.root / name)
+
+    # Files
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def _manifest_version(self):
+        try:
+            stat = os.stat(self._manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "base": None, "segments": [], "next_segment": 0,
+                    "tombstones": [], "courses": {}}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp = self.root / f".manifest.json.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path)
+
+    def _write_segment(self, name: str, arrays: Dict[str, np.ndarray]):
+        tmp = self.root / f".{name}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        for field, array in arrays.items():
+            np.save(tmp / f"{field}.npy", array)
+        os.rename(tmp, self.root / name)
+
+    def _write_lock(self):
+        return self._exclusive("write.lock")
+
+    @contextmanager
+    def _exclusive(self, lock_name: str, blocking: bool = True):
+        """An inter-process file lock; yields whether it was acquired."""
+        with open(self.root / lock_name, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_chunk_index: Optional[ChunkIndex] = None
+_chunk_index_lock = threading.Lock()
+
+
+def get_chunk_index() -> ChunkIndex:
+    """Return the process-wide chunk index at CORPUS_INDEX_DIR."""
+    global _chunk_index
+    with _chunk_index_lock:
+        if _chunk_index is None:
+            _chunk_index = ChunkIndex()
+        return _chunk_index
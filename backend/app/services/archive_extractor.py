@@ -1,9 +1,13 @@
 import zipfile
 import tarfile
-import os
-from typing import List, Tuple
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
-import tempfile
+from app.core.config import settings
+
+
+class ArchiveLimitError(ValueError):
+    """Raised when an archive exceeds size, member-count or compression-ratio limits."""
+
 
 class ArchiveExtractor:
     """Handles extraction of tar and zip archives"""
@@ -22,69 +26,97 @@ class ArchiveExtractor:
         return path.suffix in ArchiveExtractor.SUPPORTED_EXTENSIONS
     
     @staticmethod
-    def extract_archive(archive_path: str, extract_to: str = None) -> List[str]:
-        """
-        Extract archive and return list of extracted file paths
-        
-        Args:
-            archive_path: Path to the archive file
-            extract_to: Directory to extract to (creates temp dir if None)
-            
-        Returns:
-            List of paths to extracted files
-        """
-        if extract_to is None:
-            extract_to = tempfile.mkdtemp()
-        
-        extracted_files = []
-        path = Path(archive_path)
-        
-        try:
-            if path.suffix == '.zip':
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_to)
-                    extracted_files = [
-                        os.path.join(extract_to, name) 
-                        for name in zip_ref.namelist() 
-                        if not name.endswith('/')
-                    ]
-            
-            elif '.tar' in path.name:
-                # Handles .tar, .tar.gz, .tar.bz2, etc.
-                mode = 'r:*'  # Auto-detect compression
-                with tarfile.open(archive_path, mode) as tar_ref:
-                    tar_ref.extractall(extract_to)
-                    extracted_files = [
-                        os.path.join(extract_to, member.name) 
-                        for member in tar_ref.getmembers() 
-                        if member.isfile()
-                    ]
-        except Exception as e:
-            print(f"Error extracting archive {archive_path}: {e}")
-            raise
-        
-        return extracted_files
-    
-    @staticmethod
-    def extract_and_filter(archive_path: str, allowed_extensions: List[str] = None) -> List[Tuple[str, str]]:
+    def iter_members(fileobj: BinaryIO, archive_size: int, allowed_extensions: Optional[Iterable[str]] = None,
+                     max_member_bytes: Optional[int] = None, max_total_bytes: Optional[int] = None,
+                     max_ratio: Optional[float] = None, max_members: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
         """
-        Extract archive and filter files by extension
-        
+        Stream (member name, bytes) pairs out of a zip or tar archive without touching disk.
+
+        Members whose extension is not allowed are skipped before any of their
+        data is read. Declared and actual uncompressed sizes are both checked
+        against the per-member and total limits, and the overall
+        uncompressed/compressed ratio is capped, so decompression bombs fail
+        fast with ArchiveLimitError instead of filling memory.
+
         Args:
-            archive_path: Path to archive
-            allowed_extensions: List of allowed extensions (e.g., ['.txt', '.pdf'])
-            
-        Returns:
-            List of tuples (original_filename, extracted_path)
+            fileobj: Readable binary stream positioned at the start of the archive
+            archive_size: Compressed size of the archive in bytes
+            allowed_extensions: Extensions to keep (e.g. ['.txt', '.pdf']); all if None
         """
-        extracted_files = ArchiveExtractor.extract_archive(archive_path)
-        
-        if allowed_extensions:
-            filtered = []
-            for fpath in extracted_files:
-                ext = Path(fpath).suffix.lower()
-                if ext in allowed_extensions:
-                    filtered.append((Path(fpath).name, fpath))
-            return filtered
-        
-        return [(Path(fpath).name, fpath) for fpath in extracted_files]
+        max_member_bytes = max_member_bytes or settings.ARCHIVE_MAX_MEMBER_MB * 1024 * 1024
+        max_total_bytes = max_total_bytes or settings.ARCHIVE_MAX_TOTAL_MB * 1024 * 1024
+        max_ratio = max_ratio or settings.ARCHIVE_MAX_RATIO
+        max_members = max_members or settings.ARCHIVE_MAX_MEMBERS
+        allowed = {ext.lower() for ext in allowed_extensions} if allowed_extensions else None
+
+        budget = _ExpansionBudget(archive_size, max_member_bytes, max_total_bytes, max_ratio, max_members)
+
+        def wanted(name: str) -> bool:
+            return allowed is None or Path(name).suffix.lower() in allowed
+
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            with zipfile.ZipFile(fileobj) as zip_ref:
+                for info in zip_ref.infolist():
+                    if info.is_dir() or not wanted(info.filename):
+                        continue
+                    budget.admit(info.filename, info.file_size)
+                    with zip_ref.open(info) as member:
+                        yield info.filename, budget.read(info.filename, member)
+        else:
+            fileobj.seek(0)
+            # Stream mode reads members sequentially and never seeks backwards
+            with tarfile.open(fileobj=fileobj, mode="r|*") as tar_ref:
+                for member in tar_ref:
+                    # Regular files only: links, devices and directories are ignored
+                    if not member.isfile() or not wanted(member.name):
+                        continue
+                    budget.admit(member.name, member.size)
+                    yield member.name, budget.read(member.name, tar_ref.extractfile(member))
+
+
+class _ExpansionBudget:
+    """Tracks how much an archive has expanded and enforces the configured limits."""
+
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, archive_size: int, max_member_bytes: int, max_total_bytes: int,
+                 max_ratio: float, max_members: int):
+        self.archive_size = max(archive_size, 1)
+        self.max_member_bytes = max_member_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_ratio = max_ratio
+        self.max_members = max_members
+        self.members = 0
+        self.total = 0
+
+    def admit(self, name: str, declared_size: int):
+        self.members += 1
+        if self.members > self.max_members:
+            raise ArchiveLimitError(f"Archive has more than {self.max_members} members")
+        if declared_size > self.max_member_bytes:
+            raise ArchiveLimitError(f"Archive member {name} is larger than {self.max_member_bytes} bytes")
+        self._check_total(declared_size)
+
+    def read(self, name: str, stream: BinaryIO) -> bytes:
+        # Declared sizes can lie, so count what actually comes out of the decompressor
+        parts = []
+        size = 0
+        while True:
+            part = stream.read(self.READ_SIZE)
+            if not part:
+                break
+            size += len(part)
+            if size > self.max_member_bytes:
+                raise ArchiveLimitError(f"Archive member {name} is larger than {self.max_member_bytes} bytes")
+            self._check_total(len(part))
+            self.total += len(part)
+            parts.append(part)
+        return b"".join(parts)
+
+    def _check_total(self, extra: int):
+        expanded = self.total + extra
+        if expanded > self.max_total_bytes:
+            raise ArchiveLimitError(f"Archive expands to more than {self.max_total_bytes} bytes")
+        if expanded / self.archive_size > self.max_ratio:
+            raise ArchiveLimitError(f"Archive compression ratio exceeds {self.max_ratio}")
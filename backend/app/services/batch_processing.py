@@ -1,4 +1,5 @@
-from celery import Celery
+from celery import Celery, chord
+from sqlalchemy import func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -8,8 +9,13 @@ from app.models.document import Document
 from app.models.comparison import Comparison
 from app.services.embedding import EmbeddingService
 from app.services.ai_detection import AIDetectionService
+from app.services.chunk_store import load_chunk_embeddings
+from app.services.write_behind import WriteBehindBuffer
 # from app.services.comparison import ComparisonService # Deleted
 import asyncio
+import uuid
+from collections import defaultdict
+import numpy as np
 
 celery = Celery(__name__)
 celery.config_from_object("app.core.celery")
@@ -20,93 +26,404 @@ SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 embedding_service = EmbeddingService()
 ai_service = AIDetectionService()
 
+# A batch is "partial" when some similarity tiles failed, so some of its pairs were never compared
+FINISHED_STATUSES = ("completed", "partial")
+
+def _run(coro):
+    """Run a coroutine on a fresh loop, releasing pooled connections bound to it afterwards."""
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+    return asyncio.run(runner())
+
+@celery.task
+def extract_batch(batch_id: str, provider: str = "local", ai_threshold: float = 0.5):
+    """Expand, hash and cache-match a batch's uploads, then fan out its analysis"""
+    from app.services.ingestion import prepare_batch_documents
+
+    async def prepare():
+        async with SessionLocal() as session:
+            await prepare_batch_documents(session, batch_id)
+
+    _run(prepare())
+    process_batch(batch_id, provider=provider, ai_threshold=ai_threshold)
+
+@celery.task
+def collect_unreferenced_blobs():
+    """Periodic (celery beat) removal of upload blobs no document references anymore"""
+    from app.services.blob_store import BlobStore
+
+    async def collect():
+        async with SessionLocal() as session:
+            return await BlobStore().collect_garbage(session)
+
+    removed = _run(collect())
+    print(f"Removed {removed} unreferenced blobs")
+    return removed
+
+@celery.task
+def compact_chunk_index():
+    """Periodic (celery beat) compaction of the local corpus index's delta segments and tombstones"""
+    if settings.CORPUS_INDEX_BACKEND != "local":
+        return False
+    from app.services.ann_index import get_chunk_index
+    return get_chunk_index().compact()
+
 @celery.task
 def process_batch(batch_id: str, provider: str = "local", ai_threshold: float = 0.5):
-    """Process a batch of documents for plagiarism and/or AI detection"""
-    asyncio.run(_process_batch_async(batch_id, provider, ai_threshold))
+    """
+    Fan a batch out into process_documents tasks of PIPELINE_DOCS_PER_TASK
+    documents each, joined by a chord whose callback starts the tiled similarity stage.
+    """
+    doc_ids = _run(_start_batch(batch_id))
+    if doc_ids is None:
+        return
+    similarity = compare_batch.si(batch_id)
+    if not doc_ids:
+        similarity.delay()
+        return
+    size = max(1, settings.PIPELINE_DOCS_PER_TASK)
+    chord(
+        process_documents.si(doc_ids[i:i + size], provider=provider, ai_threshold=ai_threshold)
+        for i in range(0, len(doc_ids), size)
+    )(similarity)
 
-async def _process_batch_async(batch_id: str, provider: str, ai_threshold: float):
+async def _start_batch(batch_id: str):
     async with SessionLocal() as session:
-        # Get batch and documents
         batch = await session.get(Batch, batch_id)
         if not batch:
             print(f"Batch {batch_id} not found")
-            return
-        
+            return None
+
         batch.status = "processing"
+        batch.processed_docs = 0
+        batch.metrics = {}
+        # Every document except uploads whose extraction already failed. Identical
+        # texts (or uploads) are ordered next to each other, so they mostly share a
+        # task and all but the first skip the models.
+        result = await session.execute(
+            select(Document.id)
+            .where(Document.batch_id == batch_id, Document.status != "failed")
+            .order_by(func.coalesce(Document.text_hash, Document.content_hash), Document.id)
+        )
+        doc_ids = [str(doc_id) for doc_id in result.scalars()]
         await session.commit()
-        
-        # Get all documents in this batch
-        from sqlalchemy import select
+        return doc_ids
+
+@celery.task
+def process_documents(doc_ids, provider: str = "local", ai_threshold: float = 0.5):
+    """Extraction (if still pending), AI detection and chunk embedding for a slice of a batch"""
+    try:
+        _run(_process_documents_async(doc_ids, provider, ai_threshold))
+    except Exception as e:
+        # Never fail the chord header: the batch must still be finalized
+        print(f"Error processing documents {doc_ids}: {e}")
+        _run(_mark_failed(doc_ids))
+
+async def _mark_failed(doc_ids):
+    async with SessionLocal() as session:
+        await session.execute(
+            update(Document)
+            .where(Document.id.in_(doc_ids), Document.status != "completed")
+            .values(status="failed")
+        )
+        await session.commit()
+
+async def _process_documents_async(doc_ids, provider: str, ai_threshold: float):
+    from app.services.pipeline import DocumentPipeline
+
+    async with SessionLocal() as session:
+        pipeline = DocumentPipeline(
+            session, SessionLocal, ai_service, embedding_service, provider, ai_threshold
+        )
+        timings = await pipeline.run(doc_ids)
+        print(f"Processed {len(doc_ids)} documents: {timings}")
+
+        # Per-stage timings summed over every slice of the batch
+        batch_ids = (await session.execute(
+            select(Document.batch_id).where(Document.id.in_(doc_ids)).distinct()
+        )).scalars().all()
+        for batch_id in batch_ids:
+            batch = (await session.execute(
+                select(Batch).where(Batch.id == batch_id).with_for_update()
+            )).scalars().first()
+            metrics = dict(batch.metrics or {})
+            for stage, timing in timings.items():
+                total = metrics.get(stage, {"seconds": 0.0, "calls": 0})
+                metrics[stage] = {
+                    "seconds": round(total["seconds"] + timing["seconds"], 3),
+                    "calls": total["calls"] + timing["calls"]
+                }
+            if pipeline.duplicates:
+                duplicates = dict(metrics.get("duplicates", {}))
+                for key, count in pipeline.duplicates.items():
+                    duplicates[key] = duplicates.get(key, 0) + count
+                metrics["duplicates"] = duplicates
+            batch.metrics = metrics
+        await session.commit()
+
+@celery.task
+def compare_batch(batch_id: str):
+    """
+    Chord callback: split the batch's document-pair matrix into tiles, run each
+    tile as its own compare_tile task and finalize the batch once all are done.
+    """
+    tiles = _run(_plan_tiles(batch_id))
+    finalize = finalize_batch.si(batch_id)
+    if not tiles:
+        finalize.delay()
+        return
+    chord(compare_tile.si(batch_id, ids_a, ids_b, pairs) for ids_a, ids_b, pairs in tiles)(finalize)
+
+async def _plan_tiles(batch_id: str):
+    """
+    Tiles as (doc ids A, doc ids B or None for a diagonal tile, candidate pairs
+    or None for all pairs). Documents are grouped so the chunk vectors of both
+    sides of a tile fit SIMILARITY_TILE_MB. Exact duplicates are represented
+    by one document (finalize_batch copies its comparisons to the others). With
+    MINHASH_PREFILTER only candidate pairs are compared and tiles without any
+    are skipped.
+    """
+    from app.models.minhash import MinHashSignature
+
+    async with SessionLocal() as session:
+        batch = await session.get(Batch, batch_id)
+        if not batch or batch.status in FINISHED_STATUSES:
+            return []
+        if (batch.analysis_type or "plagiarism") not in ["plagiarism", "both", "mixed"]:
+            return []
+
         result = await session.execute(
-            select(Document).where(Document.batch_id == batch_id)
+            select(Document.id, Document.chunk_count, Document.embedding, Document.duplicate_of,
+                   MinHashSignature.signature)
+            .outerjoin(MinHashSignature, MinHashSignature.document_id == Document.id)
+            .where(Document.batch_id == batch_id, Document.status == "completed", Document.chunk_count > 0)
+            .order_by(Document.id)
         )
-        documents = result.scalars().all()
-        
-        analysis_type = batch.analysis_type or "plagiarism"  # default to plagiarism
-        
-        # Instantiate PlagiarismService
-        from app.services.plagiarism import PlagiarismService
-        plagiarism_service = PlagiarismService(session)
-
-        # Process each document
-        for doc in documents:
-            try:
-                doc.status = "processing"
-                await session.commit()
-                
-                # AI Detection
-                if analysis_type in ["ai", "both", "mixed"]:
-                    if doc.text_content:
-                        ai_result = ai_service.detect(doc.text_content, provider=provider, threshold=ai_threshold)
-                        doc.ai_score = ai_result.get("score", 0.0)
-                        doc.is_ai_generated = ai_result.get("is_ai", False)
-                        doc.ai_confidence = ai_result.get("confidence", 0.0)
-                        doc.ai_provider = ai_result.get("provider", "unknown")
-                        
-                        # Store detailed AI detection result in AIDetection table
-                        from app.models.ai_detection import AIDetection
-                        ai_detection_record = AIDetection(
-                            document_id=doc.id,
-                            model_version=ai_result.get("details", {}).get("model", "unknown"),
-                            probability=ai_result.get("score", 0.0),
-                            meta_data={
-                                "provider": ai_result.get("provider", "unknown"),
-                                "confidence": ai_result.get("confidence", 0.0),
-                                "label": ai_result.get("label", "unknown"),
-                                "details": ai_result.get("details", {})
-                            }
-                        )
-                        session.add(ai_detection_record)
-                
-                # Plagiarism Detection (semantic similarity)
-                if analysis_type in ["plagiarism", "both", "mixed"]:
-                    if doc.text_content and embedding_service.model:
-                        # Generate embedding (average) for legacy compatibility/search
-                        embedding = embedding_service.generate_text_embedding(doc.text_content)
-                        doc.embedding = embedding
-                        
-                        # Find similar documents in batch using new PlagiarismService
-                        similar_results = await plagiarism_service.find_similar_in_batch(doc, batch_id)
-                        
-                        # Store comparisons
-                        for res in similar_results:
-                            comparison = Comparison(
-                                doc_a=doc.id,
-                                doc_b=res["document_id"],
-                                similarity=res["similarity"],
-                                matches=res.get("matches", [])  # Store detailed matches in JSONB field
-                            )
-                            session.add(comparison)
-                
-                doc.status = "completed"
-                await session.commit()
-            except Exception as e:
-                print(f"Error processing document {doc.id}: {e}")
-                doc.status = "failed"
-                await session.commit()
-        
-        # Update batch status
-        batch.status = "completed"
-        batch.processed_docs = len([d for d in documents if d.status == "completed"])
+        rows = result.all()
+        groups = _duplicate_groups(rows)
+        if len(groups) < len(rows):
+            represented = len(rows) * (len(rows) - 1) // 2 - len(groups) * (len(groups) - 1) // 2
+            metrics = dict(batch.metrics or {})
+            metrics["duplicates"] = {**metrics.get("duplicates", {}), "skipped_pairs": represented}
+            batch.metrics = metrics
+            rows = [row for row in rows if row.id in groups]
+        if len(rows) < 2:
+            await session.commit()
+            return []
+
+        candidates = None
+        if settings.MINHASH_PREFILTER:
+            candidates, stats = _candidate_pairs(rows)
+            batch.metrics = {**(batch.metrics or {}), "prefilter": stats}
         await session.commit()
+
+    from app.services.similarity import SimilarityEngine
+    _, embeddings = await load_chunk_embeddings(batch_id, str(rows[0].id))
+    row_bytes = embeddings.shape[1] * embeddings.dtype.itemsize
+    max_rows = max(1, settings.SIMILARITY_TILE_MB * 1024 * 1024 // (2 * row_bytes))
+    groups = SimilarityEngine.plan_tiles([row.chunk_count for row in rows], max_rows)
+    ids = [str(row.id) for row in rows]
+
+    if candidates is None:
+        tiles = []
+        for i, (start_a, end_a) in enumerate(groups):
+            tiles.append((ids[start_a:end_a], None, None))
+            tiles.extend((ids[start_a:end_a], ids[start_b:end_b], None) for start_b, end_b in groups[i + 1:])
+        return tiles
+
+    group_of = {}
+    for g, (start, end) in enumerate(groups):
+        group_of.update((i, g) for i in range(start, end))
+    tile_pairs = {}
+    for i, j in sorted(candidates):
+        key = tuple(sorted((group_of[i], group_of[j])))
+        tile_pairs.setdefault(key, []).append([ids[i], ids[j]])
+    return [
+        (ids[slice(*groups[g_a])], None if g_a == g_b else ids[slice(*groups[g_b])], pairs)
+        for (g_a, g_b), pairs in sorted(tile_pairs.items())
+    ]
+
+def _duplicate_groups(rows):
+    """
+    {representative id: member ids} of a batch's documents, grouping exact
+    duplicates with their original (Document.duplicate_of). The original
+    represents its group if it is in the batch, otherwise the lowest id does.
+    """
+    members = defaultdict(list)
+    for row in rows:
+        members[row.duplicate_of or row.id].append(row.id)
+    return {(root if root in ids else min(ids)): ids for root, ids in members.items()}
+
+def _candidate_pairs(rows):
+    """
+    Index pairs worth a chunk-level comparison: LSH candidates of the MinHash
+    signatures, plus pairs whose mean embeddings have a cosine similarity at or
+    above PREFILTER_SEMANTIC_MIN (paraphrases share few shingles).
+    Returns the pairs and the pruning statistics recorded in Batch.metrics.
+    """
+    from app.services.minhash import MinHasher, semantic_pairs
+
+    hasher = MinHasher()
+    signatures = []
+    for row in rows:
+        signature = np.frombuffer(row.signature, dtype=np.uint32) if row.signature else None
+        # Signatures from other MinHash settings are not comparable; never prune those documents
+        signatures.append(signature if signature is not None and len(signature) == hasher.num_perm else None)
+    lexical = hasher.candidate_pairs(signatures)
+    semantic = semantic_pairs([row.embedding for row in rows], settings.PREFILTER_SEMANTIC_MIN)
+    candidates = lexical | semantic
+    total = len(rows) * (len(rows) - 1) // 2
+    return candidates, {
+        "pairs": total,
+        "lexical_candidates": len(lexical),
+        "semantic_only_candidates": len(semantic - lexical),
+        "compared": len(candidates),
+        "pruned_ratio": round(1 - len(candidates) / total, 4) if total else 0.0
+    }
+
+@celery.task
+def compare_tile(batch_id: str, ids_a, ids_b=None, pairs=None):
+    """One tile of the all-pairs similarity stage, merged into Comparison rows"""
+    try:
+        _run(_compare_tile_async(batch_id, ids_a, ids_b, pairs))
+    except Exception as e:
+        # Never fail the chord header: the batch must still be finalized
+        print(f"Error comparing tile of batch {batch_id}: {e}")
+        _run(_record_failed_tile(batch_id, ids_a, ids_b, pairs))
+
+async def _record_failed_tile(batch_id: str, ids_a, ids_b, pairs):
+    """Count a failed tile and the pairs it left uncompared under Batch.metrics["similarity"]"""
+    if pairs is not None:
+        skipped = len(pairs)
+    elif ids_b:
+        skipped = len(ids_a) * len(ids_b)
+    else:
+        skipped = len(ids_a) * (len(ids_a) - 1) // 2
+    async with SessionLocal() as session:
+        batch = (await session.execute(
+            select(Batch).where(Batch.id == batch_id).with_for_update()
+        )).scalars().first()
+        if batch is None:
+            return
+        metrics = dict(batch.metrics or {})
+        similarity = metrics.get("similarity", {})
+        metrics["similarity"] = {
+            "failed_tiles": similarity.get("failed_tiles", 0) + 1,
+            "uncompared_pairs": similarity.get("uncompared_pairs", 0) + skipped
+        }
+        batch.metrics = metrics
+        await session.commit()
+
+async def _compare_tile_async(batch_id: str, ids_a, ids_b, pairs=None):
+    doc_ids = list(ids_a) + list(ids_b or [])
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(Document.id, Document.text_content).where(Document.id.in_(doc_ids))
+        )
+        texts = {str(doc_id): text for doc_id, text in result.all()}
+        encodings = await asyncio.gather(*(load_chunk_embeddings(batch_id, doc_id) for doc_id in doc_ids))
+
+        from app.services.plagiarism import PlagiarismService
+        encoded_docs = [
+            (texts[doc_id] or "", spans, embeddings) for doc_id, (spans, embeddings) in zip(doc_ids, encodings)
+        ]
+        if pairs is None:
+            pair_results = PlagiarismService(session).compare_tile(encoded_docs, split=len(ids_a) if ids_b else None)
+        else:
+            position = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+            pair_results = PlagiarismService(session).compare_pairs(
+                encoded_docs, [(position[a], position[b]) for a, b in pairs]
+            )
+        # A redelivered tile leaves the rows it already wrote untouched
+        async with WriteBehindBuffer(session) as writer:
+            for res in pair_results:
+                await writer.add(Comparison, {
+                    "id": uuid.uuid4(),
+                    "doc_a": doc_ids[res["source"]],
+                    "doc_b": doc_ids[res["target"]],
+                    "similarity": res["score"],
+                    "matches": res.get("matches", [])  # Store detailed matches in JSONB field
+                }, on_conflict="uq_comparison_pair")
+
+@celery.task
+def finalize_batch(batch_id: str):
+    """Final chord callback: mark the batch completed, or partial if any tile failed"""
+    async def finalize():
+        async with SessionLocal() as session:
+            await _mirror_duplicates(session, batch_id)
+            await _finalize_batch(session, batch_id)
+
+    _run(finalize())
+
+async def _mirror_duplicates(session: AsyncSession, batch_id: str) -> int:
+    """
+    Give the exact duplicates left out of the similarity stage the comparisons
+    of their group's representative, plus a 1.0 comparison with every other
+    member. Conflicting rows are skipped, so repeating this is harmless.
+    Returns the number of pairs written.
+    """
+    batch = await session.get(Batch, batch_id)
+    if not batch or batch.status in FINISHED_STATUSES:
+        return 0
+    if (batch.analysis_type or "plagiarism") not in ["plagiarism", "both", "mixed"]:
+        return 0
+    result = await session.execute(
+        select(Document.id, Document.duplicate_of)
+        .where(Document.batch_id == batch_id, Document.status == "completed", Document.chunk_count > 0)
+    )
+    rows = result.all()
+    groups = {rep: ids for rep, ids in _duplicate_groups(rows).items() if len(ids) > 1}
+    if not groups:
+        return 0
+
+    # doc_a is the leading column of uq_comparison_pair; doc_b has no index of its own
+    comparisons = await session.execute(
+        select(Comparison.doc_a, Comparison.doc_b, Comparison.similarity, Comparison.matches)
+        .where(
+            Comparison.doc_a.in_([row.id for row in rows] + list({row.duplicate_of for row in rows} - {None})),
+            or_(Comparison.doc_a.in_(list(groups)), Comparison.doc_b.in_(list(groups)))
+        )
+    )
+    pairs = {}
+    for doc_a, doc_b, similarity, matches in comparisons.all():
+        for a in groups.get(doc_a, [doc_a]):
+            for b in groups.get(doc_b, [doc_b]):
+                if a != b and (a, b) != (doc_a, doc_b):
+                    pairs.setdefault((a, b), (similarity, matches))
+    for ids in groups.values():
+        for a in ids:
+            for b in ids:
+                if a != b:
+                    pairs[(a, b)] = (1.0, [])
+
+    async with WriteBehindBuffer(session) as writer:
+        for (a, b), (similarity, matches) in pairs.items():
+            await writer.add(Comparison, {
+                "id": uuid.uuid4(), "doc_a": a, "doc_b": b, "similarity": similarity, "matches": matches
+            }, on_conflict="uq_comparison_pair")
+    metrics = dict(batch.metrics or {})
+    metrics["duplicates"] = {**metrics.get("duplicates", {}), "mirrored_comparisons": len(pairs)}
+    batch.metrics = metrics
+    await session.commit()
+    return len(pairs)
+
+async def _finalize_batch(session: AsyncSession, batch_id: str) -> bool:
+    """
+    Mark the batch finished exactly once; only the caller whose conditional
+    update flips the status wins. Batches with failed similarity tiles end
+    "partial" rather than "completed".
+    """
+    metrics = (await session.execute(select(Batch.metrics).where(Batch.id == batch_id))).scalar()
+    failed_tiles = ((metrics or {}).get("similarity") or {}).get("failed_tiles", 0)
+    claimed = await session.execute(
+        update(Batch)
+        .where(Batch.id == batch_id, Batch.status.not_in(FINISHED_STATUSES))
+        .values(status="partial" if failed_tiles else "completed")
+        .returning(Batch.id)
+    )
+    won = claimed.first() is not None
+    await session.commit()
+    return won
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, List, Sequence, Tuple
+
+from sqlalchemy import case, delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.blob import Blob
+from app.models.document import Document
+from app.services.storage import AsyncStorageService, get_storage
+
+
+def hash_stream(stream: BinaryIO) -> Tuple[str, int]:
+    """sha256 and size of a seekable stream, which is rewound afterwards."""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(settings.STORAGE_CHUNK_KB * 1024)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+class BlobStore:
+    """
+    Content-addressed layout for uploads.
+
+    Bytes are stored once under ``blobs/<aa>/<bb>/<sha256>`` and every Document
+    holding them adds a reference to the ``Blob`` row. References are taken
+    before any bytes are written: the upsert row-locks the blob until the caller
+    commits, and only the first live reference uploads the object, so identical
+    uploads are recognised from their hash alone. Blobs whose last reference was
+    released more than ``BLOB_GC_GRACE_HOURS`` ago are removed by ``collect_garbage``.
+
+    Documents are only ever deleted when an archive is replaced by its members;
+    batches are never deleted. Any code that deletes documents must go through
+    ``delete_document`` (or ``release`` each one), otherwise their blobs keep a
+    reference and are never collected.
+    """
+
+    def __init__(self, storage: AsyncStorageService = None):
+        self.storage = storage or get_storage()
+
+    @staticmethod
+    def key_for(content_hash: str) -> str:
+        return f"blobs/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+    async def add_ref(self, session: AsyncSession, content_hash: str, size: int) -> int:
+        """Reference a blob, creating its row if needed. Returns the new reference count."""
+        stmt = pg_insert(Blob).values(
+            content_hash=content_hash,
+            storage_key=self.key_for(content_hash),
+            size=size,
+            ref_count=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.content_hash],
+            set_={"ref_count": Blob.ref_count + 1, "unreferenced_at": None}
+        ).returning(Blob.ref_count)
+        return (await session.execute(stmt)).scalar_one()
+
+    async def release(self, session: AsyncSession, content_hash: str):
+        """Drop one reference; the blob becomes collectable when none are left."""
+        await session.execute(
+            update(Blob)
+            .where(Blob.content_hash == content_hash)
+            .values(
+                ref_count=Blob.ref_count - 1,
+                unreferenced_at=case((Blob.ref_count <= 1, func.now()), else_=None)
+            )
+        )
+
+    async def delete_document(self, session: AsyncSession, document: Document):
+        """Delete ``document`` and release its blob reference, in the caller's transaction."""
+        if document.content_hash:
+            await self.release(session, document.content_hash)
+        await session.delete(document)
+
+    async def put_streams(self, session: AsyncSession, streams: Sequence[BinaryIO]) -> List[Tuple[str, str]]:
+        """
+        Reference one blob per stream and upload the ones storage does not hold yet.
+        Returns (storage key, sha256) per stream. The caller commits the session.
+        """
+        loop = asyncio.get_running_loop()
+        digests = await asyncio.gather(*(loop.run_in_executor(None, hash_stream, stream) for stream in streams))
+
+        # Each reference row-locks its blob until the caller commits; taking them in
+        # hash order means two requests sharing blobs can never wait on each other in a cycle
+        uploads = {}
+        for (content_hash, size), stream in sorted(zip(digests, streams), key=lambda item: item[0][0]):
+            if await self.add_ref(session, content_hash, size) == 1:
+                uploads.setdefault(content_hash, stream)
+
+        async def upload(content_hash: str, stream: BinaryIO):
+            key = self.key_for(content_hash)
+            # A blob resurrected from zero references still has its object until collected
+            if not await self.storage.exists(key):
+                await self.storage.save_stream(key, stream)
+
+        await asyncio.gather(*(upload(content_hash, stream) for content_hash, stream in uploads.items()))
+        return [(self.key_for(content_hash), content_hash) for content_hash, _ in digests]
+
+    async def collect_garbage(self, session: AsyncSession, grace: timedelta = None, limit: int = 500) -> int:
+        """
+        Delete unreferenced blobs older than the grace period, both object and row.
+        Rows are locked while their objects are deleted, so a concurrent upload of the
+        same bytes waits and then re-creates the blob. Returns the number of blobs removed.
+        """
+        if grace is None:
+            grace = timedelta(hours=settings.BLOB_GC_GRACE_HOURS)
+        cutoff = datetime.now(timezone.utc) - grace
+        result = await session.execute(
+            select(Blob)
+            .where(
+                Blob.ref_count <= 0,
+                Blob.unreferenced_at < cutoff,
+                # Reference counts are advisory; never drop bytes a document still points at
+                ~exists().where(Document.storage_path == Blob.storage_key)
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        blobs = result.scalars().all()
+        if not blobs:
+            await session.commit()
+            return 0
+
+        await asyncio.gather(*(self.storage.delete(blob.storage_key) for blob in blobs))
+        await session.execute(delete(Blob).where(Blob.content_hash.in_([blob.content_hash for blob in blobs])))
+        await session.commit()
+        return len(blobs)
@@ -0,0 +1,28 @@
+import io
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.chunking import Span
+from app.services.storage import get_storage
+
+
+def chunk_key(batch_id: str, doc_id: str) -> str:
+    return f"chunks/{batch_id}/{doc_id}.npz"
+
+
+async def save_chunk_embeddings(batch_id: str, doc_id: str, spans: List[Span], embeddings: np.ndarray):
+    """Persist a document's chunk spans and vectors for the batch's similarity stage."""
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        spans=np.asarray(spans, dtype=np.int64).reshape(-1, 2),
+        embeddings=np.asarray(embeddings, dtype=np.float32)
+    )
+    await get_storage().save(chunk_key(batch_id, doc_id), buffer.getvalue())
+
+
+async def load_chunk_embeddings(batch_id: str, doc_id: str) -> Tuple[List[Span], np.ndarray]:
+    content = await get_storage().read(chunk_key(batch_id, doc_id))
+    with np.load(io.BytesIO(content)) as data:
+        return [tuple(span) for span in data["spans"].tolist()], data["embeddings"]
@@ -0,0 +1,66 @@
+from typing import Iterator, List, Optional, Tuple
+
+Span = Tuple[int, int]
+
+
+class TokenWindowChunker:
+    """
+    Sliding-window chunker that sizes windows in model tokens.
+
+    Windows are yielded lazily as (start, end) character offsets into the
+    original text, so callers slice only the spans they actually need. Each
+    window holds up to ``max_tokens`` tokens (special tokens excluded) and
+    consecutive windows share ``stride`` tokens. Without a fast tokenizer the
+    chunker falls back to character windows of ``fallback_chars``.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: int = 256, stride: int = 32,
+                 fallback_chars: int = 500, fallback_overlap: int = 50):
+        self.tokenizer = tokenizer if getattr(tokenizer, "is_fast", False) else None
+        special_tokens = self.tokenizer.num_special_tokens_to_add() if self.tokenizer else 0
+        self.window = max(1, max_tokens - special_tokens)
+        self.stride = min(max(0, stride), self.window - 1)
+        self.fallback_chars = fallback_chars
+        self.fallback_overlap = fallback_overlap
+
+    def windows(self, text: str) -> Iterator[Span]:
+        """Yield (start, end) character offsets of consecutive overlapping windows."""
+        if not text:
+            return
+        if self.tokenizer is None:
+            yield from self._char_windows(text)
+            return
+
+        offsets = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            verbose=False,
+        )["offset_mapping"]
+        step = self.window - self.stride
+        for i in range(0, len(offsets), step):
+            end = min(i + self.window, len(offsets))
+            yield offsets[i][0], offsets[end - 1][1]
+            if end == len(offsets):
+                break
+
+    def _char_windows(self, text: str) -> Iterator[Span]:
+        step = self.fallback_chars - self.fallback_overlap
+        for i in range(0, len(text), step):
+            yield i, min(i + self.fallback_chars, len(text))
+            if i + self.fallback_chars >= len(text):
+                break
+
+    def spans(self, text: str) -> List[Span]:
+        return list(self.windows(text))
+
+    def chunks(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.windows(text)]
+
+
+def chunker_for(tokenizer, max_tokens: Optional[int], stride: int,
+                fallback_chars: int = 500, fallback_overlap: int = 50) -> TokenWindowChunker:
+    """Build a chunker for a model, capping absurd ``model_max_length`` sentinels."""
+    limit = max_tokens or getattr(tokenizer, "model_max_length", None) or 512
+    return TokenWindowChunker(tokenizer, min(limit, 4096), stride, fallback_chars, fallback_overlap)
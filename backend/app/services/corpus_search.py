@@ -0,0 +1,238 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import and_, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.models.batch import Batch
+from app.models.document import Document
+from app.models.embedding import Embedding
+from app.models.minhash import MinHashBand, MinHashSignature
+from app.services.ann_index import ChunkIndex, get_chunk_index
+from app.services.chunk_store import load_chunk_embeddings
+
+
+class ChunkHit(NamedTuple):
+    """A corpus chunk near one chunk of the query document."""
+    query_index: int
+    query_start: int
+    query_end: int
+    file_id: uuid.UUID
+    chunk_index: int
+    span_start: int
+    span_end: int
+    similarity: float
+
+
+class CorpusSearchService:
+    """
+    Plagiarism search against every stored document, not just the current batch.
+
+    Each chunk of the query document is looked up with a k-NN query
+    (``chunk_neighbors`` hits per chunk), either in the ``embeddings`` table
+    through its pgvector HNSW index or, with ``CORPUS_INDEX_BACKEND=local``, in
+    the memory-mapped ``ChunkIndex``. Hits above ``min_similarity`` are grouped
+    by source document and scored like ``SimilarityEngine``: the sum of each
+    query chunk's best match divided by the number of query chunks. Searches
+    can be limited to one tenant (the batch owner) and course.
+    """
+
+    def __init__(self, session: AsyncSession, chunk_neighbors: Optional[int] = None,
+                 min_similarity: Optional[float] = None, ef_search: Optional[int] = None,
+                 index: Optional[ChunkIndex] = None):
+        self.session = session
+        if index is None and settings.CORPUS_INDEX_BACKEND == "local":
+            index = get_chunk_index()
+        self.index = index
+        self.chunk_neighbors = chunk_neighbors or settings.CORPUS_CHUNK_NEIGHBORS
+        self.min_similarity = settings.CORPUS_MIN_SIMILARITY if min_similarity is None else min_similarity
+        self.ef_search = ef_search or settings.CORPUS_EF_SEARCH
+
+    async def search(self, document_id: str, tenant_id: Optional[str] = None, course: Optional[str] = None,
+                     top_k: int = 10, exclude_batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Top ``top_k`` suspected sources of a processed document, most similar first.
+        Returns dicts with 'document_id'/'filename'/'batch_id'/'similarity' and
+        'matches' in the same shape as ``Comparison.matches``.
+        """
+        hits = await self.nearest_chunks(document_id, tenant_id, course, exclude_batch_id)
+        if not hits:
+            return []
+
+        n_chunks = await self.session.scalar(select(Document.chunk_count).where(Document.id == document_id))
+        if not n_chunks:
+            n_chunks = len({hit.query_index for hit in hits})
+        # Best hit of every query chunk within each source document
+        best: Dict[Any, Dict[int, Any]] = defaultdict(dict)
+        for hit in hits:
+            per_chunk = best[hit.file_id]
+            if hit.query_index not in per_chunk or hit.similarity > per_chunk[hit.query_index].similarity:
+                per_chunk[hit.query_index] = hit
+        ranked = sorted(
+            best.items(), key=lambda item: sum(hit.similarity for hit in item[1].values()), reverse=True
+        )[:top_k]
+
+        texts = await self._texts([document_id, *(source_id for source_id, _ in ranked)])
+        query_text = texts[uuid.UUID(str(document_id))][1]
+        results = []
+        for source_id, per_chunk in ranked:
+            filename, source_text, batch_id = texts[source_id]
+            matches = []
+            for query_index, hit in sorted(per_chunk.items()):
+                matches.append({
+                    "source_chunk": query_text[hit.query_start:hit.query_end],
+                    "target_chunk": source_text[hit.span_start:hit.span_end],
+                    "score": round(float(hit.similarity), 4),
+                    "source_index": int(query_index),
+                    "target_index": int(hit.chunk_index),
+                    "source_span": [int(hit.query_start), int(hit.query_end)],
+                    "target_span": [int(hit.span_start), int(hit.span_end)]
+                })
+            score = sum(hit.similarity for hit in per_chunk.values()) / n_chunks
+            results.append({
+                "document_id": str(source_id),
+                "filename": filename,
+                "batch_id": str(batch_id),
+                "similarity": round(float(score), 4),
+                "matches": matches
+            })
+        return results
+
+    async def nearest_chunks(self, document_id: str, tenant_id: Optional[str] = None, course: Optional[str] = None,
+                             exclude_batch_id: Optional[str] = None) -> List[ChunkHit]:
+        """k-NN hits of every chunk of ``document_id`` at or above ``min_similarity``."""
+        if self.index is not None:
+            return await self._nearest_local(document_id, tenant_id, course, exclude_batch_id)
+        return await self._nearest_pgvector(document_id, tenant_id, course, exclude_batch_id)
+
+    async def _nearest_pgvector(self, document_id: str, tenant_id: Optional[str], course: Optional[str],
+                                exclude_batch_id: Optional[str]) -> List[ChunkHit]:
+        """
+        One statement: a LATERAL subquery per query chunk ordered by cosine
+        distance, which pgvector answers from the HNSW index. Filters are
+        applied to the index candidates, so ``ef_search`` is raised to at least
+        the neighbour count for selective scopes to still fill up.
+        """
+        await self.session.execute(
+            select(func.set_config("hnsw.ef_search", str(max(self.ef_search, self.chunk_neighbors)), True))
+        )
+
+        query = aliased(Embedding, name="query")
+        corpus = aliased(Embedding, name="corpus")
+        distance = corpus.vector.cosine_distance(query.vector)
+        conditions = [corpus.file_id != document_id]
+        if tenant_id is not None:
+            conditions.append(corpus.tenant_id == tenant_id)
+        if course is not None:
+            conditions.append(corpus.course == course)
+        if exclude_batch_id is not None:
+            conditions.append(corpus.batch_id != exclude_batch_id)
+
+        neighbours = (
+            select(
+                corpus.file_id, corpus.chunk_index, corpus.span_start, corpus.span_end,
+                (1 - distance).label("similarity")
+            )
+            .where(*conditions)
+            .order_by(distance)
+            .limit(self.chunk_neighbors)
+            .lateral("neighbours")
+        )
+        stmt = (
+            select(
+                query.chunk_index.label("query_index"),
+                query.span_start.label("query_start"),
+                query.span_end.label("query_end"),
+                neighbours
+            )
+            .select_from(query)
+            .join(neighbours, true())
+            .where(query.file_id == document_id, neighbours.c.similarity >= self.min_similarity)
+        )
+        return [ChunkHit(*row) for row in (await self.session.execute(stmt)).all()]
+
+    async def _nearest_local(self, document_id: str, tenant_id: Optional[str], course: Optional[str],
+                             exclude_batch_id: Optional[str]) -> List[ChunkHit]:
+        """The same lookup against the in-process index, with the query chunks read from the chunk store."""
+        batch_id = await self.session.scalar(select(Document.batch_id).where(Document.id == document_id))
+        if batch_id is None:
+            return []
+        spans, vectors = await load_chunk_embeddings(str(batch_id), str(document_id))
+        if not len(vectors):
+            return []
+        scores, meta = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.index.search(
+                vectors, self.chunk_neighbors, tenant_id=tenant_id, course=course,
+                exclude_document_id=document_id, exclude_batch_id=exclude_batch_id
+            )
+        )
+        hits = []
+        for i, j in zip(*np.nonzero(scores >= self.min_similarity)):
+            row = meta[i, j]
+            hits.append(ChunkHit(
+                int(i), int(spans[i][0]), int(spans[i][1]), uuid.UUID(row["doc"].decode()),
+                int(row["chunk"]), int(row["start"]), int(row["end"]), float(scores[i, j])
+            ))
+        return hits
+
+    async def near_duplicates(self, document_id: str, tenant_id: Optional[str] = None, course: Optional[str] = None,
+                              min_jaccard: float = 0.5, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Lexical near-duplicates of a document anywhere in the corpus. Candidates
+        come from the persisted LSH bands (one primary-key lookup per band, so
+        cost does not grow with the corpus); their stored MinHash signatures
+        then give the estimated Jaccard similarity.
+        """
+        own = await self.session.scalar(
+            select(MinHashSignature.signature).where(MinHashSignature.document_id == document_id)
+        )
+        if own is None:
+            return []
+        own = np.frombuffer(own, dtype=np.uint32)
+
+        mine = aliased(MinHashBand)
+        other = aliased(MinHashBand)
+        candidates = (
+            select(other.document_id)
+            .join(mine, and_(mine.band == other.band, mine.bucket == other.bucket))
+            .where(mine.document_id == document_id, other.document_id != document_id)
+        )
+        stmt = (
+            select(MinHashSignature.document_id, MinHashSignature.signature, Document.filename, Document.batch_id)
+            .join(Document, Document.id == MinHashSignature.document_id)
+            .join(Batch, Batch.id == Document.batch_id)
+            .where(MinHashSignature.document_id.in_(candidates))
+        )
+        if tenant_id is not None:
+            stmt = stmt.where(Batch.user_id == tenant_id)
+        if course is not None:
+            stmt = stmt.where(Batch.course == course)
+
+        results = []
+        for row in (await self.session.execute(stmt)).all():
+            signature = np.frombuffer(row.signature, dtype=np.uint32)
+            if len(signature) != len(own):
+                continue
+            jaccard = float(np.mean(signature == own))
+            if jaccard >= min_jaccard:
+                results.append({
+                    "document_id": str(row.document_id),
+                    "filename": row.filename,
+                    "batch_id": str(row.batch_id),
+                    "jaccard": round(jaccard, 4)
+                })
+        results.sort(key=lambda result: result["jaccard"], reverse=True)
+        return results[:limit]
+
+    async def _texts(self, document_ids: List[Any]) -> Dict[Any, Any]:
+        """{document id: (filename, text, batch id)}; chunk text is sliced from these for reported matches."""
+        result = await self.session.execute(
+            select(Document.id, Document.filename, Document.text_content, Document.batch_id)
+            .where(Document.id.in_(document_ids))
+        )
+        return {row.id: (row.filename, row.text_content or "", row.batch_id) for row in result}
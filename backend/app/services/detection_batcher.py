@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.provider_router import ProviderType
+from app.services.ai_detection import AIDetectionService
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class DetectionOverloaded(Exception):
+    """The detection queue is full or a request missed its deadline; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Job:
+    key: Tuple[str, str, float]
+    text: str
+    provider: str
+    threshold: float
+    future: asyncio.Future
+    expires: float
+
+
+class DetectionBatcher:
+    """
+    Request-path AI detection that never blocks the event loop.
+
+    Requests are queued (at most ``queue_size``) and a collector coalesces them
+    into micro-batches of up to ``max_batch`` texts, waiting at most
+    ``batch_wait`` seconds for a batch to fill. Each batch runs through
+    ``detect_many`` on a dedicated executor of ``workers`` threads, so the local
+    classifier sees all chunks of the batch at once. External providers are
+    called once per text anyway, so their requests are not batched: up to
+    ``queue_size`` of them are admitted and run on ``external_workers``
+    threads of their own, concurrently rather than one after another.
+    Identical texts in flight (same provider and threshold) share one job;
+    every request still gets ``deadline`` seconds of its own. A full queue,
+    or a request still unanswered after its deadline, raises
+    ``DetectionOverloaded``.
+    """
+
+    def __init__(self, ai_service: AIDetectionService, workers: int = None, queue_size: int = None,
+                 max_batch: int = None, batch_wait: float = None, deadline: float = None,
+                 external_workers: int = None):
+        self.ai_service = ai_service
+        self.workers = workers or settings.AI_DETECTION_WORKERS
+        self.max_batch = max_batch or settings.AI_DETECTION_MAX_BATCH
+        self.batch_wait = settings.AI_DETECTION_BATCH_WAIT_MS / 1000 if batch_wait is None else batch_wait
+        self.deadline = deadline or settings.AI_DETECTION_DEADLINE
+        self.external_workers = external_workers or settings.AI_DETECTION_EXTERNAL_WORKERS
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.AI_DETECTION_QUEUE_SIZE)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ai-detection")
+        self._external_executor = ThreadPoolExecutor(
+            max_workers=self.external_workers, thread_name_prefix="ai-detection-external"
+        )
+        self._external_jobs = 0  # Admitted and not yet answered, bounded like the queue
+        self._external_seconds = 1.0  # Moving average, drives Retry-After
+        self._slots = asyncio.Semaphore(self.workers)
+        self._in_flight: Dict[Tuple[str, str, float], _Job] = {}
+        self._batch_seconds = 1.0  # Moving average, drives Retry-After
+        self._collector: Optional[asyncio.Task] = None
+
+    async def detect(self, text: str, provider: str = "local", threshold: float = 0.5) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if self._collector is None or self._collector.done():
+            self._collector = loop.create_task(self._collect())
+
+        key = (hashlib.sha256(text.encode()).hexdigest(), provider, threshold)
+        external = provider != ProviderType.LOCAL
+        expires = loop.time() + self.deadline
+        job = self._in_flight.get(key)
+        if job is None:
+            job = _Job(key, text, provider, threshold, loop.create_future(), expires)
+            if not external:
+                try:
+                    self._queue.put_nowait(job)
+                except asyncio.QueueFull:
+                    raise DetectionOverloaded("AI detection queue is full", self.retry_after())
+            elif self._external_jobs >= self._queue.maxsize:
+                raise DetectionOverloaded("AI detection queue is full", self.retry_after(external=True))
+            else:
+                self._external_jobs += 1
+                loop.create_task(self._run_external(job))
+            self._in_flight[key] = job
+        else:
+            # A late joiner keeps the shared job alive for its own full deadline
+            job.expires = max(job.expires, expires)
+
+        try:
+            # Shielded: other requests for the same text may still be waiting on this job
+            return await asyncio.wait_for(asyncio.shield(job.future), max(0.0, expires - loop.time()))
+        except asyncio.TimeoutError:
+            raise DetectionOverloaded("AI detection deadline exceeded", self.retry_after(external))
+
+    def retry_after(self, external: bool = False) -> int:
+        """Seconds until the current backlog should have drained."""
+        if external:
+            return max(1, math.ceil(self._external_jobs / self.external_workers * self._external_seconds))
+        batches = self._queue.qsize() / max(1, self.max_batch * self.workers)
+        return max(1, math.ceil(batches * self._batch_seconds))
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker first, so batches grow while every worker is busy
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            window_ends = loop.time() + self.batch_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = window_ends - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[_Job]):
+        loop = asyncio.get_running_loop()
+        try:
+            now = loop.time()
+            live = []
+            for job in batch:
+                if job.expires <= now:
+                    # Every waiter has already been answered with a 503
+                    self._finish(job, exception=DetectionOverloaded("AI detection deadline exceeded", 1))
+                else:
+                    live.append(job)
+
+            groups: Dict[Tuple[str, float], List[_Job]] = {}
+            for job in live:
+                groups.setdefault((job.provider, job.threshold), []).append(job)
+
+            for (provider, threshold), jobs in groups.items():
+                start = time.perf_counter()
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self.ai_service.detect_many, [job.text for job in jobs], provider, threshold
+                    )
+                except Exception as e:
+                    logger.exception(f"AI detection batch failed: {e}")
+                    for job in jobs:
+                        self._finish(job, exception=e)
+                    continue
+                self._batch_seconds = 0.8 * self._batch_seconds + 0.2 * (time.perf_counter() - start)
+                for job, result in zip(jobs, results):
+                    self._finish(job, result=result)
+        finally:
+            self._slots.release()
+
+    async def _run_external(self, job: _Job):
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._external_executor, self._detect_external, job
+            )
+        except DetectionOverloaded as e:
+            self._finish(job, exception=e)
+            return
+        except Exception as e:
+            logger.exception(f"AI detection request failed: {e}")
+            self._finish(job, exception=e)
+            return
+        finally:
+            self._external_jobs -= 1
+        self._external_seconds = 0.8 * self._external_seconds + 0.2 * (time.perf_counter() - start)
+        self._finish(job, result=result)
+
+    def _detect_external(self, job: _Job) -> Dict[str, Any]:
+        # Runs once a thread is free; by then every waiter may have given up (loop.time() is monotonic)
+        if job.expires <= time.monotonic():
+            raise DetectionOverloaded("AI detection deadline exceeded", 1)
+        return self.ai_service.detect(job.text, job.provider, job.threshold)
+
+    def _finish(self, job: _Job, result: Any = None, exception: Optional[Exception] = None):
+        self._in_flight.pop(job.key, None)
+        if job.future.done():
+            return
+        if exception is not None:
+            job.future.set_exception(exception)
+            # Nobody may be waiting anymore; don't warn about an unretrieved exception
+            job.future.exception()
+        else:
+            job.future.set_result(result)
+
+
+_batcher: Optional[DetectionBatcher] = None
+_batcher_loop: Optional[asyncio.AbstractEventLoop] = None
+_batcher_lock = threading.Lock()
+
+
+def get_detection_batcher(ai_service: AIDetectionService) -> DetectionBatcher:
+    """The batcher for the running event loop, created on first use."""
+    global _batcher, _batcher_loop
+    loop = asyncio.get_running_loop()
+    with _batcher_lock:
+        if _batcher is None or _batcher_loop is not loop:
+            _batcher = DetectionBatcher(ai_service)
+            _batcher_loop = loop
+        return _batcher
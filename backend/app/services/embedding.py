@@ -1,41 +1,117 @@
 import os
 import hashlib
+import importlib.util
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.model_registry import EMBEDDING_MODEL, get_sentence_transformer
+from app.services.chunking import Span, TokenWindowChunker, chunker_for
+from app.services.embedding_cache import get_embedding_cache
 
-try:
-    from sentence_transformers import SentenceTransformer
-    HAS_MODEL = True
-except ImportError:
-    HAS_MODEL = False
+# The model itself is imported by the registry on first use
+HAS_MODEL = importlib.util.find_spec("sentence_transformers") is not None
 
 class EmbeddingService:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-        if HAS_MODEL and not os.getenv("VERCEL"):
-            self.model = SentenceTransformer(model_name)
-        else:
-            self.model = None
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.enabled = HAS_MODEL and not os.getenv("VERCEL")
+        self._chunker = None
 
-    def chunk_text(self, text, chunk_size=500, overlap=50):
+    @property
+    def model(self):
+        """Shared SentenceTransformer from the model registry, loaded on first use."""
+        if not self.enabled:
+            return None
+        return get_sentence_transformer(self.model_name)
+
+    @property
+    def chunker(self) -> TokenWindowChunker:
+        """Token-window chunker sized to the model's max sequence length."""
+        if self._chunker is None:
+            model = self.model
+            self._chunker = chunker_for(
+                getattr(model, "tokenizer", None),
+                getattr(model, "max_seq_length", None),
+                settings.CHUNK_STRIDE_TOKENS
+            )
+        return self._chunker
+
+    def chunk_spans(self, text) -> Iterator[Span]:
+        """Yield (start, end) character offsets of overlapping token windows"""
+        return self.chunker.windows(text)
+
+    def chunk_text(self, text):
         """Split text into overlapping chunks"""
-        if not text:
-            return []
-        chunks = []
-        for i in range(0, len(text), chunk_size - overlap):
-            chunks.append(text[i:i + chunk_size])
-            if i + chunk_size >= len(text):
-                break
-        return chunks
+        return self.chunker.chunks(text)
 
     def encode_chunks(self, text):
         """Generate embeddings for each chunk of text"""
         if not self.model:
             return [], []
-            
-        chunks = self.chunk_text(text)
-        if not chunks:
-            return [], []
-            
-        embeddings = [self.model.encode(chunk) for chunk in chunks]
-        return chunks, embeddings
+
+        spans, embeddings = self.encode_documents([text])[0]
+        return [text[start:end] for start, end in spans], embeddings
+
+    def encode_documents(self, texts: Sequence[str], batch_size: Optional[int] = None) -> List[Tuple[List[Span], np.ndarray]]:
+        """
+        Chunk and encode many documents in shared batches.
+
+        Returns one (spans, embeddings) pair per input text: spans are the
+        (start, end) character offsets of each window and embeddings is a
+        contiguous float32 array of shape (len(spans), dim).
+        """
+        span_lists = [list(self.chunk_spans(text)) for text in texts]
+        chunk_lists = [[text[start:end] for start, end in spans] for text, spans in zip(texts, span_lists)]
+        return list(zip(span_lists, self.encode_chunk_lists(chunk_lists, batch_size)))
+
+    def encode_chunk_lists(self, chunk_lists: Sequence[List[str]], batch_size: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Encode the chunks of many documents in one batched model call.
+
+        Chunk vectors are looked up in the content-addressed embedding cache
+        first; only unseen chunks (deduplicated by hash) reach the model. Those
+        are sorted by length so each batch pads to similar sizes, encoded
+        ``batch_size`` at a time, and scattered back into one float32 array per document.
+        """
+        if not self.model:
+            return [np.zeros((0, 0), dtype=np.float32) for _ in chunk_lists]
+
+        flat = [chunk for chunks in chunk_lists for chunk in chunks]
+        dim = self.model.get_sentence_embedding_dimension()
+        vectors = np.zeros((len(flat), dim), dtype=np.float32)
+        if flat:
+            cache = get_embedding_cache(self.model_name, dim)
+            hashes = [self.hash_content(chunk) for chunk in flat]
+            positions = {}
+            for i, h in enumerate(hashes):
+                positions.setdefault(h, []).append(i)
+            unique_hashes = list(positions)
+
+            missing = []
+            for h, vector in zip(unique_hashes, cache.get_many(unique_hashes)):
+                if vector is None:
+                    missing.append(h)
+                else:
+                    vectors[positions[h]] = vector
+
+            if missing:
+                missing.sort(key=lambda h: len(flat[positions[h][0]]), reverse=True)
+                encoded = self.model.encode(
+                    [flat[positions[h][0]] for h in missing],
+                    batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                ).astype(np.float32, copy=False)
+                for h, vector in zip(missing, encoded):
+                    vectors[positions[h]] = vector
+                cache.put_many(missing, encoded)
+
+        results = []
+        start = 0
+        for chunks in chunk_lists:
+            results.append(np.ascontiguousarray(vectors[start:start + len(chunks)]))
+            start += len(chunks)
+        return results
 
     def generate_text_embedding(self, text):
         if not self.model:
@@ -43,10 +119,9 @@ class EmbeddingService:
         
         # For long texts, we chunk and average the embeddings
         chunks, embeddings = self.encode_chunks(text)
-        if not embeddings:
+        if len(embeddings) == 0:
             return []
-            
-        import numpy as np
+
         avg_embedding = np.mean(embeddings, axis=0)
         return avg_embedding.tolist()
 
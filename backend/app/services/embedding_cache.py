@@ -0,0 +1,270 @@
+import fcntl
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from app.core.config import settings
+
+
+class MemoryLRU:
+    """Thread-safe in-process LRU of chunk vectors."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: Tuple[str, str], vector: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        if vector.base is not None:
+            # A row view would keep the whole batch array it came from alive
+            vector = vector.copy()
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskEmbeddingStore:
+    """
+    Persistent, size-bounded chunk vector store shared by every process on a host.
+
+    Vectors are appended to memory-mapped float32 files, one per generation, and
+    a SQLite index maps chunk hashes to (generation, row). When the active
+    generation fills up a new one starts and generations older than the
+    previous one are dropped, so the store holds at most ``2 * generation_size``
+    vectors. Hits in the older generation are promoted by the caller re-putting them.
+    """
+
+    def __init__(self, path: str, dim: int, max_entries: int):
+        self.path = path
+        self.dim = dim
+        self.generation_size = max(1, max_entries // 2)
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+        self._lock_path = os.path.join(path, "lock")
+        self._local = threading.local()
+        self._maps: Dict[int, np.memmap] = {}
+        self._maps_lock = threading.Lock()
+        with self._locked():
+            conn = self._conn()
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, generation INTEGER, row INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0), ('rows', 0)")
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "index.sqlite"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _locked(self):
+        return _FileLock(self._lock_path)
+
+    def _vector_file(self, generation: int) -> str:
+        return os.path.join(self.path, f"gen-{generation:08d}.f32")
+
+    def _vectors(self, generation: int, row: int) -> Optional[np.memmap]:
+        with self._maps_lock:
+            vectors = self._maps.get(generation)
+            if vectors is None or row >= vectors.shape[0]:
+                # The active generation grows, so reopen to see newly appended rows
+                try:
+                    vectors = np.memmap(self._vector_file(generation), dtype=np.float32, mode="r").reshape(-1, self.dim)
+                except (FileNotFoundError, ValueError):
+                    return None
+                self._maps[generation] = vectors
+            return vectors if row < vectors.shape[0] else None
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Tuple[np.ndarray, bool]]:
+        """Return {key: (vector, is_current_generation)} for the keys that are stored."""
+        found = {}
+        if not keys:
+            return found
+        conn = self._conn()
+        current = conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+        for start in range(0, len(keys), 500):
+            batch = list(keys[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, generation, row FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, generation, row in rows:
+                vectors = self._vectors(generation, row)
+                if vectors is not None:
+                    found[key] = (np.array(vectors[row]), generation == current)
+        return found
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        if not len(keys):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._locked():
+            conn = self._conn()
+            generation, rows = (value for _, value in conn.execute(
+                "SELECT name, value FROM meta WHERE name IN ('generation', 'rows') ORDER BY name"
+            ))
+            start = 0
+            while start < len(keys):
+                if rows >= self.generation_size:
+                    generation, rows = self._rotate(conn, generation)
+                with open(self._vector_file(generation), "ab") as f:
+                    rows = self._align(conn, f, generation, rows)
+                    end = min(len(keys), start + self.generation_size - rows)
+                    f.write(vectors[start:end].tobytes())
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    [(key, generation, rows + i) for i, key in enumerate(keys[start:end])]
+                )
+                rows += end - start
+                start = end
+            conn.execute("UPDATE meta SET value = ? WHERE name = 'generation'", (generation,))
+            conn.execute("UPDATE meta SET value = ? WHERE name = 'rows'", (rows,))
+            conn.commit()
+
+    def _align(self, conn: sqlite3.Connection, f, generation: int, rows: int) -> int:
+        """
+        Make the vector file of ``generation`` (open for appending) end exactly at
+        row ``rows``, the committed row count, and return the row count. Bytes
+        beyond it come from an append whose index update never committed and are
+        cut off. If the file lost rows the index knows about, those entries are
+        dropped, so row numbers and file offsets always agree.
+        """
+        row_bytes = self.dim * 4
+        size = f.seek(0, os.SEEK_END)
+        if size != rows * row_bytes:
+            if size < rows * row_bytes:
+                rows = size // row_bytes
+                conn.execute("DELETE FROM entries WHERE generation = ? AND row >= ?", (generation, rows))
+            f.truncate(rows * row_bytes)
+        return rows
+
+    def _rotate(self, conn: sqlite3.Connection, generation: int) -> Tuple[int, int]:
+        """Start a new generation and drop everything older than the previous one."""
+        cursor = conn.execute("DELETE FROM entries WHERE generation < ?", (generation,))
+        self.evictions += max(cursor.rowcount, 0)
+        for name in os.listdir(self.path):
+            match = re.fullmatch(r"gen-(\d+)\.f32", name)
+            if match and int(match.group(1)) < generation:
+                os.remove(os.path.join(self.path, name))
+        return generation + 1, 0
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class _FileLock:
+    """Exclusive advisory lock so concurrent processes append to the store one at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed chunk embedding cache keyed by (model name, chunk sha256).
+
+    Lookups go to the in-process LRU first, then to the persistent disk tier.
+    Disk hits are copied into the LRU. Every lookup updates the hit and miss counters.
+    """
+
+    def __init__(self, model_name: str, dim: int, memory_entries: int = None,
+                 disk_path: Optional[str] = None, disk_entries: int = None):
+        self.model_name = model_name
+        self.dim = dim
+        self.memory = MemoryLRU(settings.EMBEDDING_CACHE_MEMORY_ENTRIES if memory_entries is None else memory_entries)
+        self.disk = None
+        if disk_path:
+            self.disk = DiskEmbeddingStore(
+                disk_path, dim,
+                settings.EMBEDDING_CACHE_DISK_ENTRIES if disk_entries is None else disk_entries
+            )
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for chunk hashes; missing entries are returned as None."""
+        results: List[Optional[np.ndarray]] = [self.memory.get((self.model_name, h)) for h in hashes]
+        missing = [h for h, vector in zip(hashes, results) if vector is None]
+        self.memory_hits += len(hashes) - len(missing)
+
+        if missing and self.disk is not None:
+            found = self.disk.get_many(missing)
+            stale = [h for h, (_, current) in found.items() if not current]
+            for i, h in enumerate(hashes):
+                if results[i] is None and h in found:
+                    results[i] = found[h][0]
+                    self.memory.put((self.model_name, h), results[i])
+            self.disk_hits += len(found)
+            if stale:
+                # Promote entries from the generation that will be evicted next
+                self.disk.put_many(stale, np.stack([found[h][0] for h in stale]))
+            self.misses += len(missing) - len(found)
+        else:
+            self.misses += len(missing)
+        return results
+
+    def put_many(self, hashes: Sequence[str], vectors: np.ndarray):
+        for h, vector in zip(hashes, vectors):
+            self.memory.put((self.model_name, h), vector)
+        if self.disk is not None:
+            self.disk.put_many(list(hashes), vectors)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+        }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, dim: int) -> EmbeddingCache:
+    """Return the process-wide cache for a model, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            disk_path = None
+            if settings.EMBEDDING_CACHE_DIR:
+                disk_path = os.path.join(settings.EMBEDDING_CACHE_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+            cache = EmbeddingCache(model_name, dim, disk_path=disk_path)
+            _caches[model_name] = cache
+        return cache
@@ -0,0 +1,210 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.batch import Batch
+from app.models.document import Document
+from app.models.fingerprint import Fingerprint
+
+_BASE = np.uint64(1_000_003)
+
+
+class Winnower:
+    """
+    MOSS-style document fingerprints.
+
+    Text is normalised (lower-cased, everything but letters and digits
+    removed), every k-gram of the normalised text is hashed, and in each window
+    of ``window`` consecutive hashes the minimum is kept (the rightmost one on
+    ties). Any verbatim copy of at least ``k + window - 1`` normalised
+    characters is therefore guaranteed to share a fingerprint with its source,
+    while copies shorter than ``k`` never do.
+    """
+
+    def __init__(self, k: Optional[int] = None, window: Optional[int] = None):
+        self.k = k or settings.WINNOW_K
+        self.window = window or settings.WINNOW_WINDOW
+
+    def fingerprints(self, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (hashes, starts, ends) of the selected k-grams, in text order. Hashes
+        are signed 64-bit (a Postgres BIGINT); starts and ends are character
+        offsets into the original ``text``.
+        """
+        text = text or ""
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            origin = None
+        else:
+            # Some characters lower-case to several code points ("İ" -> "i̇"); map each back to its source
+            origin = np.fromiter((i for i, ch in enumerate(text) for _ in ch.lower()), dtype=np.int64)
+        offsets = [i for i, ch in enumerate(lowered) if ch.isalnum()]
+        n_grams = len(offsets) - self.k + 1
+        if n_grams <= 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        codes = np.fromiter((ord(lowered[i]) for i in offsets), dtype=np.uint64, count=len(offsets))
+
+        # Polynomial k-gram hashes in wrapping 64-bit arithmetic, one vector pass per k-gram position
+        hashes = np.zeros(n_grams, dtype=np.uint64)
+        for j in range(self.k):
+            hashes = hashes * _BASE + codes[j:j + n_grams]
+        hashes = hashes.view(np.int64)
+
+        if n_grams <= self.window:
+            selected = np.array([n_grams - 1 - int(np.argmin(hashes[::-1]))])
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(hashes, self.window)
+            rightmost = self.window - 1 - np.argmin(windows[:, ::-1], axis=1)
+            selected = np.unique(np.arange(len(windows)) + rightmost)
+
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if origin is not None:
+            offsets = origin[offsets]
+        return hashes[selected], offsets[selected], offsets[selected + self.k - 1] + 1
+
+    def rows(self, document_id, text: str) -> List[Dict[str, Any]]:
+        """Fingerprint rows of a document for the inverted index."""
+        hashes, starts, ends = self.fingerprints(text)
+        return [
+            {"hash": int(h), "document_id": document_id, "position": i, "start": int(s), "end": int(e)}
+            for i, (h, s, e) in enumerate(zip(hashes, starts, ends))
+        ]
+
+
+class FingerprintIndex:
+    """
+    Verbatim copy detection against the whole corpus through the ``fingerprints``
+    inverted index (hash -> document, offsets).
+
+    A lookup probes the index once per fingerprint of the query document, so it
+    costs time proportional to the query's length, not the corpus size.
+    Fingerprints found in more than ``max_doc_freq`` documents are treated as
+    boilerplate and ignored. Matched fingerprints of one source are chained into
+    runs along the same diagonal, and runs of at least ``min_fingerprints``
+    fingerprints are reported as exact spans in the ``Comparison.matches``
+    shape, without chunk indices. With the default of one, every copy covered
+    by the ``Winnower`` guarantee is reported.
+    """
+
+    def __init__(self, session: AsyncSession, winnower: Optional[Winnower] = None,
+                 max_doc_freq: Optional[int] = None, min_fingerprints: Optional[int] = None):
+        self.session = session
+        self.winnower = winnower or Winnower()
+        self.max_doc_freq = max_doc_freq or settings.WINNOW_MAX_DOC_FREQ
+        self.min_fingerprints = min_fingerprints or settings.WINNOW_MIN_FINGERPRINTS
+
+    async def find_copies(self, document_id: str, tenant_id: Optional[str] = None, course: Optional[str] = None,
+                          exclude_batch_id: Optional[str] = None, top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Documents sharing verbatim passages with ``document_id``, most copied first.
+        'similarity' is the share of the query text covered by matched spans.
+        """
+        document = await self.session.get(Document, document_id)
+        if document is None or not document.text_content:
+            return []
+        query_text = document.text_content
+        hashes, starts, ends = self.winnower.fingerprints(query_text)
+        if not len(hashes):
+            return []
+
+        stmt = (
+            select(Fingerprint.hash, Fingerprint.document_id, Fingerprint.start, Fingerprint.end)
+            .join(Document, Document.id == Fingerprint.document_id)
+            .where(
+                Fingerprint.hash == any_(bindparam("hashes", type_=ARRAY(BigInteger))),
+                Fingerprint.document_id != document.id
+            )
+        )
+        if tenant_id is not None or course is not None:
+            stmt = stmt.join(Batch, Batch.id == Document.batch_id)
+            if tenant_id is not None:
+                stmt = stmt.where(Batch.user_id == tenant_id)
+            if course is not None:
+                stmt = stmt.where(Batch.course == course)
+        if exclude_batch_id is not None:
+            stmt = stmt.where(Document.batch_id != exclude_batch_id)
+        postings = (await self.session.execute(stmt, {"hashes": sorted({int(h) for h in hashes})})).all()
+
+        documents_per_hash = defaultdict(set)
+        for row in postings:
+            documents_per_hash[row.hash].add(row.document_id)
+        query_positions = defaultdict(list)
+        for i, h in enumerate(hashes.tolist()):
+            query_positions[h].append(i)
+
+        pairs = defaultdict(list)  # source document -> [(query position, source row)]
+        for row in postings:
+            if len(documents_per_hash[row.hash]) > self.max_doc_freq:
+                continue
+            for i in query_positions[row.hash]:
+                pairs[row.document_id].append((i, row))
+
+        results = []
+        for source_id, matched in pairs.items():
+            runs = self._runs(matched, starts, ends)
+            if runs:
+                results.append((source_id, runs))
+        if not results:
+            return []
+
+        texts = await self.session.execute(
+            select(Document.id, Document.filename, Document.text_content, Document.batch_id)
+            .where(Document.id.in_([source_id for source_id, _ in results]))
+        )
+        texts = {row.id: row for row in texts}
+        reports = []
+        for source_id, runs in results:
+            source = texts[source_id]
+            source_text = source.text_content or ""
+            covered = np.zeros(len(query_text), dtype=bool)
+            matches = []
+            for q_start, q_end, s_start, s_end in runs:
+                covered[q_start:q_end] = True
+                matches.append({
+                    "source_chunk": query_text[q_start:q_end],
+                    "target_chunk": source_text[s_start:s_end],
+                    "score": 1.0,
+                    "source_span": [q_start, q_end],
+                    "target_span": [s_start, s_end]
+                })
+            reports.append({
+                "document_id": str(source_id),
+                "filename": source.filename,
+                "batch_id": str(source.batch_id),
+                "similarity": round(float(covered.mean()), 4),
+                "matches": matches
+            })
+        reports.sort(key=lambda report: report["similarity"], reverse=True)
+        return reports[:top_k]
+
+    def _runs(self, matched, starts: np.ndarray, ends: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Chain matched fingerprints into runs: consecutive matches whose query
+        and source offsets both advance by about the same amount, at most one
+        guarantee threshold apart. Returns (query start, query end, source
+        start, source end) per run of at least ``min_fingerprints``.
+        """
+        max_gap = 2 * (self.winnower.k + self.winnower.window)
+        runs = []
+        for i, row in sorted(matched, key=lambda pair: (int(starts[pair[0]]), pair[1].start)):
+            q_start, q_end = int(starts[i]), int(ends[i])
+            for run in reversed(runs[-8:]):
+                q_step = q_start - run["q_last"]
+                s_step = row.start - run["s_last"]
+                if 0 < q_step <= max_gap and 0 < s_step <= max_gap and abs(q_step - s_step) <= max_gap // 4:
+                    run.update(q_last=q_start, s_last=row.start, q_end=max(run["q_end"], q_end),
+                               s_end=max(run["s_end"], row.end), count=run["count"] + 1)
+                    break
+            else:
+                runs.append({"q_start": q_start, "q_last": q_start, "q_end": q_end,
+                             "s_start": row.start, "s_last": row.start, "s_end": row.end, "count": 1})
+        return [
+            (run["q_start"], run["q_end"], run["s_start"], run["s_end"])
+            for run in runs if run["count"] >= self.min_fingerprints
+        ]
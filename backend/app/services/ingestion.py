@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import mimetypes
+import tarfile
+import unicodedata
+import zipfile
+import zlib
+from pathlib import PurePosixPath
+from typing import List, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.batch import Batch
+from app.models.document import Document
+from app.models.extracted_text import ExtractedText
+from app.services.archive_extractor import ArchiveExtractor, ArchiveLimitError
+from app.services.parsing import PARSER_VERSION, SUPPORTED_EXTENSIONS, extract_text_with_errors, file_type, ocr_settings_key
+from app.services.blob_store import BlobStore
+from app.services.storage import StorageService
+
+
+def _hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def normalized_text_hash(text: str) -> str:
+    """sha256 of the text with Unicode compatibility forms, case and whitespace runs normalised."""
+    normalized = " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+# Raised by zipfile/tarfile/zlib for archives that are broken, encrypted or use an unsupported compression method
+_ARCHIVE_ERRORS = (
+    ArchiveLimitError, zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, RuntimeError, NotImplementedError
+)
+
+
+def _safe_member_name(name: str) -> str:
+    """Archive member path with absolute and parent-directory components removed."""
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("/", "..", ".")]
+    return "/".join(parts)
+
+
+def _unique_member_name(name: str, used: Set[str]) -> str:
+    """``name`` made safe, with " (2)", " (3)", ... before the extension if an earlier member already took it."""
+    name = _safe_member_name(name) or "member"
+    path = PurePosixPath(name)
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = str(path.with_name(f"{path.stem} ({n}){path.suffix}"))
+    used.add(candidate)
+    return candidate
+
+
+def _expand_archive(storage_service: StorageService, archive: Document, add_ref,
+                    members: List[Tuple[str, str, str]]):
+    """
+    Stream the supported members of an uploaded archive into the blob store.
+    Runs in a worker thread; ``add_ref(content_hash, size)`` takes a blob reference
+    on the event loop and returns the new reference count. Every referenced member
+    is appended to ``members`` as (member name, storage key, sha256), even if a
+    later member fails, so the caller can release them.
+    """
+    used = set()
+    # Spooled from storage rather than read into memory whole
+    with storage_service.open(archive.storage_path) as fileobj:
+        size = fileobj.seek(0, 2)
+        fileobj.seek(0)
+        for name, data in ArchiveExtractor.iter_members(fileobj, size, SUPPORTED_EXTENSIONS):
+            content_hash = _hash_bytes(data)
+            key = BlobStore.key_for(content_hash)
+            ref_count = add_ref(content_hash, len(data))
+            members.append((_unique_member_name(name, used), key, content_hash))
+            if ref_count == 1 and not storage_service.exists(key):
+                storage_service.save(key, data)
+
+
+async def _expand_archives(session: AsyncSession, batch: Batch, documents: List[Document],
+                           blob_store: BlobStore) -> List[Document]:
+    """
+    Replace uploaded archives by one document per supported member.
+    Archives that break the expansion limits, are corrupt, encrypted or use an
+    unsupported compression method are marked failed; the rest of the batch goes on.
+    """
+    loop = asyncio.get_running_loop()
+
+    def add_ref(content_hash: str, size: int) -> int:
+        return asyncio.run_coroutine_threadsafe(blob_store.add_ref(session, content_hash, size), loop).result()
+
+    expanded = []
+    for doc in documents:
+        if not ArchiveExtractor.is_archive(doc.filename):
+            expanded.append(doc)
+            continue
+        members = []
+        try:
+            await loop.run_in_executor(None, _expand_archive, blob_store.storage.storage, doc, add_ref, members)
+        except _ARCHIVE_ERRORS as e:
+            print(f"Rejected archive {doc.filename} in batch {batch.id}: {e}")
+            for _, _, content_hash in members:
+                await blob_store.release(session, content_hash)
+            doc.status = "failed"
+            continue
+
+        for name, storage_key, content_hash in members:
+            member_doc = Document(
+                batch_id=batch.id,
+                filename=name,
+                storage_path=storage_key,
+                content_hash=content_hash,
+                mime_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                uploaded_by=doc.uploaded_by,
+                status="extracting"
+            )
+            session.add(member_doc)
+            expanded.append(member_doc)
+        # The archive itself is only a container, its members are the submissions
+        await blob_store.delete_document(session, doc)
+        batch.total_docs = (batch.total_docs or 0) + len(members) - 1
+    await session.flush()
+    return expanded
+
+
+async def prepare_batch_documents(session: AsyncSession, batch_id: str) -> List[Document]:
+    """
+    Prepare a batch's uploads for per-document extraction.
+
+    Documents move from ``uploaded`` to ``extracting``. Zip/tar uploads are first
+    streamed apart into one document per supported member, each stored as a
+    content-addressed blob. Every upload is hashed into ``Document.content_hash``
+    and text previously extracted from identical bytes with the same parser
+    version and OCR settings is reused from ``ExtractedText``, moving the
+    document straight to ``queued``. Extracted text is hashed into
+    ``Document.text_hash`` for exact-duplicate lookups. Returns the documents that still need
+    ``extract_document``.
+    """
+    batch = await session.get(Batch, batch_id)
+    if not batch:
+        print(f"Batch {batch_id} not found")
+        return []
+
+    result = await session.execute(
+        select(Document).where(Document.batch_id == batch_id, Document.status == "uploaded")
+    )
+    documents = result.scalars().all()
+
+    batch.status = "extracting"
+    for doc in documents:
+        doc.status = "extracting"
+    await session.commit()
+
+    blob_store = BlobStore()
+    storage = blob_store.storage
+    documents = await _expand_archives(session, batch, documents, blob_store)
+    await session.commit()
+
+    loop = asyncio.get_running_loop()
+
+    async def content_hash(doc: Document) -> str:
+        if doc.content_hash:
+            return doc.content_hash
+        content = await storage.read(doc.storage_path)
+        return await loop.run_in_executor(None, _hash_bytes, content)
+
+    hashes = await asyncio.gather(*(content_hash(doc) for doc in documents), return_exceptions=True)
+    pending = []
+    for doc, outcome in zip(documents, hashes):
+        if isinstance(outcome, Exception):
+            print(f"Error reading document {doc.id}: {outcome}")
+            doc.status = "failed"
+        else:
+            doc.content_hash = outcome
+            pending.append(doc)
+
+    texts = await _cached_texts(session, pending)
+    missing = []
+    for doc in pending:
+        text = texts.get((doc.content_hash, file_type(doc.filename)))
+        if text is None:
+            missing.append(doc)
+        else:
+            doc.text_content = text
+            doc.text_hash = normalized_text_hash(text)
+            doc.status = "queued"
+
+    batch.status = "queued"
+    await session.commit()
+    return missing
+
+
+async def _cached_texts(session: AsyncSession, documents: List[Document]):
+    """{(content_hash, file_type): text} of earlier extractions under the current parser and OCR settings."""
+    if not documents:
+        return {}
+    cached = await session.execute(
+        select(ExtractedText).where(
+            ExtractedText.content_hash.in_({doc.content_hash for doc in documents}),
+            ExtractedText.parser_version == PARSER_VERSION,
+            ExtractedText.ocr_settings == ocr_settings_key(),
+        )
+    )
+    return {(row.content_hash, row.file_type): row.text_content for row in cached.scalars()}
+
+
+async def extract_document(session: AsyncSession, doc: Document) -> bool:
+    """
+    Extract the text of one ``extracting`` document and cache it by content.
+
+    The cache is checked again first, since a document with identical bytes may
+    have been extracted by another task in the meantime. Parsing and OCR run off
+    the event loop, on a thread; documents are parsed in parallel by the
+    Celery prefork children (``CELERY_WORKER_CONCURRENCY``), each running its
+    own ``process_documents`` tasks. Text with pages whose OCR failed is used
+    but not cached, so a later upload of the same bytes gets another try.
+    Sets ``queued`` or ``failed`` and returns whether it succeeded.
+    """
+    key = (doc.content_hash, file_type(doc.filename))
+    text = (await _cached_texts(session, [doc])).get(key)
+    if text is None:
+        try:
+            content = await BlobStore().storage.read(doc.storage_path)
+            text, ocr_errors = await asyncio.get_running_loop().run_in_executor(
+                None, extract_text_with_errors, doc.filename, content
+            )
+        except Exception as e:
+            print(f"Error extracting text from document {doc.id}: {e}")
+            doc.status = "failed"
+            await session.commit()
+            return False
+        if ocr_errors:
+            print(f"OCR failed on {len(ocr_errors)} pages of document {doc.id}, not caching: {ocr_errors}")
+        else:
+            # Another worker may have cached the same upload concurrently; keep the first copy
+            await session.execute(
+                pg_insert(ExtractedText).values(
+                    content_hash=key[0],
+                    file_type=key[1],
+                    parser_version=PARSER_VERSION,
+                    ocr_settings=ocr_settings_key(),
+                    text_content=text
+                ).on_conflict_do_nothing(constraint="uq_extracted_text_key")
+            )
+
+    doc.text_content = text
+    doc.text_hash = normalized_text_hash(text)
+    doc.status = "queued"
+    await session.commit()
+    return True
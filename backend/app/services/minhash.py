@@ -0,0 +1,114 @@
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+_WORD = re.compile(r"\w+")
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, with LSH banding.
+
+    Text is lower-cased and split into words; every run of ``shingle_words``
+    words is one shingle. A signature holds, for each of ``num_perm`` hash
+    functions, the minimum hash over the document's shingles, so the fraction of
+    equal positions in two signatures estimates the Jaccard similarity of their
+    shingle sets. Signatures are cut into ``bands`` bands, and two documents
+    sharing any band bucket are candidate near-duplicates; with r rows per band
+    the chance of that is 1 - (1 - J^r)^bands for Jaccard J.
+
+    Hashing is seeded and independent of ``PYTHONHASHSEED``, so signatures
+    computed in different processes and stored in the database are comparable.
+    """
+
+    def __init__(self, num_perm: Optional[int] = None, bands: Optional[int] = None,
+                 shingle_words: Optional[int] = None, seed: int = 1):
+        self.num_perm = num_perm or settings.MINHASH_PERMUTATIONS
+        self.bands = bands or settings.MINHASH_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError(f"{self.num_perm} permutations cannot be split into {self.bands} bands")
+        self.rows = self.num_perm // self.bands
+        self.shingle_words = shingle_words or settings.MINHASH_SHINGLE_WORDS
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, the top 32 bits of a*x + b
+        self._a = rng.integers(1, 2 ** 63, self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, self.num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Distinct 64-bit hashes of the word shingles of ``text``."""
+        words = _WORD.findall((text or "").lower())
+        if not words:
+            return np.zeros(0, dtype=np.uint64)
+        word_hashes = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+        k = min(self.shingle_words, len(words))
+        # Polynomial combination of k consecutive word hashes, in wrapping 64-bit arithmetic
+        hashes = np.zeros(len(words) - k + 1, dtype=np.uint64)
+        for i in range(k):
+            hashes = hashes * np.uint64(1_000_003) + word_hashes[i:len(words) - k + 1 + i]
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> np.ndarray:
+        """The uint32 MinHash signature of ``text``; all-max for texts without words."""
+        shingles = self.shingles(text)
+        signature = np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        # Bounded blocks of shingles x permutations
+        for start in range(0, len(shingles), 4096):
+            block = shingles[start:start + 4096, None] * self._a[None, :] + self._b[None, :]
+            np.minimum(signature, (block >> np.uint64(32)).min(axis=0).astype(np.uint32), out=signature)
+        return signature
+
+    def band_buckets(self, signature: np.ndarray) -> List[int]:
+        """One signed 64-bit bucket per band (fits a Postgres BIGINT)."""
+        rows = np.ascontiguousarray(signature, dtype=np.uint32).reshape(self.bands, self.rows)
+        return [
+            int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+            for band in rows
+        ]
+
+    @staticmethod
+    def jaccard(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+        return float(np.mean(signature_a == signature_b))
+
+    def candidate_pairs(self, signatures: Sequence[Optional[np.ndarray]]) -> Set[Tuple[int, int]]:
+        """
+        Index pairs (i < j) sharing at least one band bucket. Documents without a
+        signature (None) are paired with every other document, so they are never pruned.
+        """
+        buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        unsigned = []
+        for i, signature in enumerate(signatures):
+            if signature is None:
+                unsigned.append(i)
+                continue
+            for band, bucket in enumerate(self.band_buckets(signature)):
+                buckets[(band, bucket)].append(i)
+
+        pairs = set()
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+        for i in unsigned:
+            pairs.update((min(i, j), max(i, j)) for j in range(len(signatures)) if j != i)
+        return pairs
+
+
+def semantic_pairs(vectors: Sequence[Optional[Iterable[float]]], min_cosine: float) -> Set[Tuple[int, int]]:
+    """
+    Index pairs (i < j) whose mean chunk embeddings have cosine similarity of at
+    least ``min_cosine``: the recall fallback for paraphrases that share few shingles.
+    """
+    present = [i for i, vector in enumerate(vectors) if vector is not None]
+    if len(present) < 2:
+        return set()
+    matrix = np.array([vectors[i] for i in present], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    similar = np.triu(matrix @ matrix.T >= min_cosine, k=1)
+    return {(present[i], present[j]) for i, j in zip(*np.nonzero(similar))}
@@ -1,8 +1,72 @@
 import pytesseract
 from PIL import Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import os
-from typing import List
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from billiard.pool import Pool
+from typing import List, Optional, Sequence
+from app.core.config import settings
+
+
+@dataclass
+class PageOCRResult:
+    """OCR output for a single PDF page (1-based page number)."""
+    page: int
+    text: str
+    seconds: float
+    error: Optional[str] = None
+
+
+def _ocr_page_window(pdf_path: str, pages: List[int], dpi: int, timeout: float) -> List[PageOCRResult]:
+    """
+    Rasterise and OCR a small window of pages inside a pool worker.
+    Pages are rendered one at a time so a worker never holds more than one page image.
+    The per-page ``timeout`` (0 disables it) covers rendering and OCR together.
+    """
+    results = []
+    for page in pages:
+        start = time.perf_counter()
+        try:
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page,
+                                       timeout=timeout or None)
+            # OCR gets what rendering left of the page's time; a tiny positive timeout still expires
+            remaining = max(timeout - (time.perf_counter() - start), 1e-3) if timeout else 0
+            text = pytesseract.image_to_string(images[0], timeout=remaining) if images else ""
+            results.append(PageOCRResult(page, text, time.perf_counter() - start))
+        except Exception as e:
+            # pdf2image raises PDFPopplerTimeoutError and Tesseract RuntimeError when the timeout expires
+            results.append(PageOCRResult(page, "", time.perf_counter() - start, error=str(e)))
+    return results
+
+
+def ocr_workers() -> int:
+    """
+    OCR processes per extracting process. Every Celery prefork child has its
+    own pool, so by default the cores are shared among the children rather
+    than each child taking all of them.
+    """
+    if settings.OCR_WORKERS > 0:
+        return settings.OCR_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(1, settings.CELERY_WORKER_CONCURRENCY))
+
+
+_pool: Optional[Pool] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Pool:
+    """
+    A billiard pool, since prefork children are daemonic and the stdlib
+    pools refuse to start processes from them.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Pool(processes=ocr_workers())
+        return _pool
 
 class OCRService:
     """Service for Optical Character Recognition (OCR)"""
@@ -38,19 +102,54 @@ class OCRService:
             Extracted text string from all pages
         """
         try:
-            # Convert PDF pages to images
-            images = convert_from_path(pdf_path)
-            
-            full_text = []
-            for i, image in enumerate(images):
-                text = pytesseract.image_to_string(image)
-                full_text.append(text)
-                
-            return "\n\n".join(full_text)
+            pages = OCRService.ocr_pdf_pages(pdf_path)
+            return "\n\n".join(page.text for page in pages)
         except Exception as e:
             print(f"Error extracting text from scanned PDF {pdf_path}: {e}")
             return ""
 
+    @staticmethod
+    def ocr_pdf_pages(pdf_path: str, pages: Optional[Sequence[int]] = None, dpi: Optional[int] = None,
+                      page_timeout: Optional[float] = None) -> List[PageOCRResult]:
+        """
+        OCR a PDF page by page across a process pool.
+
+        Pages are rasterised in small ``first_page``/``last_page`` windows inside
+        the workers, and only a bounded number of windows are in flight at once,
+        so memory stays flat no matter how long the scan is.
+
+        Args:
+            pdf_path: Path to the PDF file
+            pages: 1-based page numbers to OCR (all pages if None)
+            dpi: Rasterisation resolution (OCR_DPI by default)
+            page_timeout: Seconds allowed per page (OCR_PAGE_TIMEOUT by default)
+
+        Returns:
+            Per-page results in page order, with timings
+        """
+        if pages is None:
+            pages = range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1)
+        pages = sorted(pages)
+        dpi = dpi or settings.OCR_DPI
+        page_timeout = settings.OCR_PAGE_TIMEOUT if page_timeout is None else page_timeout
+
+        window = max(1, settings.OCR_PAGES_PER_TASK)
+        windows = [pages[i:i + window] for i in range(0, len(pages), window)]
+        pool = _get_pool()
+        max_in_flight = ocr_workers() * 2
+
+        results: List[PageOCRResult] = []
+        pending = deque()
+        for pages_window in windows:
+            if len(pending) >= max_in_flight:
+                results.extend(pending.popleft().get())
+            pending.append(pool.apply_async(_ocr_page_window, (pdf_path, pages_window, dpi, page_timeout)))
+        while pending:
+            results.extend(pending.popleft().get())
+
+        results.sort(key=lambda r: r.page)
+        return results
+
     @staticmethod
     def is_image(filename: str) -> bool:
         """Check if file is a supported image format"""
@@ -1,55 +1,110 @@
 from fastapi import UploadFile
-from pdfminer.high_level import extract_text
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTTextContainer
 import docx
 import io
 import os
 from PIL import Image
 import pytesseract
-from pdf2image import convert_from_path
 import tempfile
+from typing import List, Tuple
+from app.core.config import settings
+from app.services.ocr import OCRService
+
+# Extensions extract_text_from_bytes knows how to parse; archive members are filtered by these
+SUPPORTED_EXTENSIONS = [".txt", ".docx", ".pdf", ".png", ".jpg", ".jpeg"]
+
+# Bump whenever extraction output changes, so cached extractions are not reused
+PARSER_VERSION = "3"
+
+
+def ocr_settings_key() -> str:
+    """OCR settings that change extraction output; part of the extraction cache key."""
+    return f"dpi={settings.OCR_DPI};min_page_chars={settings.OCR_MIN_PAGE_CHARS}"
+
+
+def file_type(filename: str) -> str:
+    return os.path.splitext(filename.lower())[1]
+
 
 async def extract_text_from_file(file: UploadFile) -> str:
     """
     Extracts text from a file, supporting .txt, .docx, .pdf, and image formats (.png, .jpg, .jpeg).
     """
     content = await file.read()
-    filename = file.filename.lower()
+    return extract_text_from_bytes(file.filename, content)
+
+
+def extract_text_from_bytes(filename: str, content: bytes) -> str:
+    """
+    Synchronous extraction from raw upload bytes.
+    Top-level so it can run in a worker process pool.
+    """
+    return extract_text_with_errors(filename, content)[0]
+
+
+def extract_text_with_errors(filename: str, content: bytes) -> Tuple[str, List[str]]:
+    """
+    Like ``extract_text_from_bytes``, but also returns the OCR errors of PDF
+    pages whose text could not be recognised (e.g. timeouts). Such pages keep
+    their text layer, so the text is degraded and should not be cached.
+    """
+    filename = filename.lower()
 
     if filename.endswith(".docx"):
         doc = docx.Document(io.BytesIO(content))
-        return " ".join([para.text for para in doc.paragraphs])
+        return " ".join([para.text for para in doc.paragraphs]), []
     
     elif filename.endswith(".pdf"):
-        # Try standard extraction first
-        text = extract_text(io.BytesIO(content))
-        if len(text.strip()) < 10:  # Likely a scanned PDF
-            # Use OCR for scanned PDFs
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-            
-            try:
-                images = convert_from_path(tmp_path)
-                ocr_text = ""
-                for img in images:
-                    ocr_text += pytesseract.image_to_string(img)
-                return ocr_text
-            finally:
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-        return text
+        return extract_text_from_pdf(content)
 
     elif filename.endswith((".png", ".jpg", ".jpeg")):
         # Direct OCR for images
         image = Image.open(io.BytesIO(content))
-        return pytesseract.image_to_string(image)
+        return pytesseract.image_to_string(image), []
 
     elif filename.endswith(".txt"):
-        return content.decode("utf-8")
+        return content.decode("utf-8"), []
     
     else:
         # For other file types, attempt to decode as utf-8
         try:
-            return content.decode("utf-8")
+            return content.decode("utf-8"), []
         except UnicodeDecodeError:
-            return ""
+            return "", []
+
+
+def extract_text_from_pdf(content: bytes) -> Tuple[str, List[str]]:
+    """
+    Hybrid PDF extraction: the text layer is read page by page with pdfminer,
+    and only pages whose text layer is too sparse (scanned pages) are sent to OCR.
+    Pages are merged back in order, separated by form feeds like pdfminer's output.
+    Returns the text and one "page N: error" entry per page whose OCR failed.
+    """
+    page_texts = [
+        "".join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+        for page in extract_pages(io.BytesIO(content))
+    ]
+    scanned_pages = [
+        number for number, text in enumerate(page_texts, start=1)
+        if len(text.strip()) < settings.OCR_MIN_PAGE_CHARS
+    ]
+
+    errors = []
+    if scanned_pages:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(content)
+            tmp_path = tmp.name
+
+        try:
+            for result in OCRService.ocr_pdf_pages(tmp_path, pages=scanned_pages):
+                # Keep whatever text layer there was if OCR failed for the page or read less of it
+                if result.error:
+                    errors.append(f"page {result.page}: {result.error}")
+                elif len(result.text.strip()) > len(page_texts[result.page - 1].strip()):
+                    page_texts[result.page - 1] = result.text
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return "".join(text + "\f" for text in page_texts), errors
@@ -0,0 +1,383 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.ai_detection import AIDetection
+from app.models.batch import Batch
+from app.models.comparison import Comparison
+from app.models.document import Document
+from app.models.embedding import Embedding
+from app.models.fingerprint import Fingerprint
+from app.models.minhash import MinHashBand, MinHashSignature
+from app.services.ai_detection import AIDetectionService
+from app.services.ann_index import get_chunk_index
+from app.services.chunk_store import load_chunk_embeddings, save_chunk_embeddings
+from app.services.embedding import EmbeddingService
+from app.services.fingerprint import Winnower
+from app.services.minhash import MinHasher
+from app.services.write_behind import WriteBehindBuffer
+
+_inference_pool: Optional[ThreadPoolExecutor] = None
+_inference_pool_lock = threading.Lock()
+
+
+def get_inference_pool() -> ThreadPoolExecutor:
+    """
+    Threads that run model inference for the batch pipeline, created once per process.
+    Threads rather than processes so the models loaded in this process are shared;
+    torch releases the GIL while it computes.
+    """
+    global _inference_pool
+    with _inference_pool_lock:
+        if _inference_pool is None:
+            _inference_pool = ThreadPoolExecutor(
+                max_workers=settings.PIPELINE_INFERENCE_WORKERS,
+                thread_name_prefix="inference",
+            )
+        return _inference_pool
+
+
+class StageTimer:
+    """Accumulated wall time and call count per pipeline stage."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {name: {"seconds": round(self.seconds[name], 3), "calls": self.calls[name]} for name in self.seconds}
+
+
+class DocumentPipeline:
+    """
+    Pipelined per-document analysis: extraction, AI detection, embedding, writes.
+
+    Database I/O stays on the event loop, serialised on the one session by a
+    lock. Model inference runs in the process-wide inference pool, with AI
+    detection and embedding of the same document submitted side by side. At most
+    ``max_in_flight`` documents are in inference at once, so while document N is
+    being written, document N+1 is already running through the models. Results
+    go through a ``WriteBehindBuffer``, and every stage is timed.
+
+    Documents whose normalised text matches an earlier document of the same
+    user (or another document of the task) skip the models: the original's
+    results are copied and the pair is recorded as a 1.0 comparison.
+    """
+
+    def __init__(self, session: AsyncSession, session_factory, ai_service: AIDetectionService,
+                 embedding_service: EmbeddingService, provider: str, ai_threshold: float,
+                 max_in_flight: Optional[int] = None):
+        self.session = session
+        self.session_factory = session_factory
+        self.ai_service = ai_service
+        self.embedding_service = embedding_service
+        self.provider = provider
+        self.ai_threshold = ai_threshold
+        self.max_in_flight = max_in_flight or settings.PIPELINE_MAX_IN_FLIGHT
+        self.minhasher = MinHasher()
+        self.winnower = Winnower()
+        self.timer = StageTimer()
+        self._db = asyncio.Lock()
+        self._indexed: List[dict] = []  # Chunk vectors for the local corpus index, added after the final flush
+        self._claims: Dict[Any, asyncio.Future] = {}  # (batch, text hash) -> reusable results of its first document
+        self.duplicates: Dict[str, int] = defaultdict(int)  # Work skipped for exact duplicates
+
+    async def run(self, doc_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        """Process the documents and return the per-stage timings."""
+        async with self.timer.stage("load"):
+            result = await self.session.execute(
+                select(Document).where(Document.id.in_(doc_ids), Document.status.not_in(["completed", "failed"]))
+            )
+            documents = result.scalars().all()
+            batches = {}
+            for batch_id in {doc.batch_id for doc in documents}:
+                batches[batch_id] = await self.session.get(Batch, batch_id)
+
+        # A session of its own: a failed flush is rolled back, which must not
+        # expire the documents loaded into the shared one
+        async with self.session_factory() as write_session:
+            writer = WriteBehindBuffer(write_session)
+            in_flight = asyncio.Semaphore(self.max_in_flight)
+            await asyncio.gather(*(
+                self._process(doc, batches[doc.batch_id], writer, in_flight) for doc in documents
+            ))
+            async with self._db, self.timer.stage("db_write"):
+                await writer.flush()
+        if self._indexed:
+            # One delta segment per task keeps the number of segments between compactions low
+            async with self.timer.stage("index"):
+                await asyncio.get_running_loop().run_in_executor(None, get_chunk_index().add, self._indexed)
+        return self.timer.as_dict()
+
+    async def _process(self, doc: Document, batch: Batch, writer: WriteBehindBuffer,
+                       in_flight: asyncio.Semaphore):
+        analysis_type = batch.analysis_type or "plagiarism"  # default to plagiarism
+        doc_id = doc.id  # Read up front, the handler below must not touch loaded attributes
+        claim = None
+        reusable = None
+        try:
+            async with in_flight:
+                text = await self._text(doc)
+                if text is None:
+                    return
+                text_hash = doc.text_hash or self._text_hash(text)
+                leader = self._claims.get((doc.batch_id, text_hash))
+                if leader is None:
+                    # First document with this text in the task; later copies wait for its results
+                    claim = self._claims[(doc.batch_id, text_hash)] = asyncio.get_running_loop().create_future()
+                    async with self.timer.stage("dedupe"):
+                        reusable = await self._stored_original(doc, batch, analysis_type, text_hash)
+            if claim is None:
+                reusable = await leader
+
+            if reusable is None:
+                async with in_flight:
+                    ai_result, encoding, signature, fingerprints = await self._infer(doc.id, text, analysis_type)
+                await self._store(doc, batch, writer, text_hash, ai_result, encoding, signature, fingerprints)
+                reusable = {"document_id": doc.id, "ai_result": ai_result, "encoding": encoding, "signature": signature}
+            else:
+                # Exact duplicate: no model runs, the original's results are copied
+                self.duplicates["documents"] += 1
+                self.duplicates["ai_detection_skipped"] += reusable["ai_result"] is not None
+                self.duplicates["embedding_skipped"] += reusable["encoding"] is not None
+                await self._store(
+                    doc, batch, writer, text_hash, reusable["ai_result"], reusable["encoding"],
+                    reusable["signature"], None, duplicate_of=reusable["document_id"]
+                )
+        except Exception as e:
+            reusable = None
+            print(f"Error processing document {doc_id}: {e}")
+            async with self._db:
+                # Rows buffered before the failure would otherwise wait for a completion that never comes
+                writer.discard(str(doc_id))
+            # A session of its own: rolling back the shared one would expire every
+            # document the other coroutines of this task have loaded
+            async with self.session_factory() as session:
+                await session.execute(
+                    update(Document)
+                    .where(Document.id == doc_id, Document.status != "completed")
+                    .values(status="failed")
+                )
+                await session.commit()
+        finally:
+            if claim is not None and not claim.done():
+                # Copies of a failed document are processed on their own
+                claim.set_result(reusable)
+
+    async def _store(self, doc: Document, batch: Batch, writer: WriteBehindBuffer, text_hash: str,
+                     ai_result, encoding, signature, fingerprints, duplicate_of=None):
+        """Buffer a document's results and completion; duplicates are left out of the corpus indexes."""
+        values = {"text_hash": text_hash}
+        rows = []
+        indexed = None
+        if ai_result is not None:
+            values.update(
+                ai_score=ai_result.get("score", 0.0),
+                is_ai_generated=ai_result.get("is_ai", False),
+                ai_confidence=ai_result.get("confidence", 0.0),
+                ai_provider=ai_result.get("provider", "unknown")
+            )
+            # Store detailed AI detection result in AIDetection table
+            rows.append((AIDetection, {
+                "document_id": doc.id,
+                "model_version": ai_result.get("details", {}).get("model", "unknown"),
+                "probability": ai_result.get("score", 0.0),
+                "meta_data": {
+                    "provider": ai_result.get("provider", "unknown"),
+                    "confidence": ai_result.get("confidence", 0.0),
+                    "label": ai_result.get("label", "unknown"),
+                    "details": ai_result.get("details", {})
+                }
+            }))
+        if encoding is not None and len(encoding[1]):
+            spans, embeddings = encoding
+            async with self.timer.stage("storage"):
+                await save_chunk_embeddings(str(doc.batch_id), str(doc.id), spans, embeddings)
+            # Average embedding for legacy compatibility/search
+            values.update(embedding=np.mean(embeddings, axis=0).tolist(), chunk_count=len(spans))
+            # Chunk vectors for corpus-wide search; corpus lookups find a duplicate's original instead
+            if duplicate_of is None and settings.CORPUS_INDEX_BACKEND == "local":
+                indexed = {
+                    "document_id": doc.id,
+                    "batch_id": doc.batch_id,
+                    "tenant_id": batch.user_id,
+                    "course": batch.course,
+                    "spans": spans,
+                    "embeddings": embeddings
+                }
+            elif duplicate_of is None:
+                rows.extend((Embedding, {
+                    "file_id": doc.id,
+                    "vector": vector,
+                    "type": "text",
+                    "chunk_index": i,
+                    "span_start": int(start),
+                    "span_end": int(end),
+                    "batch_id": doc.batch_id,
+                    "tenant_id": batch.user_id,
+                    "course": batch.course
+                }) for i, ((start, end), vector) in enumerate(zip(spans, embeddings)))
+
+        if signature is not None:
+            # Lexical prefilter for the similarity stage and cross-batch near-duplicate lookups
+            rows.append((MinHashSignature, {
+                "document_id": doc.id,
+                "num_perm": len(signature),
+                "signature": signature.tobytes()
+            }))
+            rows.extend((MinHashBand, {"band": band, "bucket": bucket, "document_id": doc.id})
+                        for band, bucket in enumerate(self.minhasher.band_buckets(signature)))
+        if fingerprints:
+            # Inverted index for verbatim copy lookups
+            rows.extend((Fingerprint, row) for row in fingerprints)
+        if duplicate_of is not None:
+            values["duplicate_of"] = duplicate_of
+            if (batch.analysis_type or "plagiarism") in ["plagiarism", "both", "mixed"]:
+                # The pair is recorded without a chunk comparison
+                rows.extend((Comparison, {
+                    "id": uuid.uuid4(), "doc_a": doc_a, "doc_b": doc_b, "similarity": 1.0, "matches": []
+                }) for doc_a, doc_b in [(doc.id, duplicate_of), (duplicate_of, doc.id)])
+
+        async with self._db, self.timer.stage("db_write"):
+            for model, row in rows:
+                await writer.add(model, row, owner=str(doc.id),
+                                 on_conflict="uq_comparison_pair" if model is Comparison else None)
+            # Counted in processed_docs once, even if the task is delivered twice
+            await writer.complete(str(doc.id), str(doc.batch_id), values)
+        if indexed is not None:
+            self._indexed.append(indexed)
+
+    async def _stored_original(self, doc: Document, batch: Batch, analysis_type: str,
+                               text_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Reusable results of the earliest completed document of the same user with
+        the same normalised text, analysed by the same provider and threshold, or None.
+        """
+        need_ai = analysis_type in ["ai", "both", "mixed"]
+        need_plagiarism = analysis_type in ["plagiarism", "both", "mixed"]
+        stmt = (
+            select(Document.id, Document.batch_id, Document.chunk_count, Document.ai_score,
+                   Document.is_ai_generated, Document.ai_confidence, Document.ai_provider)
+            .join(Batch, Batch.id == Document.batch_id)
+            .where(
+                Document.text_hash == text_hash,
+                Document.id != doc.id,
+                Document.status == "completed",
+                Document.duplicate_of.is_(None),
+                Batch.user_id == batch.user_id
+            )
+            .order_by(Document.created_at)
+            .limit(1)
+        )
+        if need_ai:
+            stmt = stmt.where(
+                Batch.analysis_type.in_(["ai", "both", "mixed"]),
+                Batch.ai_provider == self.provider,
+                Batch.ai_threshold == self.ai_threshold
+            )
+        if need_plagiarism:
+            stmt = stmt.where(func.coalesce(Batch.analysis_type, "plagiarism").in_(["plagiarism", "both", "mixed"]))
+
+        async with self._db:
+            original = (await self.session.execute(stmt)).first()
+            if original is None:
+                return None
+            meta = signature = None
+            if need_ai:
+                meta = await self.session.scalar(
+                    select(AIDetection.meta_data)
+                    .where(AIDetection.document_id == original.id)
+                    .order_by(AIDetection.created_at.desc())
+                    .limit(1)
+                )
+            if need_plagiarism:
+                signature = await self.session.scalar(
+                    select(MinHashSignature.signature).where(MinHashSignature.document_id == original.id)
+                )
+
+        ai_result = None
+        if need_ai:
+            meta = meta or {}
+            ai_result = {
+                "score": original.ai_score,
+                "is_ai": original.is_ai_generated,
+                "confidence": original.ai_confidence,
+                "provider": original.ai_provider,
+                "label": meta.get("label", "unknown"),
+                "details": meta.get("details", {})
+            }
+        encoding = None
+        if need_plagiarism and original.chunk_count:
+            try:
+                encoding = await load_chunk_embeddings(str(original.batch_id), str(original.id))
+            except Exception as e:
+                print(f"Error loading chunk embeddings of document {original.id}: {e}")
+                return None
+        if signature is not None:
+            signature = np.frombuffer(signature, dtype=np.uint32)
+            if len(signature) != self.minhasher.num_perm:
+                signature = None
+        return {"document_id": original.id, "ai_result": ai_result, "encoding": encoding, "signature": signature}
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        from app.services.ingestion import normalized_text_hash
+        return normalized_text_hash(text)
+
+    async def _text(self, doc: Document) -> Optional[str]:
+        """The document's text, extracting it first if ingestion left it pending."""
+        if doc.status != "extracting":
+            return doc.text_content
+        from app.services.ingestion import extract_document
+        async with self.timer.stage("extract"):
+            # A session of its own, so slow parsing/OCR never holds the pipeline's session
+            async with self.session_factory() as session:
+                pending = await session.get(Document, doc.id)
+                if not await extract_document(session, pending):
+                    return None
+                return pending.text_content
+
+    async def _infer(self, document_id, text: str, analysis_type: str):
+        """Run AI detection, chunk embedding, MinHash and winnowing for one text concurrently in the inference pool."""
+        loop = asyncio.get_running_loop()
+        pool = get_inference_pool()
+
+        async def timed(name, fn, *args):
+            async with self.timer.stage(name):
+                return await loop.run_in_executor(pool, fn, *args)
+
+        jobs = []
+        if analysis_type in ["ai", "both", "mixed"] and text:
+            jobs.append(timed(
+                "ai_detection", self.ai_service.detect_many, [text], self.provider, self.ai_threshold
+            ))
+        else:
+            jobs.append(asyncio.sleep(0, result=None))
+        if analysis_type in ["plagiarism", "both", "mixed"] and text and self.embedding_service.model:
+            jobs.append(timed("embedding", self.embedding_service.encode_documents, [text]))
+            jobs.append(timed("minhash", self.minhasher.signature, text))
+            jobs.append(timed("fingerprint", self.winnower.rows, document_id, text))
+        else:
+            jobs.extend(asyncio.sleep(0, result=None) for _ in range(3))
+
+        ai_results, encodings, signature, fingerprints = await asyncio.gather(*jobs)
+        return (ai_results[0] if ai_results else None), (encodings[0] if encodings else None), signature, fingerprints
@@ -1,14 +1,19 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
 import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from app.core.config import settings
 from app.models import Document
+from app.services.chunking import Span
 from app.services.embedding import EmbeddingService
+from app.services.minhash import MinHasher, semantic_pairs
+from app.services.similarity import SimilarityEngine
 
 class PlagiarismService:
     def __init__(self, db_session: AsyncSession = None):
         self.db_session = db_session
         self.embedding_service = EmbeddingService()
+        self.similarity_engine = SimilarityEngine()
 
     def calculate_similarity(self, embedding_a, embedding_b) -> float:
         """Calculate cosine similarity between two embeddings"""
@@ -32,53 +37,102 @@ class PlagiarismService:
         Compare two documents using chunk-based analysis.
         Returns overall similarity and specific matching passages.
         """
-        chunks_a, embeddings_a = self.embedding_service.encode_chunks(doc_a_text)
-        chunks_b, embeddings_b = self.embedding_service.encode_chunks(doc_b_text)
+        # Both documents share one batched model call
+        (spans_a, embeddings_a), (spans_b, embeddings_b) = \
+            self.embedding_service.encode_documents([doc_a_text, doc_b_text])
         
-        if not embeddings_a or not embeddings_b:
+        if len(embeddings_a) == 0 or len(embeddings_b) == 0:
             return {"score": 0.0, "matches": []}
 
-        matches = []
-        total_similarity = 0.0
-        
-        # Compare every chunk in A against every chunk in B
-        # This is O(N*M), fine for reasonable document sizes
-        # For production with large docs, use FAISS or pgvector for chunk search
-        
-        for i, emb_a in enumerate(embeddings_a):
-            best_match_score = 0.0
-            best_match_idx = -1
-            
-            for j, emb_b in enumerate(embeddings_b):
-                score = self.calculate_similarity(emb_a, emb_b)
-                if score > best_match_score:
-                    best_match_score = score
-                    best_match_idx = j
-            
-            # Threshold for a "match"
-            if best_match_score > 0.75:
-                matches.append({
-                    "source_chunk": chunks_a[i],
-                    "target_chunk": chunks_b[best_match_idx],
-                    "score": round(best_match_score, 4),
-                    "source_index": i,
-                    "target_index": best_match_idx
-                })
-                total_similarity += best_match_score
-
-        # Normalize overall score
-        # Simple approach: (sum of matched chunk scores) / (total chunks in A)
-        # This represents "how much of A is found in B"
-        overall_score = total_similarity / len(chunks_a) if chunks_a else 0.0
-
-        return {
-            "score": round(overall_score, 4),
-            "matches": matches,
-            "details": {
-                "chunks_a": len(chunks_a),
-                "chunks_b": len(chunks_b)
-            }
-        }
+        # Every chunk of A is matched against all chunks of B with blocked matrix products
+        return self.similarity_engine.compare(
+            (doc_a_text, spans_a), self.similarity_engine.normalize(embeddings_a),
+            (doc_b_text, spans_b), self.similarity_engine.normalize(embeddings_b)
+        )
+
+    def compare_all_pairs(self, encoded_docs: Sequence[Tuple[str, List[Span], Any]],
+                          min_score: float = 0.1) -> List[Dict[str, Any]]:
+        """
+        Compare every ordered pair of already-encoded documents in one pass.
+
+        ``encoded_docs`` holds (text, spans, embeddings) per document, with spans
+        and embeddings as returned by ``EmbeddingService.encode_documents``. All
+        chunks are stacked into a single normalized matrix with a document offset
+        table so each document is encoded exactly once. Returns dicts with
+        'source'/'target' positions into ``encoded_docs`` plus the usual 'score'/'matches'.
+        """
+        return self.compare_tile(encoded_docs, min_score=min_score)
+
+    def compare_tile(self, encoded_docs: Sequence[Tuple[str, List[Span], Any]], split: Optional[int] = None,
+                     min_score: float = 0.1) -> List[Dict[str, Any]]:
+        """
+        Compare one tile of the document-pair matrix.
+
+        Without ``split`` every ordered pair of ``encoded_docs`` is compared (a
+        diagonal tile). With ``split`` only pairs between ``encoded_docs[:split]``
+        and ``encoded_docs[split:]`` are, in both directions (an off-diagonal tile).
+        """
+        members = [i for i, (_, spans, embeddings) in enumerate(encoded_docs) if len(embeddings)]
+        if split is None:
+            if len(members) < 2:
+                return []
+        else:
+            local_split = sum(1 for i in members if i < split)
+            if local_split in (0, len(members)):
+                return []
+
+        documents = [(encoded_docs[i][0], encoded_docs[i][1]) for i in members]
+        matrix = self.similarity_engine.normalize(
+            np.concatenate([np.asarray(encoded_docs[i][2], dtype=np.float32) for i in members])
+        )
+        offsets = np.concatenate([[0], np.cumsum([len(spans) for _, spans in documents])])
+
+        if split is None:
+            results = self.similarity_engine.all_pairs(documents, matrix, offsets, min_score=min_score)
+        else:
+            results = self.similarity_engine.cross_pairs(documents, matrix, offsets, local_split, min_score=min_score)
+        for result in results:
+            result["source"] = members[result["source"]]
+            result["target"] = members[result["target"]]
+        return results
+
+    def compare_pairs(self, encoded_docs: Sequence[Tuple[str, List[Span], Any]],
+                      pairs: Iterable[Tuple[int, int]], min_score: float = 0.1) -> List[Dict[str, Any]]:
+        """
+        Compare only the given unordered pairs (i, j) of ``encoded_docs``, in both
+        directions, for when a prefilter has ruled out the other pairs. Returns
+        the same dicts as ``compare_tile``.
+        """
+        matrices = {}
+
+        def matrix(i):
+            if i not in matrices:
+                matrices[i] = self.similarity_engine.normalize(encoded_docs[i][2])
+            return matrices[i]
+
+        results = []
+        for i, j in pairs:
+            if not len(encoded_docs[i][2]) or not len(encoded_docs[j][2]):
+                continue
+            for source, target in ((i, j), (j, i)):
+                result = self.similarity_engine.compare(
+                    (encoded_docs[source][0], encoded_docs[source][1]), matrix(source),
+                    (encoded_docs[target][0], encoded_docs[target][1]), matrix(target)
+                )
+                if result["score"] > min_score:
+                    result["source"] = source
+                    result["target"] = target
+                    results.append(result)
+        return results
+
+    @staticmethod
+    def _prefilter(document: Document, others: List[Document]) -> List[Document]:
+        """The documents sharing an LSH band with ``document`` or close in mean embedding."""
+        docs = [document, *others]
+        hasher = MinHasher()
+        pairs = hasher.candidate_pairs([hasher.signature(doc.text_content or "") for doc in docs])
+        pairs |= semantic_pairs([doc.embedding for doc in docs], settings.PREFILTER_SEMANTIC_MIN)
+        return [other for i, other in enumerate(others, start=1) if (0, i) in pairs]
 
     async def find_similar_in_batch(self, document: Document, batch_id: str) -> List[Dict[str, Any]]:
         """Find similar documents within the same batch"""
@@ -94,6 +148,8 @@ class PlagiarismService:
         )
         result = await self.db_session.execute(query)
         other_docs = result.scalars().all()
+        if settings.MINHASH_PREFILTER:
+            other_docs = self._prefilter(document, other_docs)
         
         results = []
         for other_doc in other_docs:
@@ -0,0 +1,211 @@
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.chunking import Span
+
+# A document as seen by the engine: its text and the (start, end) spans of its chunks
+ChunkedText = Tuple[str, List[Span]]
+
+
+class SimilarityEngine:
+    """
+    Matrix-based chunk similarity.
+
+    Chunk embeddings are held as L2-normalized float32 matrices so cosine
+    similarity reduces to a matrix product. Products are computed in blocks
+    whose size is capped by ``max_block_bytes`` so very large chunk counts
+    never materialise the full similarity matrix.
+    """
+
+    def __init__(self, match_threshold: float = 0.75, max_block_bytes: Optional[int] = None):
+        self.match_threshold = match_threshold
+        self.max_block_bytes = max_block_bytes or settings.SIMILARITY_MAX_BLOCK_MB * 1024 * 1024
+
+    @staticmethod
+    def normalize(embeddings) -> np.ndarray:
+        """Return a C-contiguous float32 matrix with unit-length rows (zero rows stay zero)."""
+        if len(embeddings) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.array(embeddings, dtype=np.float32, ndmin=2, copy=True)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return np.ascontiguousarray(matrix)
+
+    def _block_shape(self, n_rows: int, n_cols: int) -> Tuple[int, int]:
+        """Pick (row_block, col_block) so one float32 block stays under the memory cap."""
+        max_cells = max(1, self.max_block_bytes // 4)
+        col_block = min(n_cols, max_cells)
+        row_block = min(n_rows, max(1, max_cells // max(col_block, 1)))
+        return row_block, col_block
+
+    def best_matches(self, matrix_a: np.ndarray, matrix_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        For every row of ``matrix_a`` find the most similar row of ``matrix_b``.
+
+        Both inputs must already be normalized. Returns (scores, indices); rows
+        with no positive similarity get score 0.0 and index -1.
+        """
+        n_a, n_b = matrix_a.shape[0], matrix_b.shape[0]
+        best_scores = np.zeros(n_a, dtype=np.float32)
+        best_indices = np.full(n_a, -1, dtype=np.int64)
+        if n_a == 0 or n_b == 0:
+            return best_scores, best_indices
+
+        row_block, col_block = self._block_shape(n_a, n_b)
+        for r0 in range(0, n_a, row_block):
+            r1 = min(r0 + row_block, n_a)
+            for c0 in range(0, n_b, col_block):
+                c1 = min(c0 + col_block, n_b)
+                block = matrix_a[r0:r1] @ matrix_b[c0:c1].T
+                idx = np.argmax(block, axis=1)
+                scores = block[np.arange(r1 - r0), idx]
+                # Strict comparison keeps the first maximum, like a sequential scan
+                better = scores > best_scores[r0:r1]
+                best_scores[r0:r1][better] = scores[better]
+                best_indices[r0:r1][better] = idx[better] + c0
+        return best_scores, best_indices
+
+    def compare(self, doc_a: ChunkedText, matrix_a: np.ndarray,
+                doc_b: ChunkedText, matrix_b: np.ndarray) -> Dict[str, Any]:
+        """
+        Compare two documents given their chunk spans and normalized chunk matrices.
+        Returns overall similarity ("how much of A is found in B") and matching passages.
+        """
+        best_scores, best_indices = self.best_matches(matrix_a, matrix_b)
+        return self._build_result(doc_a, doc_b, best_scores, best_indices)
+
+    def all_pairs(self, documents: List[ChunkedText], matrix: np.ndarray,
+                  offsets: np.ndarray, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Compare every ordered pair of documents stacked in one chunk matrix.
+
+        ``matrix`` holds the normalized chunks of all documents back to back and
+        ``offsets`` (length D + 1) marks where each document's rows start. Every
+        document must own at least one row. Documents are grouped into tiles whose
+        similarity block fits the memory cap, and per-pair best matches are pulled
+        out of each tile with segmented reductions. Returns one result per ordered
+        pair (source, target) whose score exceeds ``min_score``.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        tiles = self._document_tiles(offsets)
+        results = []
+        for ti, tile_a in enumerate(tiles):
+            for tile_b in tiles[ti:]:
+                results.extend(self._compare_tiles(documents, matrix, offsets, tile_a, tile_b, min_score))
+        return results
+
+    def cross_pairs(self, documents: List[ChunkedText], matrix: np.ndarray, offsets: np.ndarray,
+                    split: int, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Like ``all_pairs`` but only for ordered pairs between documents ``[0, split)``
+        and ``[split, D)``, in both directions. Used for one off-diagonal tile
+        of a distributed all-pairs comparison.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        tiles_a = self._document_tiles(offsets[:split + 1])
+        tiles_b = [(start + split, end + split) for start, end in self._document_tiles(offsets[split:])]
+        results = []
+        for tile_a in tiles_a:
+            for tile_b in tiles_b:
+                results.extend(self._compare_tiles(documents, matrix, offsets, tile_a, tile_b, min_score))
+        return results
+
+    @staticmethod
+    def plan_tiles(chunk_counts: List[int], max_rows: int) -> List[Tuple[int, int]]:
+        """Group consecutive documents into (first, last + 1) tiles of at most ``max_rows`` chunks."""
+        return SimilarityEngine._group_rows(np.concatenate([[0], np.cumsum(chunk_counts, dtype=np.int64)]), max_rows)
+
+    def _document_tiles(self, offsets: np.ndarray) -> List[Tuple[int, int]]:
+        """Group consecutive documents into (first, last + 1) tiles whose square block fits the cap."""
+        return self._group_rows(offsets, max(1, int(np.sqrt(self.max_block_bytes // 4))))
+
+    @staticmethod
+    def _group_rows(offsets: np.ndarray, max_rows: int) -> List[Tuple[int, int]]:
+        tiles = []
+        start = 0
+        n_docs = len(offsets) - 1
+        for d in range(n_docs):
+            if d > start and offsets[d + 1] - offsets[start] > max_rows:
+                tiles.append((start, d))
+                start = d
+        if n_docs:
+            tiles.append((start, n_docs))
+        return tiles
+
+    def _compare_tiles(self, documents, matrix, offsets, tile_a, tile_b, min_score):
+        a0, a1 = tile_a
+        b0, b1 = tile_b
+        row_base, col_base = offsets[a0], offsets[b0]
+        row_starts = offsets[a0:a1] - row_base
+        col_starts = offsets[b0:b1] - col_base
+        row_counts = np.diff(offsets[a0:a1 + 1])
+        col_counts = np.diff(offsets[b0:b1 + 1])
+
+        block = matrix[row_base:offsets[a1]] @ matrix[col_base:offsets[b1]].T
+
+        # Best score of every chunk against each document of the other tile
+        row_best = np.maximum.reduceat(block, col_starts, axis=1)
+        col_best = np.maximum.reduceat(block, row_starts, axis=0)
+        row_best[row_best <= self.match_threshold] = 0.0
+        col_best[col_best <= self.match_threshold] = 0.0
+
+        # Pair scores: sum of matched chunk scores / chunks in the source document
+        forward = np.add.reduceat(row_best, row_starts, axis=0, dtype=np.float64) / row_counts[:, None]
+        backward = np.add.reduceat(col_best, col_starts, axis=1, dtype=np.float64) / col_counts[None, :]
+
+        def pair_result(source, target, source_in_rows):
+            if source_in_rows:
+                sub = block[offsets[source] - row_base:offsets[source + 1] - row_base,
+                            offsets[target] - col_base:offsets[target + 1] - col_base]
+            else:
+                sub = block[offsets[target] - row_base:offsets[target + 1] - row_base,
+                            offsets[source] - col_base:offsets[source + 1] - col_base].T
+            best_indices = np.argmax(sub, axis=1)
+            best_scores = sub[np.arange(sub.shape[0]), best_indices]
+            result = self._build_result(documents[source], documents[target], best_scores, best_indices)
+            result["source"] = int(source)
+            result["target"] = int(target)
+            return result
+
+        results = []
+        same_tile = tile_a == tile_b
+        for i, j in zip(*np.nonzero(forward > min_score)):
+            if same_tile and i == j:
+                continue
+            results.append(pair_result(a0 + i, b0 + j, source_in_rows=True))
+        if not same_tile:
+            # Within a tile the forward pass already covers every ordered pair
+            for i, j in zip(*np.nonzero(backward > min_score)):
+                results.append(pair_result(b0 + j, a0 + i, source_in_rows=False))
+        return results
+
+    def _build_result(self, doc_a: ChunkedText, doc_b: ChunkedText,
+                      best_scores: np.ndarray, best_indices: np.ndarray) -> Dict[str, Any]:
+        (text_a, spans_a), (text_b, spans_b) = doc_a, doc_b
+        matched = np.flatnonzero(best_scores > self.match_threshold)
+
+        matches = []
+        for i in matched:
+            j = best_indices[i]
+            (a_start, a_end), (b_start, b_end) = spans_a[i], spans_b[j]
+            # Chunk text is sliced from the source only for reported matches
+            matches.append({
+                "source_chunk": text_a[a_start:a_end],
+                "target_chunk": text_b[b_start:b_end],
+                "score": round(float(best_scores[i]), 4),
+                "source_index": int(i),
+                "target_index": int(j),
+                "source_span": [int(a_start), int(a_end)],
+                "target_span": [int(b_start), int(b_end)]
+            })
+        total_similarity = float(best_scores[matched].sum(dtype=np.float64))
+        overall_score = total_similarity / len(spans_a) if spans_a else 0.0
+
+        return {
+            "score": round(overall_score, 4),
+            "matches": matches,
+            "details": {
+                "chunks_a": len(spans_a),
+                "chunks_b": len(spans_b)
+            }
+        }
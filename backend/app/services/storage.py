@@ -1,23 +1,69 @@
+import asyncio
 import boto3
 from botocore.client import Config
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
 
-class StorageService:
-    def __init__(self, storage_type="local"):
-        self.storage_type = storage_type
-        if self.storage_type == "s3":
-            self.s3 = boto3.client(
+from app.core.config import settings
+
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # Downloads beyond this spill from memory to a temporary file
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Process-wide S3 client. boto3 clients are thread-safe, so one client and its
+    connection pool (sized to STORAGE_MAX_CONCURRENCY) serve every request.
+    """
+    global _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client(
                 "s3",
-                endpoint_url=os.getenv("S3_ENDPOINT_URL"),
-                aws_access_key_id=os.getenv("S3_ACCESS_KEY"),
-                aws_secret_access_key=os.getenv("S3_SECRET_KEY"),
-                config=Config(signature_version="s3v4"),
+                endpoint_url=settings.S3_ENDPOINT_URL,
+                aws_access_key_id=settings.S3_ACCESS_KEY,
+                aws_secret_access_key=settings.S3_SECRET_KEY,
+                config=Config(
+                    signature_version="s3v4",
+                    max_pool_connections=settings.STORAGE_MAX_CONCURRENCY,
+                    retries={"max_attempts": 3, "mode": "standard"},
+                ),
             )
-            self.bucket_name = os.getenv("S3_BUCKET_NAME")
+        return _s3_client
+
+
+class StorageService:
+    def __init__(self, storage_type=None):
+        self.storage_type = storage_type or settings.STORAGE_TYPE
+        if self.storage_type == "s3":
+            self.s3 = get_s3_client()
+            self.bucket_name = settings.S3_BUCKET_NAME
         else:
             self.upload_dir = "uploads"
             os.makedirs(self.upload_dir, exist_ok=True)
 
+    def ensure_bucket(self):
+        """Create the S3 bucket if it does not exist yet (a fresh MinIO has none). Nothing to do for local storage."""
+        if self.storage_type != "s3":
+            return
+        try:
+            self.s3.head_bucket(Bucket=self.bucket_name)
+            return
+        except self.s3.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchBucket", "NotFound"):
+                raise
+        try:
+            self.s3.create_bucket(Bucket=self.bucket_name)
+        except self.s3.exceptions.BucketAlreadyOwnedByYou:
+            pass  # Another process created it first
+
     def save(self, filename, content):
         if self.storage_type == "s3":
             self.s3.put_object(Bucket=self.bucket_name, Key=filename, Body=content)
@@ -29,6 +75,118 @@ class StorageService:
                 f.write(content)
             return path
 
+    def save_stream(self, filename, stream):
+        """
+        Store a file-like object without holding it in memory.
+        Returns (location, sha256 hex digest, size in bytes).
+        """
+        digest = hashlib.sha256()
+        if self.storage_type == "s3":
+            location, size = self._upload_multipart(filename, stream, digest)
+            return location, digest.hexdigest(), size
+
+        path = os.path.join(self.upload_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        with open(path, "wb") as f:
+            for chunk in _iter_chunks(stream, settings.STORAGE_CHUNK_KB * 1024):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        return path, digest.hexdigest(), size
+
+    def _upload_multipart(self, filename, stream, digest):
+        """Upload in parts of S3_MULTIPART_PART_MB; at most one part is buffered at a time."""
+        part_size = max(S3_MIN_PART_SIZE, settings.S3_MULTIPART_PART_MB * 1024 * 1024)
+        chunk_size = min(part_size, settings.STORAGE_CHUNK_KB * 1024)
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+
+        def flush(data):
+            nonlocal upload_id
+            if upload_id is None:
+                upload_id = self.s3.create_multipart_upload(Bucket=self.bucket_name, Key=filename)["UploadId"]
+            response = self.s3.upload_part(
+                Bucket=self.bucket_name, Key=filename, UploadId=upload_id,
+                PartNumber=len(parts) + 1, Body=bytes(data)
+            )
+            parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+
+        try:
+            for chunk in _iter_chunks(stream, chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                buffer += chunk
+                if len(buffer) >= part_size:
+                    flush(buffer[:part_size])
+                    del buffer[:part_size]
+
+            if upload_id is None:
+                # Small file, a single request is cheaper than a multipart upload
+                self.s3.put_object(Bucket=self.bucket_name, Key=filename, Body=bytes(buffer))
+            else:
+                if buffer:
+                    flush(buffer)
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket_name, Key=filename, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except Exception:
+            if upload_id is not None:
+                self.s3.abort_multipart_upload(Bucket=self.bucket_name, Key=filename, UploadId=upload_id)
+            raise
+        return f"s3://{self.bucket_name}/{filename}", size
+
+    def read(self, filename):
+        if self.storage_type == "s3":
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=filename)
+            return response["Body"].read()
+        else:
+            with open(os.path.join(self.upload_dir, filename), "rb") as f:
+                return f.read()
+
+    def open(self, filename):
+        """
+        A seekable binary file object over a stored file, for readers that need
+        random access (zip archives keep their directory at the end). S3 objects
+        are downloaded in ranged chunks into a spooled temporary file, so large
+        objects never sit in memory whole. The caller closes it.
+        """
+        if self.storage_type == "s3":
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            try:
+                self.s3.download_fileobj(self.bucket_name, filename, spool)
+            except Exception:
+                spool.close()
+                raise
+            spool.seek(0)
+            return spool
+        else:
+            return open(os.path.join(self.upload_dir, filename), "rb")
+
+    def exists(self, filename):
+        if self.storage_type == "s3":
+            try:
+                self.s3.head_object(Bucket=self.bucket_name, Key=filename)
+                return True
+            except self.s3.exceptions.ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    return False
+                raise
+        else:
+            return os.path.exists(os.path.join(self.upload_dir, filename))
+
+    def delete(self, filename):
+        if self.storage_type == "s3":
+            self.s3.delete_object(Bucket=self.bucket_name, Key=filename)
+        else:
+            try:
+                os.remove(os.path.join(self.upload_dir, filename))
+            except FileNotFoundError:
+                pass
+
     def get_presigned_url(self, filename):
         if self.storage_type == "s3":
             return self.s3.generate_presigned_url(
@@ -40,3 +198,80 @@ class StorageService:
             # For local storage, return a relative URL that the frontend can use
             # Assuming the backend serves the 'uploads' directory at /uploads
             return f"/api/v1/files/{filename}"
+
+    def get_presigned_urls(self, filenames):
+        """Presigned URLs for many keys; signing is local, so no request is made per key."""
+        return {filename: self.get_presigned_url(filename) for filename in filenames}
+
+
+class AsyncStorageService:
+    """
+    Async interface over StorageService for local and S3 modes alike.
+
+    Blocking transfers run on a dedicated thread pool of STORAGE_MAX_CONCURRENCY
+    threads, which bounds parallel puts/gets per process and keeps the event
+    loop free. The pool is not tied to an event loop, so one instance can be
+    shared by the API process and by Celery tasks that each run their own loop.
+    """
+
+    def __init__(self, storage: Optional[StorageService] = None, max_concurrency: int = None):
+        self.storage = storage or StorageService()
+        self.storage_type = self.storage.storage_type
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency or settings.STORAGE_MAX_CONCURRENCY,
+            thread_name_prefix="storage",
+        )
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def ensure_bucket(self):
+        await self._call(self.storage.ensure_bucket)
+
+    async def save(self, filename: str, content: bytes) -> str:
+        return await self._call(self.storage.save, filename, content)
+
+    async def save_stream(self, filename: str, stream) -> Tuple[str, str, int]:
+        return await self._call(self.storage.save_stream, filename, stream)
+
+    async def read(self, filename: str) -> bytes:
+        return await self._call(self.storage.read, filename)
+
+    async def exists(self, filename: str) -> bool:
+        return await self._call(self.storage.exists, filename)
+
+    async def delete(self, filename: str):
+        await self._call(self.storage.delete, filename)
+
+    async def save_many(self, items: Iterable[Tuple[str, bytes]]) -> List[str]:
+        return await asyncio.gather(*(self.save(filename, content) for filename, content in items))
+
+    async def read_many(self, filenames: Iterable[str]) -> List[bytes]:
+        return await asyncio.gather(*(self.read(filename) for filename in filenames))
+
+    async def presigned_url(self, filename: str) -> str:
+        return (await self.presigned_urls([filename]))[filename]
+
+    async def presigned_urls(self, filenames: Iterable[str]) -> Dict[str, str]:
+        return await self._call(self.storage.get_presigned_urls, list(filenames))
+
+
+_storage: Optional[AsyncStorageService] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> AsyncStorageService:
+    """Return the process-wide async storage backend for the configured STORAGE_TYPE."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = AsyncStorageService()
+        return _storage
+
+
+def _iter_chunks(stream, chunk_size):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,173 @@
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.batch import Batch
+from app.models.document import Document
+
+
+class WriteBehindBuffer:
+    """
+    Write-behind layer for pipeline results.
+
+    Result rows and document completions are buffered and written in bulk:
+    one executemany INSERT per table and one executemany UPDATE for the
+    documents, in a single transaction. The buffer flushes once ``max_rows``
+    rows are pending or the oldest pending row is ``max_delay`` seconds old
+    (checked whenever something is added), and on ``flush()``.
+
+    Status updates are crash-safe. A document becomes ``completed`` in the same
+    transaction as the rows it owns (owned rows wait in the buffer until the
+    completion arrives), and only if it was not completed already, in which
+    case its rows are dropped and ``Batch.processed_docs`` is not
+    incremented again. If the worker dies before a flush, the documents keep
+    their previous status and are simply processed again. A flush that fails
+    is rolled back, and the documents it was completing are marked ``failed``.
+    A document that fails before completing must be ``discard()``-ed, or its
+    rows would wait in the buffer forever.
+    """
+
+    def __init__(self, session: AsyncSession, max_rows: Optional[int] = None, max_delay: Optional[float] = None):
+        self.session = session
+        self.max_rows = max_rows or settings.WRITE_BEHIND_MAX_ROWS
+        self.max_delay = settings.WRITE_BEHIND_MAX_DELAY if max_delay is None else max_delay
+        self.rows_written = 0
+        self.flushes = 0
+        self._rows: Dict[Tuple[Any, Optional[str]], List[Tuple[Optional[str], Dict[str, Any]]]] = defaultdict(list)
+        self._completions: Dict[str, Dict[str, Any]] = {}
+        self._pending = 0
+        self._oldest: Optional[float] = None
+
+    async def add(self, model, row: Dict[str, Any], owner: Optional[str] = None,
+                  on_conflict: Optional[str] = None):
+        """
+        Buffer one row for ``model``. Rows with an ``owner`` document are only
+        written together with that document's completion. ``on_conflict`` names a
+        unique constraint whose conflicts are skipped.
+        """
+        self._rows[(model, on_conflict)].append((owner, row))
+        await self._added()
+
+    async def complete(self, doc_id: str, batch_id: str, values: Optional[Dict[str, Any]] = None):
+        """Buffer a document's result columns together with its ``completed`` status."""
+        self._completions[str(doc_id)] = {"batch_id": batch_id, "values": values or {}}
+        await self._added()
+
+    def discard(self, owner: str):
+        """Drop everything buffered for ``owner``, a document that will never complete."""
+        owner = str(owner)
+        for key, entries in list(self._rows.items()):
+            kept = [(row_owner, row) for row_owner, row in entries if str(row_owner) != owner]
+            self._pending -= len(entries) - len(kept)
+            if kept:
+                self._rows[key] = kept
+            else:
+                del self._rows[key]
+        if self._completions.pop(owner, None) is not None:
+            self._pending -= 1
+        if not self._pending:
+            self._oldest = None
+
+    async def _added(self):
+        self._pending += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if self._pending >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay:
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, completions = self._rows, self._completions
+        self._rows, self._completions = defaultdict(list), {}
+        self._pending, self._oldest = 0, None
+        for key, entries in rows.items():
+            for owner, row in entries:
+                if owner is not None and str(owner) not in completions:
+                    # The owner completes in a later flush
+                    self._rows[key].append((owner, row))
+                    self._pending += 1
+        try:
+            await self._write(rows, completions)
+        except Exception:
+            # Nothing of this flush was written; leave the session usable for later flushes
+            await self.session.rollback()
+            await self._fail(completions)
+            raise
+        self.flushes += 1
+        if self._pending and self._oldest is None:
+            self._oldest = time.monotonic()
+
+    async def _fail(self, completions: Dict[str, Dict[str, Any]]):
+        """Mark the documents a failed flush was completing as failed."""
+        if not completions:
+            return
+        try:
+            await self.session.execute(
+                update(Document)
+                .where(Document.id.in_(list(completions)), Document.status != "completed")
+                .values(status="failed")
+            )
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            print(f"Could not mark documents {list(completions)} failed: {e}")
+
+    async def _write(self, rows, completions: Dict[str, Dict[str, Any]]):
+        completed = set()
+        if completions:
+            # Lock the documents so concurrent deliveries of the same document serialise here
+            result = await self.session.execute(
+                select(Document.id)
+                .where(Document.id.in_(list(completions)), Document.status != "completed")
+                .with_for_update()
+            )
+            completed = {str(doc_id) for doc_id in result.scalars()}
+
+        for (model, on_conflict), entries in rows.items():
+            values = []
+            for owner, row in entries:
+                if owner is None or str(owner) in completed:
+                    values.append(row)
+            if not values:
+                continue
+            stmt = pg_insert(model)
+            if on_conflict:
+                stmt = stmt.on_conflict_do_nothing(constraint=on_conflict)
+            await self.session.execute(stmt, values)
+            self.rows_written += len(values)
+
+        if completed:
+            await self.session.execute(
+                update(Document),
+                [
+                    {"id": uuid.UUID(doc_id), **completions[doc_id]["values"], "status": "completed"}
+                    for doc_id in completed
+                ]
+            )
+            per_batch = defaultdict(int)
+            for doc_id in completed:
+                per_batch[str(completions[doc_id]["batch_id"])] += 1
+            for batch_id, count in per_batch.items():
+                await self.session.execute(
+                    update(Batch)
+                    .where(Batch.id == batch_id)
+                    .values(processed_docs=func.coalesce(Batch.processed_docs, 0) + count)
+                )
+            self.rows_written += len(completed)
+
+        await self.session.commit()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Buffered work is only committed on success; on error it is discarded like any rollback
+        if exc_type is None:
+            await self.flush()
@@ -0,0 +1,101 @@
+"""
+Local chunk index: recall@k and latency against exact search.
+
+Builds a ChunkIndex in a temporary directory from a synthetic corpus of
+clustered unit vectors (documents are noisy copies of topic centres, which is
+how chunk embeddings of related submissions behave), compacts it, and compares
+its top-k per query chunk with the exact top-k from a brute-force matrix product
+for several nprobe values. No database is needed.
+
+Usage (from backend/):
+    python -m benchmarks.ann_recall --docs 5000 --chunks 20 --k 10
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from app.services.ann_index import ChunkIndex
+
+
+def make_corpus(n_docs: int, n_chunks: int, dim: int, n_topics: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    docs = []
+    for i in range(n_docs):
+        centre = topics[rng.integers(n_topics)]
+        vectors = centre + rng.standard_normal((n_chunks, dim)).astype(np.float32)
+        docs.append({
+            "document_id": uuid.uuid4(),
+            "batch_id": None,
+            "tenant_id": None,
+            "course": None,
+            "spans": [(j, j + 1) for j in range(n_chunks)],
+            "embeddings": vectors,
+        })
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks per document")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100, help="Query documents")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    docs = make_corpus(args.docs, args.chunks, args.dim, args.topics)
+    rng = np.random.default_rng(1)
+    query_docs = [docs[i] for i in rng.choice(len(docs), args.queries, replace=False)]
+    # Queries are paraphrase-like: perturbed copies of stored chunks
+    queries = [doc["embeddings"] + 0.3 * rng.standard_normal(doc["embeddings"].shape).astype(np.float32)
+               for doc in query_docs]
+
+    with tempfile.TemporaryDirectory() as path:
+        index = ChunkIndex(path)
+        start = time.perf_counter()
+        for i in range(0, len(docs), 100):
+            index.add(docs[i:i + 100])
+        added = time.perf_counter() - start
+        start = time.perf_counter()
+        index.compact()
+        compacted = time.perf_counter() - start
+        print(f"{len(index)} chunks: inserts {added:.1f}s, compaction {compacted:.1f}s")
+
+        # Exact neighbours from the same stored (normalized) vectors the index searches
+        corpus = np.concatenate([doc["embeddings"] for doc in docs])
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+        corpus_ids = np.repeat([doc["document_id"].hex.encode() for doc in docs], args.chunks)
+        corpus_chunks = np.tile(np.arange(args.chunks), len(docs))
+
+        exact, exact_ms = [], []
+        for q in queries:
+            q = q / np.linalg.norm(q, axis=1, keepdims=True)
+            start = time.perf_counter()
+            top = np.argpartition(-(q @ corpus.T), args.k - 1, axis=1)[:, :args.k]
+            exact_ms.append((time.perf_counter() - start) * 1000)
+            exact.append([{(corpus_ids[r], corpus_chunks[r]) for r in row} for row in top])
+        print(f"{'exact':<10} recall@{args.k} 1.000  p50 {statistics.median(exact_ms):7.2f} ms per document")
+
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            found, total, latencies = 0, 0, []
+            for q, truth in zip(queries, exact):
+                start = time.perf_counter()
+                _, meta = index.search(q, args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                for row, expected in zip(meta, truth):
+                    found += len({(m["doc"], m["chunk"]) for m in row} & expected)
+                    total += len(expected)
+            print(f"nprobe={nprobe:<3} recall@{args.k} {found / total:.3f}  "
+                  f"p50 {statistics.median(latencies):7.2f} ms per document")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Pipeline write throughput: per-document ORM commits vs the write-behind buffer.
+
+Each "document" writes one AIDetection row and its completed status, like
+process_document does. Needs a reachable Postgres (DATABASE_URL); everything
+the benchmark creates is deleted afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.db_write_throughput --docs 2000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models import AIDetection, Base, Batch, Document
+from app.services.write_behind import WriteBehindBuffer
+
+
+async def create_documents(session: AsyncSession, batch_id, n_docs: int):
+    docs = [Document(id=uuid.uuid4(), batch_id=batch_id, filename=f"doc-{i}.txt", status="queued")
+            for i in range(n_docs)]
+    session.add_all(docs)
+    await session.commit()
+    return [doc.id for doc in docs]
+
+
+def detection(doc_id):
+    return {
+        "id": uuid.uuid4(),
+        "document_id": doc_id,
+        "model_version": "benchmark",
+        "probability": 0.5,
+        "meta_data": {"provider": "local", "confidence": 0.5, "label": "human", "details": {}},
+    }
+
+
+async def per_document_commits(session: AsyncSession, batch_id, doc_ids):
+    """The original path: a status commit, then the result row and completion commit, per document."""
+    for doc_id in doc_ids:
+        doc = await session.get(Document, doc_id)
+        doc.status = "processing"
+        await session.commit()
+        doc.ai_score = 0.5
+        session.add(AIDetection(**detection(doc_id)))
+        doc.status = "completed"
+        await session.commit()
+
+
+async def write_behind(session: AsyncSession, batch_id, doc_ids):
+    async with WriteBehindBuffer(session) as writer:
+        for doc_id in doc_ids:
+            await writer.add(AIDetection, detection(doc_id), owner=str(doc_id))
+            await writer.complete(str(doc_id), str(batch_id), {"ai_score": 0.5})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    batch_ids = []
+    try:
+        for name, run in (("per-document commits", per_document_commits), ("write-behind", write_behind)):
+            async with Session() as session:
+                batch = Batch(id=uuid.uuid4(), total_docs=args.docs, processed_docs=0, status="processing")
+                session.add(batch)
+                await session.commit()
+                batch_ids.append(batch.id)
+                doc_ids = await create_documents(session, batch.id, args.docs)
+
+                start = time.perf_counter()
+                await run(session, batch.id, doc_ids)
+                elapsed = time.perf_counter() - start
+
+            rows = 2 * args.docs  # One result row and one status update per document
+            print(f"{name:<22} {rows} rows in {elapsed:7.2f}s  {rows / elapsed:9.1f} rows/s")
+    finally:
+        async with Session() as session:
+            doc_ids = select(Document.id).where(Document.batch_id.in_(batch_ids))
+            await session.execute(delete(AIDetection).where(AIDetection.document_id.in_(doc_ids)))
+            await session.execute(delete(Document).where(Document.batch_id.in_(batch_ids)))
+            await session.execute(delete(Batch).where(Batch.id.in_(batch_ids)))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
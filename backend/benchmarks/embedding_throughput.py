@@ -0,0 +1,83 @@
+"""
+Embedding throughput: per-chunk encode loop vs batched multi-document encoding.
+
+The embedding cache is switched off and the model warmed up on unrelated text
+before either variant is timed, so the batched figure measures batching, not
+cache hits.
+
+Usage (from backend/):
+    python -m benchmarks.embedding_throughput --docs 20 --chars 20000
+"""
+import argparse
+import random
+import time
+
+from app.core.config import settings
+from app.services.embedding import EmbeddingService
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at "
+    "which but have an they you were her she there been one all we their has would when "
+    "analysis method result study data model theory evidence research argument"
+).split()
+
+
+def make_corpus(n_docs: int, n_chars: int, seed: int = 0):
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n_docs):
+        words = []
+        length = 0
+        while length < n_chars:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        docs.append(" ".join(words))
+    return docs
+
+
+def per_chunk_loop(service: EmbeddingService, docs):
+    """The original path: one model.encode call per chunk."""
+    for text in docs:
+        [service.model.encode(chunk) for chunk in service.chunk_text(text)]
+
+
+def batched(service: EmbeddingService, docs, batch_size: int):
+    service.encode_documents(docs, batch_size=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--chars", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    # No cache tiers: neither the warm-up nor an earlier run may answer for the model
+    settings.EMBEDDING_CACHE_MEMORY_ENTRIES = 0
+    settings.EMBEDDING_CACHE_DIR = ""
+
+    service = EmbeddingService()
+    if not service.model:
+        raise SystemExit("sentence-transformers is not available")
+
+    docs = make_corpus(args.docs, args.chars)
+    n_chunks = sum(len(service.chunk_text(text)) for text in docs)
+    service.model.encode(service.chunk_text(make_corpus(1, 4000, seed=1)[0]), batch_size=args.batch_size)  # Warm up
+
+    for name, run in (
+        ("per-chunk loop", lambda: per_chunk_loop(service, docs)),
+        (f"batched (batch_size={args.batch_size})", lambda: batched(service, docs, args.batch_size)),
+    ):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28} {n_chunks} chunks in {elapsed:7.2f}s  {n_chunks / elapsed:9.1f} chunks/s")
+
+    from app.services.embedding_cache import get_embedding_cache
+    stats = get_embedding_cache(service.model_name, service.model.get_sentence_embedding_dimension()).stats()
+    print(f"cache hits during the run: {stats['memory_hits'] + stats['disk_hits']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Winnowing fingerprints: detection of planted verbatim passages and index density.
+
+Generates random source documents and, for each, a query document that embeds
+one passage copied from the source, with its whitespace and case changed. For
+several passage lengths (raw characters, spaces included, so somewhat fewer
+normalised ones) it reports the share of copies reported as a span
+(the same chaining as ``FingerprintIndex``, with postings kept in memory), the
+mean overlap of the reported span with the planted one, and the fingerprints
+stored per 1000 characters. No database is needed.
+
+Usage (from backend/):
+    python -m benchmarks.winnow_spans --docs 200
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from app.services.fingerprint import FingerprintIndex, Winnower
+
+
+def make_text(rng: random.Random, n_words: int) -> str:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return " ".join("".join(rng.choice(letters) for _ in range(rng.randint(2, 9))) for _ in range(n_words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=200, help="Source/query document pairs per passage length")
+    parser.add_argument("--words", type=int, default=1000, help="Words per document")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[30, 50, 80, 150, 400],
+                        help="Copied passage lengths in characters")
+    parser.add_argument("--k", type=int, default=None)
+    parser.add_argument("--window", type=int, default=None)
+    parser.add_argument("--min-fingerprints", type=int, default=None, help="Fingerprints a reported span needs")
+    args = parser.parse_args()
+
+    winnower = Winnower(k=args.k, window=args.window)
+    index = FingerprintIndex(session=None, winnower=winnower, min_fingerprints=args.min_fingerprints)
+    rng = random.Random(0)
+    print(f"k={winnower.k} window={winnower.window}: "
+          f"copies of {winnower.k + winnower.window - 1}+ normalised characters are guaranteed to match")
+
+    for length in args.lengths:
+        found, overlap, stored, chars, elapsed = 0, 0.0, 0, 0, 0.0
+        for _ in range(args.docs):
+            source = make_text(rng, args.words)
+            start = rng.randrange(len(source) - length)
+            passage = source[start:start + length]
+            prefix, suffix = make_text(rng, args.words // 2), make_text(rng, args.words // 2)
+            query = f"{prefix} {passage.upper().replace(' ', '  ')} {suffix}"
+            planted = (len(prefix) + 1, len(prefix) + 1 + len(passage.replace(" ", "  ")))
+
+            began = time.perf_counter()
+            rows = [SimpleNamespace(**row) for row in winnower.rows("source", source)]
+            hashes, starts, ends = winnower.fingerprints(query)
+            elapsed += time.perf_counter() - began
+            stored += len(rows)
+            chars += len(source)
+
+            positions = {}
+            for i, h in enumerate(hashes.tolist()):
+                positions.setdefault(h, []).append(i)
+            matched = [(i, row) for row in rows for i in positions.get(row.hash, ())]
+            runs = index._runs(matched, starts, ends)
+            if runs:
+                found += 1
+                best = max(min(q_end, planted[1]) - max(q_start, planted[0]) for q_start, q_end, *_ in runs)
+                overlap += max(best, 0) / (planted[1] - planted[0])
+        print(f"{length:>4} chars  found {found / args.docs:6.1%}  span overlap {overlap / max(found, 1):6.1%}  "
+              f"{stored * 1000 / chars:5.1f} fingerprints/1000 chars  "
+              f"{elapsed * 1000 / args.docs:.2f} ms per pair")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Baseline: the schema create_all built before migrations were kept
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Nothing to do: users, batches, documents, comparisons etc. come from create_all."""
+    pass
+
+
+def downgrade() -> None:
+    pass
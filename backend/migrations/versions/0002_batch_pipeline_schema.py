@@ -0,0 +1,168 @@
+"""Batch pipeline schema: blobs, extraction cache, chunk embeddings, MinHash, fingerprints
+
+Adds what the models gained since the baseline. create_all creates missing
+tables on startup but never alters existing ones, so the new columns and
+indexes of batches, documents and embeddings, and the comparisons
+uniqueness that compare_tile's ON CONFLICT relies on, only arrive through
+here. Every statement is idempotent, so this also runs cleanly on a
+database whose new tables create_all has already made.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS vector",
+
+    # batches
+    "ALTER TABLE batches ADD COLUMN IF NOT EXISTS course VARCHAR",
+    "ALTER TABLE batches ADD COLUMN IF NOT EXISTS metrics JSONB",
+    "CREATE INDEX IF NOT EXISTS ix_batches_course ON batches (course)",
+
+    # documents
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS text_hash VARCHAR",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS duplicate_of UUID REFERENCES documents (id)",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunk_count INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_text_hash ON documents (text_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_storage_path ON documents (storage_path)",
+
+    # comparisons: keep one row per ordered pair, then enforce it
+    """
+    DELETE FROM comparisons a USING comparisons b
+    WHERE a.doc_a = b.doc_a AND a.doc_b = b.doc_b AND a.ctid < b.ctid
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_comparison_pair') THEN
+            ALTER TABLE comparisons ADD CONSTRAINT uq_comparison_pair UNIQUE (doc_a, doc_b);
+        END IF;
+    END $$
+    """,
+
+    # embeddings: one row per chunk, with the corpus search columns and indexes
+    """
+    CREATE TABLE IF NOT EXISTS embeddings (
+        id UUID NOT NULL PRIMARY KEY,
+        file_id UUID NOT NULL REFERENCES documents (id),
+        vector VECTOR(384) NOT NULL,
+        type VARCHAR NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS chunk_index INTEGER",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS span_start INTEGER",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS span_end INTEGER",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS batch_id UUID",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS tenant_id UUID",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS course VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_file_id ON embeddings (file_id)",
+    """
+    CREATE INDEX IF NOT EXISTS ix_embeddings_vector_hnsw ON embeddings
+    USING hnsw (vector vector_cosine_ops) WITH (m = 16, ef_construction = 64)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_scope ON embeddings (tenant_id, course)",
+
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        content_hash VARCHAR NOT NULL PRIMARY KEY,
+        storage_key VARCHAR NOT NULL,
+        size BIGINT,
+        ref_count INTEGER NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        unreferenced_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_blobs_unreferenced_at ON blobs (unreferenced_at)",
+
+    """
+    CREATE TABLE IF NOT EXISTS extracted_texts (
+        id UUID NOT NULL PRIMARY KEY,
+        content_hash VARCHAR NOT NULL,
+        file_type VARCHAR NOT NULL,
+        parser_version VARCHAR NOT NULL,
+        ocr_settings VARCHAR NOT NULL,
+        text_content TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        CONSTRAINT uq_extracted_text_key UNIQUE (content_hash, file_type, parser_version, ocr_settings)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_extracted_texts_content_hash ON extracted_texts (content_hash)",
+
+    """
+    CREATE TABLE IF NOT EXISTS fingerprints (
+        hash BIGINT NOT NULL,
+        document_id UUID NOT NULL REFERENCES documents (id),
+        position INTEGER NOT NULL,
+        start INTEGER NOT NULL,
+        "end" INTEGER NOT NULL,
+        PRIMARY KEY (hash, document_id, position)
+    )
+    """,
+
+    """
+    CREATE TABLE IF NOT EXISTS minhash_signatures (
+        document_id UUID NOT NULL PRIMARY KEY REFERENCES documents (id),
+        num_perm INTEGER NOT NULL,
+        signature BYTEA NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS minhash_bands (
+        band SMALLINT NOT NULL,
+        bucket BIGINT NOT NULL,
+        document_id UUID NOT NULL REFERENCES documents (id),
+        PRIMARY KEY (band, bucket, document_id)
+    )
+    """,
+]
+
+DOWNGRADE = [
+    "DROP TABLE IF EXISTS minhash_bands",
+    "DROP TABLE IF EXISTS minhash_signatures",
+    "DROP TABLE IF EXISTS fingerprints",
+    "DROP TABLE IF EXISTS extracted_texts",
+    "DROP TABLE IF EXISTS blobs",
+    "DROP INDEX IF EXISTS ix_embeddings_scope",
+    "DROP INDEX IF EXISTS ix_embeddings_vector_hnsw",
+    "DROP INDEX IF EXISTS ix_embeddings_file_id",
+    """
+    ALTER TABLE embeddings
+        DROP COLUMN IF EXISTS chunk_index, DROP COLUMN IF EXISTS span_start, DROP COLUMN IF EXISTS span_end,
+        DROP COLUMN IF EXISTS batch_id, DROP COLUMN IF EXISTS tenant_id, DROP COLUMN IF EXISTS course
+    """,
+    "ALTER TABLE comparisons DROP CONSTRAINT IF EXISTS uq_comparison_pair",
+    "DROP INDEX IF EXISTS ix_documents_storage_path",
+    "DROP INDEX IF EXISTS ix_documents_text_hash",
+    "DROP INDEX IF EXISTS ix_documents_content_hash",
+    """
+    ALTER TABLE documents
+        DROP COLUMN IF EXISTS chunk_count, DROP COLUMN IF EXISTS duplicate_of, DROP COLUMN IF EXISTS text_hash
+    """,
+    "DROP INDEX IF EXISTS ix_batches_course",
+    "ALTER TABLE batches DROP COLUMN IF EXISTS metrics, DROP COLUMN IF EXISTS course",
+]
+
+
+def upgrade() -> None:
+    for statement in UPGRADE:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for statement in DOWNGRADE:
+        op.execute(statement)
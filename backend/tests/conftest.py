@@ -0,0 +1,23 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.core.config import settings
+from app.services import storage
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """An in-process S3 stand-in (moto) behind the process-wide client, with no bucket created yet."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "STORAGE_TYPE", "s3")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", None)
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY", None)
+    monkeypatch.setattr(settings, "S3_SECRET_KEY", None)
+    monkeypatch.setattr(settings, "S3_BUCKET_NAME", "plagiarism-uploads-test")
+    with mock_aws():
+        monkeypatch.setattr(storage, "_s3_client", None)
+        monkeypatch.setattr(storage, "_storage", None)
+        yield boto3.client("s3", region_name="us-east-1")
@@ -0,0 +1,96 @@
+import uuid
+
+import numpy as np
+
+from app.services.ann_index import ChunkIndex, _hex, _normalize
+
+_DIM = 32
+
+
+def _documents(n_docs, chunks=20, seed=0, topics=16, **fields):
+    """Documents whose chunk embeddings scatter around a few topic directions, like real text."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, _DIM))
+    return [
+        {
+            "document_id": uuid.uuid4(),
+            "spans": [(10 * c, 10 * c + 9) for c in range(chunks)],
+            "embeddings": (centers[rng.integers(0, topics, chunks)]
+                           + 0.4 * rng.standard_normal((chunks, _DIM))).astype(np.float32),
+            **fields,
+        }
+        for _ in range(n_docs)
+    ]
+
+
+def _exact_top(documents, queries, k):
+    matrix = _normalize(np.concatenate([doc["embeddings"] for doc in documents]))
+    scores = _normalize(queries) @ matrix.T
+    return -np.sort(-scores, axis=1)[:, :k]
+
+
+def test_delta_segments_are_searched_exactly(tmp_path):
+    index = ChunkIndex(str(tmp_path), nprobe=1, nlist=4)
+    documents = _documents(10)
+    assert index.add(documents[:5]) + index.add(documents[5:]) == 200
+    queries = np.random.default_rng(1).standard_normal((8, _DIM))
+    scores, meta = index.search(queries, k=5)
+    assert np.allclose(scores, _exact_top(documents, queries, 5), atol=1e-5)
+    assert meta.shape == (8, 5) and len(index) == 200
+
+
+def test_compacted_index_recall(tmp_path):
+    index = ChunkIndex(str(tmp_path), nprobe=4, nlist=16)
+    documents = _documents(100)
+    index.add(documents)
+    assert index.compact()
+    # Queries near stored chunks, as in copy detection
+    rng = np.random.default_rng(2)
+    stored = np.concatenate([doc["embeddings"] for doc in documents])
+    queries = stored[rng.choice(len(stored), 50, replace=False)] + 0.1 * rng.standard_normal((50, _DIM))
+    scores, _ = index.search(queries, k=10)
+    exact = _exact_top(documents, queries, 10)
+    recall = np.mean([len(np.intersect1d(a, b)) / 10 for a, b in zip(np.round(scores, 5), np.round(exact, 5))])
+    assert recall >= 0.9
+    # The nearest chunk itself is always found
+    assert np.allclose(scores[:, 0], exact[:, 0], atol=1e-5)
+
+
+def test_tombstoned_documents_vanish_before_and_after_compaction(tmp_path):
+    index = ChunkIndex(str(tmp_path), nprobe=8, nlist=8)
+    documents = _documents(6, chunks=5)
+    index.add(documents)
+    deleted = documents[0]
+    index.delete_documents([deleted["document_id"]])
+    assert len(index) == 25
+
+    def hits():
+        _, meta = index.search(deleted["embeddings"], k=30)
+        return set(meta["doc"].ravel()) - {b""}
+
+    assert _hex(deleted["document_id"]) not in hits()
+    assert index.compact()
+    assert _hex(deleted["document_id"]) not in hits() and len(index) == 25
+    assert index._read_manifest()["tombstones"] == []
+
+
+def test_filters_and_missing_neighbours(tmp_path):
+    index = ChunkIndex(str(tmp_path))
+    tenant, other = uuid.uuid4(), uuid.uuid4()
+    mine = _documents(2, chunks=3, tenant_id=tenant, course="CS101")
+    index.add(mine + _documents(2, chunks=3, seed=1, tenant_id=other, course="CS101"))
+    scores, meta = index.search(mine[0]["embeddings"][:1], k=10, tenant_id=tenant,
+                                exclude_document_id=mine[0]["document_id"])
+    assert set(meta["doc"][0][:3]) == {_hex(mine[1]["document_id"])}
+    # Only three chunks pass the filters; the rest of the row is empty
+    assert np.isneginf(scores[0][3:]).all()
+    assert np.isneginf(index.search(mine[0]["embeddings"][:1], k=2, course="unknown")[0]).all()
+
+
+def test_a_second_reader_sees_writes_and_compactions(tmp_path):
+    writer, reader = ChunkIndex(str(tmp_path)), ChunkIndex(str(tmp_path))
+    assert len(reader) == 0
+    writer.add(_documents(3, chunks=4))
+    assert len(reader) == 12
+    writer.compact()
+    assert len(reader) == 12
@@ -0,0 +1,85 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from app.services.archive_extractor import ArchiveExtractor, ArchiveLimitError, _ExpansionBudget
+from app.services.ingestion import _ARCHIVE_ERRORS, _unique_member_name
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _tar(members, mode="w:gz"):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo("link.txt")
+        link.type, link.linkname = tarfile.SYMTYPE, "/etc/passwd"
+        archive.addfile(link)
+    buffer.seek(0)
+    return buffer
+
+
+def _members(fileobj, **limits):
+    size = len(fileobj.getbuffer())
+    return list(ArchiveExtractor.iter_members(fileobj, size, **limits))
+
+
+MEMBERS = {"essays/a.txt": b"first essay", "b.PDF": b"%PDF-1.4", "notes.exe": b"MZ"}
+
+
+@pytest.mark.parametrize("build", [_zip, _tar])
+def test_streams_allowed_regular_files_only(build):
+    members = _members(build(MEMBERS), allowed_extensions=[".txt", ".pdf"])
+    assert members == [("essays/a.txt", b"first essay"), ("b.PDF", b"%PDF-1.4")]
+
+
+@pytest.mark.parametrize("build", [_zip, _tar])
+def test_member_count_limit(build):
+    with pytest.raises(ArchiveLimitError):
+        _members(build({f"{i}.txt": b"x" for i in range(5)}), max_members=4)
+
+
+@pytest.mark.parametrize("build", [_zip, _tar])
+def test_member_size_limit(build):
+    with pytest.raises(ArchiveLimitError):
+        _members(build({"big.txt": b"x" * 2000}), max_member_bytes=1000, max_ratio=1e9)
+
+
+def test_compression_ratio_limit_stops_a_bomb():
+    bomb = _zip({"zeros.txt": b"\0" * 10_000_000})
+    with pytest.raises(ArchiveLimitError, match="ratio"):
+        _members(bomb, max_ratio=100)
+
+
+def test_actual_size_is_counted_not_the_declared_one():
+    budget = _ExpansionBudget(archive_size=100, max_member_bytes=1000, max_total_bytes=10_000,
+                              max_ratio=1e9, max_members=10)
+    budget.admit("a.txt", declared_size=10)
+    with pytest.raises(ArchiveLimitError):
+        budget.read("a.txt", io.BytesIO(b"y" * 5000))
+
+
+@pytest.mark.parametrize("payload", [b"PK\x03\x04 truncated", b"not an archive at all", _zip(MEMBERS).getvalue()[:60]])
+def test_corrupt_archives_raise_errors_ingestion_handles(payload):
+    with pytest.raises(_ARCHIVE_ERRORS):
+        _members(io.BytesIO(payload))
+
+
+def test_unique_member_names_are_safe_and_distinct():
+    used = set()
+    names = [_unique_member_name(name, used) for name in
+             ["a/essay.txt", "../a/essay.txt", "/a/essay.txt", "a\\essay.txt", "..", "x.tar.gz", "x.tar.gz"]]
+    assert names == ["a/essay.txt", "a/essay (2).txt", "a/essay (3).txt", "a/essay (4).txt",
+                     "member", "x.tar.gz", "x.tar (2).gz"]
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+
+from app.services.chunking import TokenWindowChunker, chunker_for
+
+TEXT = (
+    "The  quick brown fox, having jumped over the lazy dog, ran on.\n\n"
+    "Café owners in Zürich — naïvely — served crème brûlée at 10:30!  "
+) * 12
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    """A whitespace/punctuation word tokenizer; every word is [UNK] but offsets are exact."""
+    model = Tokenizer(models.WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    model.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=model, unk_token="[UNK]")
+
+
+def _token_offsets(tokenizer, text):
+    return tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+
+
+def test_token_windows_slice_the_original_text(tokenizer):
+    chunker = TokenWindowChunker(tokenizer, max_tokens=16, stride=4)
+    offsets = _token_offsets(tokenizer, TEXT)
+    spans = chunker.spans(TEXT)
+    assert spans[0][0] == offsets[0][0] and spans[-1][1] == offsets[-1][1]
+    for (start, end), chunk in zip(spans, chunker.chunks(TEXT)):
+        assert chunk == TEXT[start:end]
+        # A window re-tokenizes to exactly the tokens it was cut from
+        tokens = [(s + start, e + start) for s, e in _token_offsets(tokenizer, chunk)]
+        assert 0 < len(tokens) <= 16
+        assert all(token in offsets for token in tokens)
+
+
+def test_token_windows_cover_every_token_with_the_stride_overlap(tokenizer):
+    chunker = TokenWindowChunker(tokenizer, max_tokens=16, stride=4)
+    offsets = _token_offsets(tokenizer, TEXT)
+    spans = chunker.spans(TEXT)
+    assert all(any(start <= s and e <= end for start, end in spans) for s, e in offsets)
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        shared = [token for token in offsets if start <= token[0] and token[1] <= end]
+        assert len(shared) == 4
+
+
+def test_falls_back_to_character_windows_without_a_fast_tokenizer():
+    slow = SimpleNamespace(is_fast=False)
+    for tokenizer in (None, slow):
+        chunker = TokenWindowChunker(tokenizer, fallback_chars=100, fallback_overlap=20)
+        spans = chunker.spans(TEXT)
+        assert spans[0] == (0, 100) and spans[-1][1] == len(TEXT)
+        assert all(b_start == a_end - 20 for (_, a_end), (b_start, _) in zip(spans, spans[1:]))
+        assert "".join(TEXT[start:end][20 if i else 0:] for i, (start, end) in enumerate(spans)) == TEXT
+
+
+def test_empty_text_has_no_windows(tokenizer):
+    assert TokenWindowChunker(tokenizer).spans("") == []
+    assert TokenWindowChunker(None).spans("") == []
+
+
+def test_chunker_for_leaves_room_for_special_tokens_and_caps_sentinels():
+    fast = SimpleNamespace(is_fast=True, model_max_length=int(1e30), num_special_tokens_to_add=lambda: 2)
+    assert chunker_for(fast, None, stride=32).window == 4094
+    assert chunker_for(fast, 128, stride=500).stride == 125
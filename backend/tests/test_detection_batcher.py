@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.detection_batcher import DetectionBatcher, DetectionOverloaded
+
+
+class FakeDetector:
+    """Stands in for AIDetectionService: records batch sizes, external calls take ``delay`` seconds."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def detect_many(self, texts, provider, threshold):
+        self.batches.append(len(texts))
+        return [{"text": text, "provider": provider} for text in texts]
+
+    def detect(self, text, provider, threshold):
+        self.calls += 1
+        self.release.wait()
+        time.sleep(self.delay)
+        return {"text": text, "provider": provider}
+
+
+def test_local_requests_are_coalesced_and_deduplicated():
+    detector = FakeDetector()
+
+    async def run():
+        batcher = DetectionBatcher(detector, workers=1, queue_size=64, max_batch=16, batch_wait=0.05, deadline=5)
+        texts = [f"text {i}" for i in range(10)] + ["text 0"]
+        return await asyncio.gather(*(batcher.detect(text) for text in texts))
+
+    results = asyncio.run(run())
+    assert [result["text"] for result in results] == [f"text {i}" for i in range(10)] + ["text 0"]
+    assert sum(detector.batches) == 10 and len(detector.batches) < 10
+
+
+def test_external_requests_run_concurrently():
+    detector = FakeDetector(delay=0.2)
+
+    async def run():
+        batcher = DetectionBatcher(detector, workers=1, queue_size=64, deadline=5, external_workers=8)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(batcher.detect(f"text {i}", "openai") for i in range(8)))
+        return results, time.perf_counter() - start
+
+    results, seconds = asyncio.run(run())
+    assert [result["text"] for result in results] == [f"text {i}" for i in range(8)]
+    assert detector.batches == [] and seconds < 0.2 * 4
+
+
+def test_external_requests_are_bounded_by_the_queue_size():
+    detector = FakeDetector()
+    detector.release.clear()
+
+    async def run():
+        batcher = DetectionBatcher(detector, workers=1, queue_size=2, deadline=5, external_workers=1)
+        admitted = [asyncio.ensure_future(batcher.detect(f"text {i}", "openai")) for i in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(DetectionOverloaded) as overloaded:
+            await batcher.detect("one too many", "openai")
+        assert overloaded.value.retry_after >= 1
+        detector.release.set()
+        return await asyncio.gather(*admitted)
+
+    assert len(asyncio.run(run())) == 2
+
+
+def test_late_joiner_gets_its_own_deadline():
+    detector = FakeDetector(delay=0.5)
+
+    async def run():
+        batcher = DetectionBatcher(detector, workers=1, queue_size=8, deadline=0.4, external_workers=1)
+        first = asyncio.ensure_future(batcher.detect("shared", "openai"))
+        await asyncio.sleep(0.2)
+        # Joins the in-flight job with 0.2s left on the first request's deadline, the call needs 0.3s more
+        second = await batcher.detect("shared", "openai")
+        with pytest.raises(DetectionOverloaded):
+            await first
+        return second
+
+    assert asyncio.run(run())["text"] == "shared"
+    assert detector.calls == 1
+
+
+def test_missed_deadline_is_overloaded():
+    detector = FakeDetector(delay=0.3)
+
+    async def run():
+        batcher = DetectionBatcher(detector, workers=1, queue_size=8, deadline=0.1, external_workers=1)
+        await batcher.detect("slow", "openai")
+
+    with pytest.raises(DetectionOverloaded):
+        asyncio.run(run())
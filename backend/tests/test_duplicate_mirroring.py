@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from sqlalchemy.sql import Insert, Select
+
+from app.services.batch_processing import _duplicate_groups, _mirror_duplicates
+
+
+class FakeSession:
+    """Answers the two selects of _mirror_duplicates in order and records the comparisons inserted."""
+
+    def __init__(self, batch, documents, comparisons):
+        self.batch = batch
+        self.results = [documents, comparisons]
+        self.inserted = []
+
+    async def get(self, model, ident):
+        return self.batch
+
+    async def execute(self, stmt, params=None):
+        if isinstance(stmt, Select):
+            return _Result(self.results.pop(0))
+        if isinstance(stmt, Insert):
+            self.inserted.extend(params)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+def _doc(doc_id, duplicate_of=None):
+    return SimpleNamespace(id=doc_id, duplicate_of=duplicate_of)
+
+
+def test_original_in_the_batch_represents_its_duplicates():
+    original, copy, other = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    groups = _duplicate_groups([_doc(copy, original), _doc(original), _doc(other)])
+    assert groups == {original: [copy, original], other: [other]}
+
+
+def test_lowest_id_represents_duplicates_of_an_earlier_upload():
+    earlier = uuid.uuid4()
+    copies = sorted(uuid.uuid4() for _ in range(3))
+    groups = _duplicate_groups([_doc(copy, earlier) for copy in reversed(copies)])
+    assert list(groups) == [copies[0]]
+
+
+def test_duplicates_get_the_comparisons_of_their_representative():
+    original, copy, other = sorted(uuid.uuid4() for _ in range(3))
+    batch = SimpleNamespace(status="processing", analysis_type="plagiarism", metrics={})
+    session = FakeSession(
+        batch,
+        documents=[_doc(original), _doc(copy, original), _doc(other)],
+        comparisons=[(original, other, 0.4, ["m"]), (other, original, 0.4, ["m"])],
+    )
+    written = asyncio.run(_mirror_duplicates(session, "batch"))
+
+    pairs = {(row["doc_a"], row["doc_b"]): row["similarity"] for row in session.inserted}
+    assert pairs == {
+        (copy, other): 0.4, (other, copy): 0.4,
+        (original, copy): 1.0, (copy, original): 1.0,
+    }
+    assert written == 4 and batch.metrics["duplicates"]["mirrored_comparisons"] == 4
+
+
+def test_finished_batches_are_not_mirrored_again():
+    batch = SimpleNamespace(status="completed", analysis_type="plagiarism", metrics={})
+    session = FakeSession(batch, documents=[], comparisons=[])
+    assert asyncio.run(_mirror_duplicates(session, "batch")) == 0
+    assert not session.inserted
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from app.services.embedding_cache import DiskEmbeddingStore, EmbeddingCache, MemoryLRU
+
+
+def test_lru_holds_copies_not_views_of_the_batch():
+    cache = EmbeddingCache("model", dim=4, memory_entries=10, disk_path=None)
+    batch = np.random.default_rng(0).random((100, 4), dtype=np.float32)
+    cache.put_many([f"h{i}" for i in range(100)], batch)
+    cached = cache.get_many(["h99"])[0]
+    assert np.array_equal(cached, batch[99])
+    assert cached.base is None and not np.shares_memory(cached, batch)
+
+
+def test_lru_evicts_least_recently_used():
+    lru = MemoryLRU(2)
+    for key in ("a", "b"):
+        lru.put(key, np.zeros(2, dtype=np.float32))
+    lru.get("a")
+    lru.put("c", np.zeros(2, dtype=np.float32))
+    assert lru.get("b") is None and lru.get("a") is not None and lru.evictions == 1
+
+
+def test_disk_tier_round_trip_and_promotion(tmp_path):
+    cache = EmbeddingCache("model", dim=3, memory_entries=0, disk_path=str(tmp_path), disk_entries=8)
+    vectors = np.arange(12, dtype=np.float32).reshape(4, 3)
+    cache.put_many(["a", "b", "c", "d"], vectors)
+    found = cache.get_many(["a", "d", "x"])
+    assert np.array_equal(found[0], vectors[0]) and np.array_equal(found[1], vectors[3]) and found[2] is None
+    assert (cache.disk_hits, cache.misses) == (2, 1)
+
+
+def test_disk_rows_stay_aligned_after_a_torn_append(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), dim=2, max_entries=100)
+    store.put_many(["a", "b"], np.array([[1, 1], [2, 2]], dtype=np.float32))
+    # A crash between appending vectors and recording them leaves extra bytes behind
+    with open(store._vector_file(0), "ab") as f:
+        f.write(np.array([[9, 9]], dtype=np.float32).tobytes()[:6])
+    store.put_many(["c"], np.array([[3, 3]], dtype=np.float32))
+    assert os.path.getsize(store._vector_file(0)) == 3 * 2 * 4
+    found = store.get_many(["a", "b", "c"])
+    assert [found[key][0].tolist() for key in "abc"] == [[1, 1], [2, 2], [3, 3]]
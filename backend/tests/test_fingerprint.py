@@ -0,0 +1,98 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.fingerprint import FingerprintIndex, Winnower
+
+
+def _text(rng: random.Random, n_words: int) -> str:
+    return " ".join("".join(rng.choice("abcdefghij") for _ in range(rng.randint(2, 9))) for _ in range(n_words))
+
+
+def _runs(index: FingerprintIndex, source: str, query: str):
+    """Chain the query's fingerprints against the source's, with postings kept in memory."""
+    rows = [SimpleNamespace(**row) for row in index.winnower.rows("source", source)]
+    hashes, starts, ends = index.winnower.fingerprints(query)
+    positions = {}
+    for i, h in enumerate(hashes.tolist()):
+        positions.setdefault(h, []).append(i)
+    return index._runs([(i, row) for row in rows for i in positions.get(row.hash, ())], starts, ends)
+
+
+def test_fingerprints_ignore_case_whitespace_and_punctuation():
+    winnower = Winnower(k=5, window=4)
+    plain = winnower.fingerprints("the quick brown fox jumps over the lazy dog")[0]
+    noisy = winnower.fingerprints("The QUICK, brown   fox -- jumps over the Lazy dog!")[0]
+    assert len(plain) and np.array_equal(plain, noisy)
+
+
+def test_fingerprint_offsets_point_into_the_original_text():
+    winnower = Winnower(k=5, window=4)
+    text = "Hello,   World! Hello again, world."
+    hashes, starts, ends = winnower.fingerprints(text)
+    for start, end in zip(starts, ends):
+        span = "".join(ch for ch in text[start:end] if ch.isalnum())
+        assert len(span) == winnower.k and text[start].isalnum() and text[end - 1].isalnum()
+
+
+def test_characters_lowering_to_several_code_points():
+    # "İ".lower() is "i" plus a combining dot above
+    winnower = Winnower(k=5, window=4)
+    text = "İstanbul İs a CİTY on the Bosporus"
+    hashes, starts, ends = winnower.fingerprints(text)
+    assert len(hashes) and ends.max() <= len(text)
+    assert np.array_equal(hashes, winnower.fingerprints(text.replace("İ", "I"))[0])
+
+
+def test_short_texts_have_no_fingerprints():
+    winnower = Winnower(k=25, window=20)
+    assert len(winnower.fingerprints("too short")[0]) == 0
+    assert len(winnower.fingerprints(None)[0]) == 0
+    assert len(winnower.fingerprints("x" * 30)[0]) == 1
+
+
+def test_guaranteed_copies_are_reported():
+    rng = random.Random(1)
+    index = FingerprintIndex(session=None, winnower=Winnower(k=25, window=20), min_fingerprints=1)
+    guarantee = index.winnower.k + index.winnower.window - 1
+    for _ in range(50):
+        source = _text(rng, 300)
+        start = rng.randrange(len(source) - 200)
+        passage = source[start:start + 200]
+        # Trim the passage to exactly the guaranteed number of normalised characters
+        kept, end = 0, 0
+        while kept < guarantee:
+            kept += passage[end].isalnum()
+            end += 1
+        query = f"{_text(rng, 100)} {passage[:end].upper()} {_text(rng, 100)}"
+        runs = _runs(index, source, query)
+        assert runs
+        q_start, q_end, s_start, s_end = runs[0]
+        assert query[q_start:q_end].lower() == source[s_start:s_end]
+
+
+def test_runs_chain_a_long_copy_into_one_span():
+    rng = random.Random(2)
+    index = FingerprintIndex(session=None, winnower=Winnower(k=10, window=5), min_fingerprints=2)
+    source = _text(rng, 400)
+    passage = source[500:1500]
+    prefix = _text(rng, 50)
+    query = f"{prefix} {passage} {_text(rng, 50)}"
+    runs = _runs(index, source, query)
+    assert len(runs) == 1
+    q_start, q_end, s_start, s_end = runs[0]
+    assert query[q_start:q_end] == source[s_start:s_end]
+    assert q_end - q_start > 0.9 * len(passage)
+    assert _runs(index, source, _text(rng, 300)) == []
+
+
+def test_find_copies_without_text():
+    class Session:
+        async def get(self, model, key):
+            return SimpleNamespace(id=key, text_content="") if key == "empty" else None
+
+    index = FingerprintIndex(Session())
+    assert asyncio.run(index.find_copies("missing")) == []
+    assert asyncio.run(index.find_copies("empty")) == []
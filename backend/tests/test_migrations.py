@@ -0,0 +1,66 @@
+import importlib.util
+import re
+from pathlib import Path
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from app import models
+from app.models.comparison import Comparison
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# Columns of the tables create_all had built before migrations were kept (revision 0001)
+BASELINE = {
+    "users": {"id", "email", "hashed_password", "role", "is_active", "created_at", "updated_at"},
+    "batches": {"id", "user_id", "name", "total_docs", "processed_docs", "status", "analysis_type", "ai_provider",
+                "ai_threshold", "created_at"},
+    "documents": {"id", "batch_id", "filename", "content_hash", "mime_type", "text_content", "embedding",
+                  "storage_path", "uploaded_by", "status", "ai_score", "is_ai_generated", "ai_confidence",
+                  "ai_provider", "created_at", "updated_at"},
+    "ai_detection": {"id", "document_id", "model_version", "probability", "meta_data", "created_at"},
+    "comparisons": {"id", "doc_a", "doc_b", "similarity", "matches", "created_at"},
+}
+
+
+def _upgrade_sql() -> str:
+    path = BACKEND / "migrations" / "versions" / "0002_batch_pipeline_schema.py"
+    spec = importlib.util.spec_from_file_location("migration_0002", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return "\n".join(module.UPGRADE)
+
+
+def test_migrations_have_one_head():
+    config = Config(str(BACKEND / "alembic.ini"))
+    assert ScriptDirectory.from_config(config).get_heads() == ["0002"]
+
+
+def test_every_model_column_exists_after_upgrade():
+    sql = _upgrade_sql()
+    tables = list(models.Base.metadata.sorted_tables) + [Comparison.__table__]
+    for table in tables:
+        columns = {column.name for column in table.columns}
+        if table.name in BASELINE:
+            for column in columns - BASELINE[table.name]:
+                assert f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column} " in sql, (table.name, column)
+            continue
+        created = re.search(rf"CREATE TABLE IF NOT EXISTS {table.name} \((.*?)\n    \)", sql, re.S)
+        assert created, table.name
+        body = created.group(1)
+        added = set(re.findall(rf"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS (\w+)", sql))
+        for column in columns - added:
+            assert re.search(rf'^\s+"?{column}"? ', body, re.M), (table.name, column)
+
+
+def test_named_constraints_and_indexes_are_created():
+    sql = _upgrade_sql()
+    tables = list(models.Base.metadata.sorted_tables) + [Comparison.__table__]
+    for table in tables:
+        for constraint in table.constraints:
+            if constraint.name and constraint.name.startswith("uq_"):
+                assert constraint.name in sql, constraint.name
+        if table.name in BASELINE and table.name not in ("batches", "documents"):
+            continue
+        for index in table.indexes:
+            assert f"CREATE INDEX IF NOT EXISTS {index.name} " in sql, index.name
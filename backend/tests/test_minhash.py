@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.batch_processing import _candidate_pairs
+from app.services.minhash import MinHasher, semantic_pairs
+
+_rng = np.random.default_rng(7)
+_VOCAB = [f"word{i}" for i in range(5000)]
+
+
+def _essay(words=400):
+    return " ".join(_rng.choice(_VOCAB, words))
+
+
+def _edited(text, every=25):
+    """``text`` with every ``every``-th word replaced: a light copy-edit."""
+    words = text.split()
+    for i in range(0, len(words), every):
+        words[i] = "edited"
+    return " ".join(words)
+
+
+def _row(text, embedding=None, hasher=None):
+    signature = (hasher or MinHasher()).signature(text)
+    return SimpleNamespace(signature=signature.tobytes(), embedding=embedding)
+
+
+def test_signatures_estimate_jaccard():
+    hasher = MinHasher(num_perm=256, bands=32)
+    text = _essay()
+    assert hasher.jaccard(hasher.signature(text), hasher.signature(text)) == 1.0
+    assert hasher.jaccard(hasher.signature(text), hasher.signature(_essay())) < 0.05
+
+
+def test_prefilter_keeps_known_near_duplicates():
+    originals = [_essay() for _ in range(20)]
+    texts = originals + [_edited(text) for text in originals]
+    candidates, stats = _candidate_pairs([_row(text) for text in texts])
+    near_duplicates = {(i, i + len(originals)) for i in range(len(originals))}
+    assert near_duplicates <= candidates
+    # Unrelated essays are pruned
+    assert stats["pruned_ratio"] > 0.9
+
+
+def test_semantic_fallback_keeps_paraphrases():
+    base = _rng.random(16)
+    rows = [
+        _row(_essay(), embedding=base),
+        _row(_essay(), embedding=base + 0.01 * _rng.random(16)),
+        _row(_essay(), embedding=-base),
+    ]
+    candidates, stats = _candidate_pairs(rows)
+    assert candidates == {(0, 1)}
+    assert stats["semantic_only_candidates"] == 1
+
+
+def test_documents_without_comparable_signatures_are_never_pruned():
+    rows = [_row(_essay()) for _ in range(4)]
+    rows[1].signature = None
+    rows[2].signature = MinHasher(num_perm=64, bands=16).signature(_essay()).tobytes()
+    candidates, _ = _candidate_pairs(rows)
+    assert {(0, 1), (1, 2), (1, 3), (0, 2), (2, 3)} <= candidates
+
+
+def test_semantic_pairs_ignores_missing_and_zero_vectors():
+    vectors = [[1.0, 0.0], None, [0.0, 0.0], [0.9, 0.1]]
+    assert semantic_pairs(vectors, 0.5) == {(0, 3)}
@@ -0,0 +1,46 @@
+import time
+
+from app.services import ocr
+
+
+def test_page_timeout_covers_rendering_and_ocr(monkeypatch):
+    calls = {}
+
+    def render(pdf_path, dpi, first_page, last_page, timeout):
+        calls["render"] = timeout
+        time.sleep(0.2)
+        return ["image"]
+
+    def image_to_string(image, timeout):
+        calls["ocr"] = timeout
+        return "text"
+
+    monkeypatch.setattr(ocr, "convert_from_path", render)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", image_to_string)
+    [result] = ocr._ocr_page_window("scan.pdf", [1], dpi=100, timeout=1.0)
+    assert result.text == "text" and result.error is None
+    assert calls["render"] == 1.0 and 0 < calls["ocr"] <= 0.8
+
+
+def test_zero_timeout_disables_both_limits(monkeypatch):
+    calls = {}
+    monkeypatch.setattr(ocr, "convert_from_path",
+                        lambda pdf_path, dpi, first_page, last_page, timeout: calls.update(render=timeout) or ["image"])
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string",
+                        lambda image, timeout: calls.update(ocr=timeout) or "text")
+    ocr._ocr_page_window("scan.pdf", [1], dpi=100, timeout=0)
+    assert calls == {"render": None, "ocr": 0}
+
+
+def test_render_timeout_is_reported_per_page(monkeypatch):
+    def render(pdf_path, dpi, first_page, last_page, timeout):
+        if first_page == 2:
+            raise RuntimeError("pdftoppm timed out")
+        return ["image"]
+
+    monkeypatch.setattr(ocr, "convert_from_path", render)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", lambda image, timeout: "text")
+    results = ocr._ocr_page_window("scan.pdf", [1, 2, 3], dpi=100, timeout=5)
+    assert [(r.page, r.text, r.error) for r in results] == [
+        (1, "text", None), (2, "", "pdftoppm timed out"), (3, "text", None)
+    ]
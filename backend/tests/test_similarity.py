@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from app.services.similarity import SimilarityEngine
+
+_DIM = 24
+
+
+def _corpus(n_docs=7, seed=3):
+    """Random documents in which later ones reuse noisy copies of earlier chunks."""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for d in range(n_docs):
+        count = int(rng.integers(1, 9))
+        doc = rng.standard_normal((count, _DIM))
+        if d and count > 1:
+            donor = chunks[int(rng.integers(0, d))]
+            copied = rng.choice(len(donor), size=min(len(donor), count // 2), replace=False)
+            doc[:len(copied)] = donor[copied] + 0.2 * rng.standard_normal((len(copied), _DIM))
+        chunks.append(doc)
+    documents = [(f"doc{d}" * 10, [(c, c + 1) for c in range(len(doc))]) for d, doc in enumerate(chunks)]
+    offsets = np.concatenate([[0], np.cumsum([len(doc) for doc in chunks])])
+    return documents, SimilarityEngine.normalize(np.vstack(chunks)), offsets
+
+
+def _pairwise(engine, documents, matrix, offsets):
+    results = {}
+    for a in range(len(documents)):
+        for b in range(len(documents)):
+            if a != b:
+                result = engine.compare(documents[a], matrix[offsets[a]:offsets[a + 1]],
+                                        documents[b], matrix[offsets[b]:offsets[b + 1]])
+                if result["score"] > 0:
+                    results[(a, b)] = result
+    return results
+
+
+def _keyed(results):
+    return {(r.pop("source"), r.pop("target")): r for r in results}
+
+
+def test_blocked_best_matches_equal_a_full_scan():
+    rng = np.random.default_rng(0)
+    a = SimilarityEngine.normalize(rng.standard_normal((37, _DIM)))
+    b = SimilarityEngine.normalize(rng.standard_normal((53, _DIM)))
+    full = a @ b.T
+    scores, indices = SimilarityEngine(max_block_bytes=4 * 50).best_matches(a, b)
+    assert np.array_equal(indices, full.argmax(axis=1))
+    assert np.allclose(scores, full.max(axis=1))
+
+
+@pytest.mark.parametrize("max_block_bytes", [4 * 9, 4 * 64, 4 * 10_000])
+def test_all_pairs_equals_pairwise_compare(max_block_bytes):
+    engine = SimilarityEngine(match_threshold=0.75, max_block_bytes=max_block_bytes)
+    documents, matrix, offsets = _corpus()
+    expected = _pairwise(engine, documents, matrix, offsets)
+    assert expected, "the corpus should contain copied chunks"
+    assert _keyed(engine.all_pairs(documents, matrix, offsets)) == expected
+
+
+def test_cross_pairs_are_the_pairs_across_the_split():
+    engine = SimilarityEngine(match_threshold=0.75, max_block_bytes=4 * 16)
+    documents, matrix, offsets = _corpus()
+    split = 3
+    expected = {
+        pair: result for pair, result in _pairwise(engine, documents, matrix, offsets).items()
+        if (pair[0] < split) != (pair[1] < split)
+    }
+    assert _keyed(engine.cross_pairs(documents, matrix, offsets, split)) == expected
+
+
+def test_plan_tiles_cover_documents_within_the_row_cap():
+    counts = [3, 4, 1, 10, 2, 2]
+    tiles = SimilarityEngine.plan_tiles(counts, max_rows=8)
+    assert tiles == [(0, 3), (3, 4), (4, 6)]
+    # A document larger than the cap gets a tile of its own rather than being split
+    assert SimilarityEngine.plan_tiles([20], max_rows=8) == [(0, 1)]
+
+
+def test_normalize_keeps_zero_rows():
+    matrix = SimilarityEngine.normalize([[3.0, 4.0], [0.0, 0.0]])
+    assert matrix.dtype == np.float32 and np.allclose(matrix, [[0.6, 0.8], [0.0, 0.0]])
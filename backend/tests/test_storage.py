@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+from app.core.config import settings
+from app.services.storage import S3_MIN_PART_SIZE, AsyncStorageService, StorageService, get_s3_client, get_storage
+
+BUCKET = "plagiarism-uploads-test"
+
+
+def test_ensure_bucket_creates_missing_bucket_once(s3):
+    service = StorageService("s3")
+    service.ensure_bucket()
+    service.ensure_bucket()  # Existing bucket: no error
+    assert [bucket["Name"] for bucket in s3.list_buckets()["Buckets"]] == [BUCKET]
+
+
+def test_uploads_fail_without_bucket(s3):
+    service = StorageService("s3")
+    with pytest.raises(service.s3.exceptions.NoSuchBucket):
+        service.save("a.txt", b"data")
+
+
+def test_async_storage_round_trip(s3):
+    async def run():
+        backend = get_storage()
+        assert backend is get_storage()
+        await backend.ensure_bucket()
+        keys = [f"batch/{i}.txt" for i in range(20)]
+        await backend.save_many((key, key.encode()) for key in keys)
+        assert await backend.read_many(keys) == [key.encode() for key in keys]
+        assert await backend.exists(keys[0])
+        await backend.delete(keys[0])
+        assert not await backend.exists(keys[0])
+        urls = await backend.presigned_urls(keys[1:3])
+        assert set(urls) == set(keys[1:3]) and all(BUCKET in url for url in urls.values())
+
+    asyncio.run(run())
+
+
+def test_one_client_per_process(s3):
+    assert AsyncStorageService().storage.s3 is get_s3_client()
+    assert StorageService("s3").s3 is get_s3_client()
+
+
+class _FailingStream(io.RawIOBase):
+    """Yields ``fail_after`` bytes, then raises like a dropped client connection."""
+
+    def __init__(self, fail_after: int):
+        self.remaining = fail_after
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            raise ConnectionError("client went away")
+        n = min(len(buffer), self.remaining)
+        buffer[:n] = b"x" * n
+        self.remaining -= n
+        return n
+
+
+def test_save_stream_uploads_large_files_in_parts(s3, monkeypatch):
+    monkeypatch.setattr(settings, "S3_MULTIPART_PART_MB", 5)
+    service = StorageService("s3")
+    service.ensure_bucket()
+    data = bytes(range(256)) * (2 * S3_MIN_PART_SIZE // 256) + b"tail"
+
+    location, digest, size = service.save_stream("big.bin", io.BytesIO(data))
+
+    assert (location, digest, size) == (f"s3://{BUCKET}/big.bin", hashlib.sha256(data).hexdigest(), len(data))
+    assert service.read("big.bin") == data
+    # Three parts: two full ones and the remainder
+    assert s3.head_object(Bucket=BUCKET, Key="big.bin")["ETag"].endswith('-3"')
+
+
+def test_save_stream_puts_small_files_in_one_request(s3):
+    service = StorageService("s3")
+    service.ensure_bucket()
+    assert service.save_stream("small.txt", io.BytesIO(b"data"))[2] == 4
+    assert "-" not in s3.head_object(Bucket=BUCKET, Key="small.txt")["ETag"]
+    assert service.read("small.txt") == b"data"
+
+
+def test_save_stream_aborts_multipart_upload_on_failure(s3, monkeypatch):
+    monkeypatch.setattr(settings, "S3_MULTIPART_PART_MB", 5)
+    service = StorageService("s3")
+    service.ensure_bucket()
+
+    # Fails after the first part has been uploaded
+    with pytest.raises(ConnectionError):
+        service.save_stream("broken.bin", _FailingStream(S3_MIN_PART_SIZE + 1024))
+
+    assert "Uploads" not in s3.list_multipart_uploads(Bucket=BUCKET)
+    assert not service.exists("broken.bin")
@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy.sql import Insert, Select, Update
+
+from app.models.ai_detection import AIDetection
+from app.services.write_behind import WriteBehindBuffer
+
+
+class FakeSession:
+    """Records the statements a WriteBehindBuffer executes; inserts into ``failing`` tables raise."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.inserted = []
+        self.updates = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.failed = set()
+
+    async def execute(self, stmt, params=None):
+        if isinstance(stmt, Select):
+            # Every document asked about is still incomplete
+            ids = stmt.whereclause.clauses[0].right.value
+            return _Result(ids)
+        if isinstance(stmt, Insert):
+            if stmt.table.name in self.failing:
+                raise RuntimeError("insert failed")
+            self.inserted.extend(params)
+        elif isinstance(stmt, Update):
+            if stmt.table.name == "documents" and params is None:
+                # Marking documents failed; completions are executemany updates with params
+                self.failed.update(stmt.whereclause.clauses[0].right.value)
+            self.updates.append(params)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class _Result:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def scalars(self):
+        return self.ids
+
+
+def _row(owner):
+    return {"document_id": owner, "model_version": "m", "probability": 0.5, "meta_data": {}}
+
+
+def test_owned_rows_wait_for_their_completion():
+    async def run():
+        session = FakeSession()
+        writer = WriteBehindBuffer(session, max_rows=100, max_delay=60)
+        a, b = str(uuid.uuid4()), str(uuid.uuid4())
+        await writer.add(AIDetection, _row(a), owner=a)
+        await writer.add(AIDetection, _row(b), owner=b)
+        await writer.complete(a, str(uuid.uuid4()))
+        await writer.flush()
+        assert [row["document_id"] for row in session.inserted] == [a]
+        await writer.complete(b, str(uuid.uuid4()))
+        await writer.flush()
+        assert [row["document_id"] for row in session.inserted] == [a, b]
+
+    asyncio.run(run())
+
+
+def test_discarded_owner_leaves_nothing_behind():
+    async def run():
+        session = FakeSession()
+        writer = WriteBehindBuffer(session, max_rows=100, max_delay=60)
+        failed, ok = str(uuid.uuid4()), str(uuid.uuid4())
+        await writer.add(AIDetection, _row(failed), owner=failed)
+        await writer.add(AIDetection, _row(failed), owner=failed)
+        await writer.add(AIDetection, _row(ok), owner=ok)
+        await writer.complete(ok, str(uuid.uuid4()))
+        writer.discard(failed)
+        await writer.flush()
+        assert [row["document_id"] for row in session.inserted] == [ok]
+        assert writer._pending == 0 and not writer._rows
+
+    asyncio.run(run())
+
+
+def test_failed_flush_rolls_back_and_fails_only_its_documents():
+    async def run():
+        session = FakeSession(failing={"ai_detection"})
+        writer = WriteBehindBuffer(session, max_rows=100, max_delay=60)
+        completing, later = str(uuid.uuid4()), str(uuid.uuid4())
+        await writer.add(AIDetection, _row(completing), owner=completing)
+        await writer.complete(completing, str(uuid.uuid4()))
+        await writer.add(AIDetection, _row(later), owner=later)
+        with pytest.raises(RuntimeError):
+            await writer.flush()
+        assert session.rollbacks == 1
+        assert session.failed == {completing}
+        # The other document's rows are still buffered, and the next flush goes through
+        session.failing.clear()
+        await writer.complete(later, str(uuid.uuid4()))
+        await writer.flush()
+        assert [row["document_id"] for row in session.inserted] == [later]
+        assert writer._pending == 0
+
+    asyncio.run(run())